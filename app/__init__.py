@@ -1,19 +1,34 @@
 from flask import Flask
-from .extensions.db import db
+from .extensions.db import db, instrument, check_database
 from .extensions.migrate import migrate
-from .extensions.login import login_manager
+from .extensions.login import login_manager, user_cache
+from .extensions.passwords import password_hasher
+from .extensions.metrics import metrics
+from .extensions.cache import catalog_cache, hotel_cache
 from .utils.config import load_config
 from flask import redirect, url_for
 
 
-def create_app():
+def create_app(overrides=None):
     app = Flask(__name__, template_folder="../templates", static_folder="../static")
     load_config(app)
+    if overrides:
+        app.config.update(overrides)
 
     # Initialize extensions
+    metrics.init_app(app)
     db.init_app(app)
+    instrument(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    user_cache.init_app(app)
+    password_hasher.init_app(app)
+    catalog_cache.init_app(app)
+    hotel_cache.init_app(app)
+
+    from .services.booking_pipeline import booking_pipeline
+
+    booking_pipeline.init_app(app)
 
     # Register blueprints
     from .auth.routes import auth_bp
@@ -26,9 +41,26 @@ def create_app():
     app.register_blueprint(hotel_bp, url_prefix="/hotel")
     app.register_blueprint(pkg_mgr_bp, url_prefix="/manager")
 
+    from .commands import register_commands
+
+    register_commands(app)
+
     @app.route("/health")
     def health():
-        return {"status": "ok"}
+        # Readiness probe: the database must be reachable.
+        error = check_database(app.config["HEALTH_CHECK_CACHE_SECONDS"])
+        if error:
+            return {"status": "unavailable", "database": "unreachable"}, 503
+        return {"status": "ok", "database": "ok"}
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        body = metrics.render(
+            engines={key or "primary": engine for key, engine in db.engines.items()},
+            caches={"catalog": catalog_cache, "hotels": hotel_cache, "users": user_cache},
+            password_hasher=password_hasher,
+        )
+        return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
 
     # --- Template endpoint aliases ---
     # Landing and role selection used in templates
@@ -52,7 +84,7 @@ def create_app():
     @app.route("/customer/profile")
     def customer_profile():
         from flask_login import current_user
-        return __import__("flask").flask.render_template("customer/profile.html", user=current_user)
+        return __import__("flask").render_template("customer/profile.html", user=current_user)
 
     @app.route("/customer/search-hotels")
     def customer_search_hotels():
@@ -1,8 +1,12 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
 from ..extensions.db import db
-from ..extensions.login import login_manager
+from ..extensions.login import login_manager, user_cache
+from ..extensions.passwords import PasswordHasherBusy
+from ..extensions.cache import hotel_cache
 from ..models import User, Role
+from ..services import geo
+from ..services.locations import location_index
 
 
 auth_bp = Blueprint("auth", __name__)
@@ -10,7 +14,12 @@ auth_bp = Blueprint("auth", __name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id), lambda pk: db.session.get(User, pk))
+
+
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(exc):
+    return {"error": "Too many sign-ins right now, please retry"}, 503, {"Retry-After": "1"}
 
 
 @auth_bp.route("/")
@@ -66,7 +75,8 @@ def login():
         flash("Invalid credentials.", "danger")
         return redirect(url_for("auth.login"))
 
-    login_user(user)
+    _upgrade_password(user, password)
+    login_user(user_cache.put(user))
     session["user_id"] = user.id
     session["username"] = user.username
     session["role"] = user.role.value if hasattr(user.role, "value") else str(user.role)
@@ -176,8 +186,17 @@ def hotel_signup():
         contact_info=request.form.get("contact_info") or "",
         amenities=request.form.get("amenities") or "",
     )
+    try:
+        geo.set_coordinates(hotel, hotel.location, request.form)
+    except ValueError as exc:
+        db.session.rollback()
+        flash(str(exc), "danger")
+        return redirect(request.url)
     db.session.add(hotel)
     db.session.commit()
+    hotel_cache.bump()
+    location_index.add(hotel)
+    geo.hotel_geo_index.add(hotel)
     flash("Hotel account created. Please log in.", "success")
     return redirect(url_for("auth.hotel_login"))
 
@@ -188,6 +207,13 @@ def package_manager_signup():
 
 
 # -------- Role-specific login -------- #
+def _upgrade_password(user, password):
+    # Rehash with the current PASSWORD_HASH_METHOD while the plain password is at hand.
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+
+
 def _handle_login(template_name: str, expected_role: Role | None):
     if request.method == "GET":
         return render_template(template_name)
@@ -210,7 +236,8 @@ def _handle_login(template_name: str, expected_role: Role | None):
         flash("Invalid role for this login page.", "danger")
         return redirect(request.url)
 
-    login_user(user)
+    _upgrade_password(user, password)
+    login_user(user_cache.put(user))
     session["user_id"] = user.id
     session["username"] = user.username
     session["role"] = user.role.value if hasattr(user.role, "value") else str(user.role)
@@ -0,0 +1,242 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func
+
+from .extensions.cache import catalog_cache, hotel_cache
+from .extensions.db import db, query_counter
+from .models import Booking, Hotel, Role, TourismPackage, User
+from .services import booking_stats, geo, importer, inventory
+from .services.recommendations import recommender
+
+
+def register_commands(app):
+    app.cli.add_command(import_catalog)
+    app.cli.add_command(release_expired_bookings)
+    app.cli.add_command(booking_stats_cli)
+    app.cli.add_command(geocode)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(check_query_counts)
+
+
+@click.command("import-catalog")
+@click.argument("kind", type=click.Choice(["packages", "guides"]))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="Defaults to the file extension.")
+@click.option("--created-by", help="Username of the package manager that owns imported packages.")
+@click.option("--chunk-size", type=int, help="Rows per transaction (IMPORT_CHUNK_SIZE).")
+@with_appcontext
+def import_catalog(kind, path, fmt, created_by, chunk_size):
+    """Stream tourism packages or guides from a CSV/JSONL file."""
+    fmt = importer.detect_format(path, fmt)
+    owner_id = None
+    if created_by:
+        owner = db.session.execute(db.select(User).filter_by(username=created_by)).scalar_one_or_none()
+        if owner is None:
+            raise click.BadParameter(f"no user named {created_by!r}", param_hint="--created-by")
+        owner_id = owner.id
+
+    with open(path, "rb") as stream:
+        if kind == "packages":
+            report = importer.import_packages(stream, fmt, owner_id, chunk_size)
+        else:
+            report = importer.import_guides(stream, fmt, chunk_size)
+    click.echo(json.dumps(report.to_dict(), indent=2))
+
+
+@click.command("release-expired-bookings")
+@click.option("--batch-size", default=1000, show_default=True)
+@with_appcontext
+def release_expired_bookings(batch_size):
+    """Expire pending bookings whose seat hold ran out and free their seats."""
+    total = 0
+    while True:
+        released = inventory.release_expired(limit=batch_size)
+        total += released
+        if released < batch_size:
+            break
+    click.echo(f"released {total} seats")
+
+
+@click.group("booking-stats")
+def booking_stats_cli():
+    """Maintain the per-package and per-manager booking summaries."""
+
+
+@booking_stats_cli.command("rebuild")
+@with_appcontext
+def rebuild_booking_stats():
+    """Recompute the summaries from the bookings table."""
+    booking_stats.rebuild()
+    click.echo("booking summaries rebuilt")
+
+
+@booking_stats_cli.command("check")
+@with_appcontext
+def check_booking_stats():
+    """Compare the summaries with the bookings table; exits 1 on drift."""
+    problems = booking_stats.check()
+    for table, key, stored, expected in problems:
+        click.echo(f"{table} {key}: stored {stored} expected {expected}", err=True)
+    if problems:
+        raise click.ClickException(f"{len(problems)} summary rows out of date; run `flask booking-stats rebuild`")
+    click.echo("booking summaries match")
+
+
+@click.command("geocode")
+@click.option("--gazetteer", "path", type=click.Path(exists=True, dir_okay=False),
+              help="Gazetteer CSV; defaults to GAZETTEER_PATH.")
+@click.option("--all", "redo", is_flag=True, help="Re-geocode rows that already have coordinates.")
+@click.option("--batch-size", default=1000, show_default=True)
+@with_appcontext
+def geocode(path, redo, batch_size):
+    """Fill hotel and package coordinates from the offline gazetteer."""
+    if path:
+        current_app.config["GAZETTEER_PATH"] = path
+    places = geo.gazetteer()
+    if places is None:
+        raise click.ClickException("no gazetteer file; pass --gazetteer or set GAZETTEER_PATH")
+
+    report = {}
+    for model, column in ((Hotel, Hotel.location), (TourismPackage, TourismPackage.destination)):
+        query = db.select(model.id, column)
+        if not redo:
+            query = query.filter(model.latitude.is_(None))
+        matched = missed = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                query.filter(model.id > last_id).order_by(model.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for row_id, text in rows:
+                point = places.lookup(text)
+                if point is None:
+                    missed += 1
+                else:
+                    matched += 1
+                    updates.append({"id": row_id, "latitude": point[0], "longitude": point[1]})
+            if updates:
+                db.session.execute(db.update(model), updates)
+            db.session.commit()
+            last_id = rows[-1][0]
+        report[model.__tablename__] = {"geocoded": matched, "not_found": missed}
+    hotel_cache.bump()
+    catalog_cache.bump()
+    click.echo(json.dumps(report, indent=2))
+
+
+@click.group("recommendations")
+def recommendations_cli():
+    """Maintain the precomputed similar-package table."""
+
+
+@recommendations_cli.command("rebuild")
+@with_appcontext
+def rebuild_recommendations():
+    """Recompute every package's nearest neighbours and store them."""
+    started = time.perf_counter()
+    count = recommender.rebuild()
+    click.echo(f"recommendations rebuilt for {count} packages in {time.perf_counter() - started:.1f}s")
+
+
+# Most statements one GET of each page may issue, for the first request in a
+# fresh process (indexes loading, caches cold) and for a repeat. Neither
+# depends on the amount of data, so a page over budget, or one statement run
+# REPEAT_LIMIT times within a request, means a query crept into a loop.
+QUERY_BUDGETS = [
+    (Role.customer, "/customer/dashboard", 3, 1),
+    (Role.customer, "/customer/packages", 6, 0),
+    (Role.customer, "/customer/api/packages?sort=total", 1, 0),
+    (Role.customer, "/customer/bookings", 1, 1),
+    (Role.customer, "/customer/api/bookings", 1, 1),
+    (Role.customer, "/customer/search-hotels?location=a", 2, 1),
+    (Role.package_manager, "/manager/dashboard", 5, 4),
+]
+REPEAT_LIMIT = 3
+
+
+def _busiest_user(role, column):
+    """The user of ``role`` with the most rows in ``column``'s table."""
+    return db.session.execute(
+        db.select(User)
+        .outerjoin(column.table, column == User.id)
+        .filter(User.role == role)
+        .group_by(User.id)
+        .order_by(func.count(column).desc(), User.id)
+        .limit(1)
+    ).scalar_one_or_none()
+
+
+@click.command("check-query-counts")
+@click.option("--customer", help="Username to browse as; defaults to the customer with the most bookings.")
+@click.option("--manager", help="Username to browse as; defaults to the manager with the most packages.")
+@click.option("--verbose", is_flag=True, help="Print the statements each request ran.")
+@with_appcontext
+def check_query_counts(customer, manager, verbose):
+    """Fetch key pages in-process and fail if any exceeds its query budget.
+
+    Only GET requests are made, through the test client, as an existing
+    customer and package manager. Each page is fetched twice: cold, then
+    warm. Exits 1 on a breach, an error response or a repeated statement.
+    """
+    app = current_app._get_current_object()
+    users = {}
+    for role, username, column in (
+        (Role.customer, customer, Booking.user_id),
+        (Role.package_manager, manager, TourismPackage.created_by),
+    ):
+        if username:
+            user = db.session.execute(db.select(User).filter_by(username=username)).scalar_one_or_none()
+            if user is None or user.role != role:
+                raise click.BadParameter(f"no {role.value} named {username!r}")
+        else:
+            user = _busiest_user(role, column)
+            if user is None:
+                raise click.ClickException(f"need at least one {role.value} user")
+        users[role] = user.id, user.username
+
+    clients = {}
+    for role, (user_id, username) in users.items():
+        client = clients[role] = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+            session["user_id"] = user_id
+            session["username"] = username
+            session["role"] = role.value
+
+    def fetch(client, path):
+        with query_counter() as stats:
+            response = client.get(path)
+        return response, stats
+
+    # Requests run on another thread so each gets its own app context, as in
+    # a server, instead of sharing this command's ``g`` and session.
+    failures = 0
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for role, path, cold_budget, warm_budget in QUERY_BUDGETS:
+            for label, budget in (("cold", cold_budget), ("warm", warm_budget)):
+                response, stats = pool.submit(fetch, clients[role], path).result()
+                problems = []
+                if response.status_code != 200:
+                    problems.append(f"status {response.status_code}")
+                if stats.count > budget:
+                    problems.append(f"over budget of {budget}")
+                repeated = stats.repeated(REPEAT_LIMIT)
+                if repeated:
+                    problems.append(f"{len(repeated)} statement(s) repeated")
+                failures += bool(problems)
+                click.echo(f"{path} [{label}]: {stats.count} queries" + (f" - {'; '.join(problems)}" if problems else ""))
+                if verbose or repeated:
+                    for sql, n in stats.fingerprints.most_common():
+                        click.echo(f"    {n} x {sql}")
+    if failures:
+        raise click.ClickException(f"{failures} request(s) failed their query budget")
+    click.echo("all pages within their query budgets")
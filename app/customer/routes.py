@@ -1,59 +1,236 @@
-from flask import Blueprint, request, render_template, jsonify, redirect, url_for
+from datetime import datetime
+from flask import Blueprint, Response, abort, current_app, request, render_template, jsonify, redirect, url_for, stream_with_context
 from flask_login import login_required, current_user
-from ..models import TourismPackage, Booking, Hotel
-from ..extensions.db import db
+from ..models import TourismPackage, Booking, Hotel, HotelPackage
+from ..extensions.db import db, from_primary
+from ..extensions.cache import catalog_cache, hotel_cache
+from ..services import booking_stats, catalog, geo, inventory
+from ..services.booking_pipeline import booking_pipeline
+from ..services.facets import PackageFilters, facet_index
+from ..services.locations import location_index
+from ..services.quotes import SORT_ORDERS, quote_index
+from ..services.recommendations import recommender
+from ..services.search import package_index, tokenize
+from ..utils.http import cache_marker, make_etag, not_modified, page_etag, with_validators
+from ..utils.pagination import get_page_args, keyset_page, offset_page
 
 
 customer_bp = Blueprint("customer", __name__)
 
 
+def _find_packages(q, filters):
+    """Return one page of catalog rows, the cursor for the next one and the
+    facet counts for the current search and filters."""
+    cursor, limit = get_page_args()
+    q = " ".join(tokenize(q))
+    quote = _quote_args()
+    key = f"packages:{q}:{filters.cache_key()}:{quote}:{request.args.get('cursor', '')}:{limit}"
+    return catalog_cache.get_or_set(key, lambda: _load_packages(q, filters, quote, cursor, limit))
+
+
+def _load_packages(q, filters, quote, cursor, limit):
+    sort, min_total, max_total = quote
+    bounded = min_total is not None or max_total is not None
+    if not q and not sort and not bounded:
+        packages, next_cursor = catalog.fetch_page(cursor, limit, filters=filters)
+        return packages, next_cursor, facet_index.facets(filters)
+    # Ranked ids come from the in-memory indexes; only the page hits the DB.
+    ranked = package_index.search(q) if q else None
+    if sort or bounded:
+        ranked = quote_index.select(ranked, min_total, max_total, sort)
+    ids, next_cursor = offset_page(lambda n: facet_index.matching(filters, ranked)[:n], cursor, limit)
+    within = ranked if q or bounded else None
+    return catalog.fetch_by_ids(ids), next_cursor, facet_index.facets(filters, within=within)
+
+
+def _quote_args():
+    """``(sort, min_total, max_total)`` for ordering and filtering by total trip cost."""
+    sort = request.args.get("sort") or None
+    if sort is not None and sort not in SORT_ORDERS:
+        abort(400, f"sort must be one of {', '.join(SORT_ORDERS)}")
+    bounds = []
+    for arg in ("min_total", "max_total"):
+        value = request.args.get(arg)
+        try:
+            bounds.append(float(value) if value not in (None, "") else None)
+        except ValueError:
+            abort(400, f"{arg} must be a number")
+    return (sort, *bounds)
+
+
+def _package_filters():
+    try:
+        return PackageFilters.from_args(request.args)
+    except ValueError as exc:
+        abort(400, str(exc))
+
+
+def _featured_packages():
+    packages, _ = catalog_cache.get_or_set("featured", lambda: catalog.fetch_page(None, 3))
+    return packages
+
+
+def warm_catalog_cache(app):
+    """Fill the cache entries behind the customer dashboard and the first,
+    unfiltered packages page, the most common cold misses after a deploy."""
+    with app.test_request_context("/customer/packages"):
+        _featured_packages()
+        _find_packages(None, _package_filters())
+
+
 @customer_bp.route("/dashboard")
 @login_required
 def dashboard():
-    return render_template("customer/dashboard.html", user=current_user)
+    packages = _featured_packages()
+    hotels = Hotel.query.order_by(Hotel.created_at.desc(), Hotel.id.desc()).limit(3).all()
+    return render_template(
+        "customer/dashboard.html", user=current_user, packages=packages, hotels=hotels
+    )
 
 
 @customer_bp.route("/packages", methods=["GET"])
 @login_required
 def list_packages():
+    marker, last_modified = cache_marker(catalog_cache)
+    etag = page_etag(marker)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     q = request.args.get("q")
-    query = TourismPackage.query
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (TourismPackage.title.ilike(like))
-            | (TourismPackage.destination.ilike(like))
-            | (TourismPackage.description.ilike(like))
-        )
-    packages = query.order_by(TourismPackage.created_at.desc()).all()
-    return render_template("customer/packages.html", packages=packages)
+    packages, next_cursor, facets = _find_packages(q, _package_filters())
+    page_args = {key: values for key, values in request.args.lists() if key != "cursor"}
+    page = render_template(
+        "customer/packages.html",
+        packages=packages,
+        quotes=quote_index.quotes([p.id for p in packages]),
+        q=q,
+        next_cursor=next_cursor,
+        facets=facets,
+        page_args=page_args,
+    )
+    return with_validators(page, etag, last_modified)
 
 
 @customer_bp.route("/api/packages", methods=["GET"])
 @login_required
 def api_packages():
-    q = request.args.get("q")
-    query = TourismPackage.query
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (TourismPackage.title.ilike(like))
-            | (TourismPackage.destination.ilike(like))
-            | (TourismPackage.description.ilike(like))
+    marker, last_modified = cache_marker(catalog_cache)
+    etag = make_etag(marker, request.full_path)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
+    packages, next_cursor, facets = _find_packages(request.args.get("q"), _package_filters())
+    quotes = quote_index.quotes([p.id for p in packages])
+    response = jsonify(
+        {
+            "packages": [dict(p.to_dict(), total_price=quotes.get(p.id)) for p in packages],
+            "next": next_cursor,
+            "facets": facets,
+        }
+    )
+    return with_validators(response, etag, last_modified)
+
+
+@customer_bp.route("/api/packages/export", methods=["GET"])
+@login_required
+def export_packages():
+    """Stream the whole catalog as NDJSON (default) or a JSON array.
+
+    ``fields`` is a comma-separated subset of ``catalog.EXPORT_FIELDS`` and
+    ``since`` an ISO timestamp compared with ``created_at``.
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "json"):
+        return {"error": "format must be ndjson or json"}, 400
+    fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+    fields = list(dict.fromkeys(fields)) or list(catalog.EXPORT_FIELDS)
+    unknown = [f for f in fields if f not in catalog.EXPORT_FIELDS]
+    if unknown:
+        return {"error": f"unknown fields: {', '.join(unknown)}", "fields": list(catalog.EXPORT_FIELDS)}, 400
+    since = request.args.get("since")
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return {"error": "since must be an ISO 8601 timestamp"}, 400
+
+    items = catalog.iter_export(fields, since or None, current_app.config["EXPORT_BATCH_SIZE"])
+    if fmt == "ndjson":
+        body, mimetype = catalog.export_ndjson(items), "application/x-ndjson"
+    else:
+        body, mimetype = catalog.export_json_array(items), "application/json"
+    return Response(stream_with_context(body), mimetype=mimetype)
+
+
+def _booking_history():
+    """One page of the current user's bookings, newest first, with the
+    package columns the history shows joined in the same query."""
+    status = request.args.get("status") or None
+    if status is not None and status not in booking_stats.STATUSES:
+        abort(400, f"status must be one of {', '.join(booking_stats.STATUSES)}")
+    cursor, limit = get_page_args()
+    query = (
+        db.session.query(
+            Booking.id,
+            Booking.reference,
+            Booking.status,
+            Booking.booked_at,
+            Booking.expires_at,
+            Booking.amount,
+            Booking.package_id,
+            TourismPackage.title,
+            TourismPackage.destination,
+            TourismPackage.price,
         )
-    packages = query.order_by(TourismPackage.created_at.desc()).all()
+        .join(TourismPackage, TourismPackage.id == Booking.package_id)
+        .filter(Booking.user_id == current_user.id)
+    )
+    if status:
+        query = query.filter(Booking.status == status)
+    bookings, next_cursor = keyset_page(query, Booking.booked_at, Booking.id, cursor, limit)
+    return bookings, next_cursor, status
+
+
+@customer_bp.route("/bookings", methods=["GET"])
+@login_required
+def booking_history():
+    bookings, next_cursor, status = _booking_history()
+    return render_template(
+        "customer/bookings.html",
+        bookings=bookings,
+        next_cursor=next_cursor,
+        status=status,
+        statuses=booking_stats.STATUSES,
+    )
+
+
+@customer_bp.route("/api/bookings", methods=["GET"])
+@login_required
+def api_bookings():
+    bookings, next_cursor, _ = _booking_history()
     return jsonify(
-        [
-            {
-                "id": p.id,
-                "title": p.title,
-                "destination": p.destination,
-                "description": p.description,
-                "price": float(p.price),
-                "duration_days": p.duration_days,
-            }
-            for p in packages
-        ]
+        {
+            "bookings": [
+                {
+                    "id": b.id,
+                    "reference": b.reference,
+                    "status": b.status,
+                    "booked_at": b.booked_at.isoformat(),
+                    "expires_at": b.expires_at.isoformat() if b.expires_at else None,
+                    "amount": float(b.amount) if b.amount is not None else None,
+                    "package": {
+                        "id": b.package_id,
+                        "title": b.title,
+                        "destination": b.destination,
+                        "price": float(b.price),
+                    },
+                }
+                for b in bookings
+            ],
+            "next": next_cursor,
+        }
     )
 
 
@@ -63,27 +240,182 @@ def book_package():
     package_id = request.form.get("package_id") or (request.json or {}).get("package_id")
     if not package_id:
         return {"error": "package_id is required"}, 400
+    # Seat-limited packages need a synchronous reservation, so only unlimited
+    # ones go through the write-behind pipeline.
+    if booking_pipeline.enabled:
+        try:
+            package_id = int(package_id)
+        except (TypeError, ValueError):
+            return {"error": "Package not found"}, 404
+        if package_id not in catalog.package_ids:
+            return {"error": "Package not found"}, 404
+    if booking_pipeline.enabled and not catalog.package_ids.is_limited(package_id):
+        reference = booking_pipeline.submit(current_user.id, package_id)
+        return {
+            "message": "Booking received",
+            "reference": reference,
+            "status_url": url_for("customer.booking_status", reference=reference),
+        }, 202
     package = TourismPackage.query.get(package_id)
     if not package:
         return {"error": "Package not found"}, 404
     booking = Booking(user_id=current_user.id, package_id=package.id, status="pending")
+    if package.capacity is not None:
+        shard = inventory.reserve(package.id)
+        if shard is None and inventory.release_expired_throttled(package.id):
+            shard = inventory.reserve(package.id)
+        if shard is None:
+            db.session.rollback()
+            return {"error": "Package sold out"}, 409
+        booking.seat_shard = shard
+        booking.expires_at = inventory.hold_expiry()
     db.session.add(booking)
+    booking_stats.record([(package.id, None, "pending", None)])
     db.session.commit()
     return {"message": "Booked successfully", "booking_id": booking.id}
 
 
+@customer_bp.route("/book/<reference>", methods=["GET"])
+@login_required
+def booking_status(reference):
+    status = booking_pipeline.status(reference, current_user.id)
+    if status is not None:
+        return {"reference": reference, "status": status}
+    stored = Booking.query.filter_by(reference=reference, user_id=current_user.id)
+    booking = stored.first()
+    if not booking and booking_pipeline.enabled:
+        # Another worker may have accepted it and not flushed it yet.
+        if booking_pipeline.journaled(reference, current_user.id):
+            return {"reference": reference, "status": "queued"}
+        # Or flushed it while the journals were being read; a replica may
+        # not have that commit yet.
+        with from_primary():
+            booking = stored.first()
+    if not booking:
+        return {"error": "Unknown booking reference"}, 404
+    return {"reference": reference, "status": "stored", "booking_id": booking.id}
+
+
 @customer_bp.route("/search-hotels")
 @login_required
 def search_hotels():
+    marker, last_modified = cache_marker(hotel_cache)
+    etag = page_etag(marker)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     location = request.args.get("location", "")
     hotels = []
+    next_cursor = None
     if location:
-        like = f"%{location}%"
-        hotels = Hotel.query.filter(Hotel.location.ilike(like)).order_by(Hotel.created_at.desc()).all()
-    return render_template(
+        # The index resolves the substring match to exact location values,
+        # which the DB can look up through the location index.
+        matches = location_index.search(location)
+        if matches:
+            cursor, limit = get_page_args()
+            hotels, next_cursor = keyset_page(
+                Hotel.query.filter(Hotel.location.in_(matches)), Hotel.created_at, Hotel.id, cursor, limit
+            )
+    page = render_template(
         "customer/search_hotels.html",
         hotels=hotels,
         search_location=location,
+        next_cursor=next_cursor,
+    )
+    return with_validators(page, etag, last_modified)
+
+
+@customer_bp.route("/api/packages/<int:package_id>/nearby-hotels")
+@login_required
+def nearby_hotels(package_id):
+    """Hotels around a package's destination, nearest first, with the price
+    range of their room offers.
+
+    ``radius_km`` (default 10) bounds the search; ``k`` asks for the k
+    nearest hotels instead, within ``radius_km`` only if it is given.
+    """
+    package = db.session.get(TourismPackage, package_id)
+    if package is None:
+        return {"error": "Package not found"}, 404
+    if package.latitude is None or package.longitude is None:
+        return {"error": "Package destination has no coordinates"}, 422
+    radius = request.args.get("radius_km", type=float)
+    k = request.args.get("k", type=int)
+    if (radius is not None and radius <= 0) or (k is not None and k < 1):
+        return {"error": "radius_km and k must be positive"}, 400
+    limit = current_app.config["GEO_MAX_RESULTS"]
+    if k is not None:
+        found = geo.hotel_geo_index.nearest(package.latitude, package.longitude, min(k, limit), radius)
+    else:
+        found = geo.hotel_geo_index.within(package.latitude, package.longitude, radius or 10.0, limit)
+
+    ids = [hotel_id for _, hotel_id in found]
+    rows = {}
+    if ids:
+        stmt = (
+            db.select(
+                Hotel.id,
+                Hotel.name,
+                Hotel.location,
+                db.func.count(HotelPackage.id).label("offers"),
+                db.func.min(HotelPackage.price).label("min_price"),
+                db.func.max(HotelPackage.price).label("max_price"),
+            )
+            .outerjoin(HotelPackage, HotelPackage.hotel_id == Hotel.id)
+            .filter(Hotel.id.in_(ids))
+            .group_by(Hotel.id, Hotel.name, Hotel.location)
+        )
+        rows = {row.id: row for row in db.session.execute(stmt)}
+    hotels = []
+    for distance, hotel_id in found:
+        row = rows.get(hotel_id)
+        if row is None:
+            continue
+        hotels.append({
+            "id": row.id,
+            "name": row.name,
+            "location": row.location,
+            "distance_km": round(distance, 2),
+            "offers": row.offers,
+            "min_price": float(row.min_price) if row.min_price is not None else None,
+            "max_price": float(row.max_price) if row.max_price is not None else None,
+        })
+    return jsonify({
+        "package": {"id": package.id, "latitude": package.latitude, "longitude": package.longitude},
+        "hotels": hotels,
+    })
+
+
+@customer_bp.route("/api/packages/<int:package_id>/similar")
+@login_required
+def similar_packages(package_id):
+    """Packages most like this one, from the precomputed neighbour table."""
+    limit = request.args.get("limit", 5, type=int)
+    if limit < 1:
+        return {"error": "limit must be positive"}, 400
+    similar = recommender.similar(package_id, limit)
+    if similar is None:
+        # Possibly created in another worker and not indexed here yet.
+        if db.session.get(TourismPackage, package_id) is None:
+            return {"error": "Package not found"}, 404
+        similar = []
+    scores = dict(similar)
+    packages = []
+    for row in catalog.fetch_by_ids(list(scores)):
+        item = row.to_dict()
+        item["score"] = scores[row.id]
+        packages.append(item)
+    return jsonify({"package_id": package_id, "packages": packages})
+
+
+@customer_bp.route("/api/locations")
+@login_required
+def api_locations():
+    limit = min(request.args.get("limit", 10, type=int), 25)
+    suggestions = location_index.suggest(request.args.get("q", ""), limit=limit)
+    return jsonify(
+        {"suggestions": [{"location": loc, "hotels": count} for loc, count in suggestions]}
     )
 
 
@@ -0,0 +1,193 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from .db import from_primary
+
+
+MISSING = object()
+
+
+def _version_seed():
+    # Counters start from the clock so a restarted process never reuses a
+    # version number (and therefore an ETag) that was handed out before.
+    return int(time.time() * 1000)
+
+
+class MemoryBackend:
+    """Per-process LRU store with a TTL on every entry.
+
+    Version counters live outside the LRU so they are never evicted.
+    """
+
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.setdefault(key, _version_seed())
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, _version_seed()) + 1
+            self._counters[key] = value
+            return value
+
+    def set_counter(self, key, value):
+        with self._lock:
+            self._counters[key] = value
+
+
+class RedisBackend:
+    """External store shared by every worker, so a bump in one process is
+    seen by all of them. Requires the optional ``redis`` package."""
+
+    def __init__(self, url, default_ttl=300):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+
+    def get(self, key):
+        raw = self.client.get(key)
+        if raw is None:
+            return MISSING
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value), ex=ttl or self.default_ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_counter(self, key):
+        raw = self.client.get(key)
+        if raw is None:
+            # Only the first reader seeds the counter; everyone reads back
+            # whichever seed won.
+            self.client.set(key, _version_seed(), nx=True)
+            raw = self.client.get(key)
+        return int(raw)
+
+    def incr(self, key):
+        self.client.set(key, _version_seed(), nx=True)
+        return int(self.client.incr(key))
+
+    def set_counter(self, key, value):
+        self.client.set(key, value)
+
+
+def create_backend(app):
+    kind = app.config["CACHE_BACKEND"]
+    ttl = app.config["CACHE_DEFAULT_TTL"]
+    if kind == "memory":
+        return MemoryBackend(app.config["CACHE_MAX_ENTRIES"], ttl)
+    if kind == "redis":
+        return RedisBackend(app.config["CACHE_URL"], ttl)
+    raise RuntimeError(f"Unknown CACHE_BACKEND {kind!r}")
+
+
+class VersionedCache:
+    """Read-through cache whose keys embed a version counter.
+
+    Writers call :meth:`bump` instead of deleting individual keys; every
+    entry written under the old version simply stops being addressed and ages
+    out of the backend. Each bump also records when it happened, for
+    Last-Modified headers.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.backend = MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.backend = create_backend(app)
+
+    @property
+    def _version_key(self):
+        return f"{self.namespace}:version"
+
+    @property
+    def _modified_key(self):
+        return f"{self.namespace}:modified"
+
+    def version(self):
+        return self.backend.get_counter(self._version_key)
+
+    def last_modified(self):
+        """When the cached data last changed, as an aware UTC datetime.
+
+        Before the first bump this is when the counter was first read, which
+        is never earlier than the data it stands for.
+        """
+        millis = self.backend.get_counter(self._modified_key)
+        return datetime.fromtimestamp(millis / 1000, timezone.utc)
+
+    def bump(self):
+        version = self.backend.incr(self._version_key)
+        self.backend.set_counter(self._modified_key, _version_seed())
+        return version
+
+    def get_or_set(self, key, loader, ttl=None):
+        full_key = f"{self.namespace}:{self.version()}:{key}"
+        value = self.backend.get(full_key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        # The entry is filed under the current version, so it must not be
+        # filled from a replica that has not caught up with it yet.
+        with from_primary():
+            value = loader()
+        self.backend.set(full_key, value, ttl)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+catalog_cache = VersionedCache("catalog")
+hotel_cache = VersionedCache("hotels")
@@ -1,6 +1,261 @@
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, has_request_context, request, session as http_session
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+
+
+logger = logging.getLogger(__name__)
+
+
+# Key in the Flask session holding the time until which this user's reads
+# stay on the primary, so they see their own writes despite replication lag.
+PRIMARY_UNTIL = "_primary_until"
+
+
+class RoutingSession(Session):
+    """Session that sends safe reads to a replica and everything else to the primary.
+
+    A statement goes to a replica only when all of these hold:
+
+    - it runs inside a GET or HEAD request and replicas are configured;
+    - it is a plain SELECT (no DML, no ``FOR UPDATE``, no raw SQL);
+    - this session has not written anything yet, and the user has not written
+      within ``DATABASE_STICKY_SECONDS``;
+    - it is not inside a :func:`from_primary` block.
+
+    One replica is picked per session, so a request reads a consistent view.
+    Background threads and CLI commands have no request and use the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            return self._replica()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if self._flushing or self.info.get("wrote") or self.info.get("primary"):
+            return False
+        if not has_request_context():
+            return False
+        if request.method not in ("GET", "HEAD") or not current_app.config["DATABASE_REPLICAS"]:
+            return False
+        if clause is None or not getattr(clause, "is_select", False):
+            return False
+        if getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        return http_session.get(PRIMARY_UNTIL, 0) < time.time()
+
+    def _replica(self):
+        key = self.info.get("replica")
+        if key is None:
+            key = self.info["replica"] = random.choice(current_app.config["DATABASE_REPLICAS"])
+        return self._db.engines[key]
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_dml(execute_state):
+    if isinstance(execute_state.statement, UpdateBase):
+        execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_to_primary(session):
+    if session.info.get("wrote") and has_request_context() and current_app.config["DATABASE_REPLICAS"]:
+        http_session[PRIMARY_UNTIL] = time.time() + current_app.config["DATABASE_STICKY_SECONDS"]
+
+
+@contextmanager
+def from_primary():
+    """Send the enclosed reads to the primary even inside a GET request.
+
+    Used for reads whose result is filed under the current cache version:
+    index builds and cache fills. A lagging replica would store stale rows
+    under a version that claims to include the latest writes.
+    """
+    info = db.session.info
+    info["primary"] = info.get("primary", 0) + 1
+    try:
+        yield
+    finally:
+        info["primary"] -= 1
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside a writer; busy_timeout makes concurrent
+    # writers wait for the lock instead of failing straight away.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+# -------- Query instrumentation -------- #
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,?)+\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """Reduce a SQL statement to its shape: literals and IN lists collapsed."""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+class QueryStats:
+    """Queries seen during one request (or one ``query_counter`` block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """Statements run at least ``threshold`` times, most frequent first."""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n >= threshold]
+
+
+_counters = threading.local()
+
+
+@contextmanager
+def query_counter():
+    """Count queries issued on this thread inside the block::
+
+        with query_counter() as stats:
+            client.get("/customer/packages")
+        assert stats.count <= 4
+    """
+    stats = QueryStats()
+    stack = _counters.__dict__.setdefault("stack", [])
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    for stats in getattr(_counters, "stack", ()):
+        stats.record(statement, elapsed)
+    if has_app_context():
+        stats = g.get("_query_stats")
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_timer(context):
+    # A failed statement never reaches after_cursor_execute.
+    started = context.connection.info.get("query_started") if context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument(app):
+    """Attach per-request query stats to ``app``.
+
+    Every response gets a ``Server-Timing: db;dur=...`` header. Requests that
+    repeat one statement ``SQL_N_PLUS_ONE_THRESHOLD`` times or more are
+    logged as likely N+1 patterns; with ``SQL_LOG_REQUESTS`` every request
+    is logged.
+    """
+    if not app.config["SQL_INSTRUMENTATION"]:
+        return
+
+    @app.before_request
+    def _start_query_stats():
+        g._query_stats = QueryStats()
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = g.pop("_query_stats", None)
+        if stats is None:
+            return response
+        response.headers.add(
+            "Server-Timing", f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries"'
+        )
+        repeated = stats.repeated(app.config["SQL_N_PLUS_ONE_THRESHOLD"])
+        if repeated or app.config["SQL_LOG_REQUESTS"]:
+            line = {
+                "event": "sql.request",
+                "method": request.method,
+                "path": request.path,
+                "endpoint": request.endpoint,
+                "status": response.status_code,
+                "queries": stats.count,
+                "db_ms": round(stats.seconds * 1000, 2),
+                "n_plus_one": [{"sql": sql, "count": n} for sql, n in repeated],
+            }
+            logger.log(logging.WARNING if repeated else logging.INFO, json.dumps(line))
+        return response
+
+
+# -------- Readiness -------- #
+_readiness = {"checked_at": float("-inf"), "error": "not checked"}
+_readiness_lock = threading.Lock()
+
+
+def check_database(max_age):
+    """Run ``SELECT 1`` on the primary at most once per ``max_age`` seconds.
+
+    Returns ``None`` when the database answered, else the error text. Only
+    one thread probes at a time; the rest reuse the last result.
+    """
+    if time.monotonic() - _readiness["checked_at"] < max_age:
+        return _readiness["error"]
+    if not _readiness_lock.acquire(blocking=False):
+        return _readiness["error"]
+    try:
+        try:
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT 1")
+            _readiness["error"] = None
+        except Exception as exc:
+            _readiness["error"] = f"{type(exc).__name__}: {exc}"
+            logger.warning("readiness check failed: %s", _readiness["error"])
+        _readiness["checked_at"] = time.monotonic()
+        return _readiness["error"]
+    finally:
+        _readiness_lock.release()
+
 
 # Global SQLAlchemy instance
 # Imported by models and initialized in app factory
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={"class_": RoutingSession})
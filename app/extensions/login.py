@@ -1,4 +1,96 @@
-from flask_login import LoginManager
+from flask_login import LoginManager, UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .cache import MISSING, MemoryBackend
 
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
+
+
+class UserSnapshot(UserMixin):
+    """Immutable copy of the columns request handlers read from ``current_user``.
+
+    Relationships are deliberately absent; code that needs them loads the
+    ``User`` row explicitly.
+    """
+
+    __slots__ = ("id", "username", "email", "role", "created_at")
+
+    def __init__(self, user):
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(user, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserSnapshot is read-only")
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.id} {self.username}>"
+
+
+class UserCache:
+    """Per-process LRU of :class:`UserSnapshot` keyed by user id.
+
+    Entries expire after ``USER_CACHE_TTL`` seconds. ORM updates and deletes
+    of ``User`` evict the entry at flush and again after commit, so this
+    process never serves a stale role; other processes pick changes up
+    within the TTL.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self._listening = False
+
+    def init_app(self, app):
+        self.backend = MemoryBackend(app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"])
+        if not self._listening:
+            from ..models import User
+
+            event.listen(User, "after_update", self._on_change)
+            event.listen(User, "after_delete", self._on_change)
+            event.listen(Session, "after_commit", self._on_commit)
+            self._listening = True
+
+    def get(self, user_id, loader):
+        snapshot = self.backend.get(user_id)
+        if snapshot is not MISSING:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        user = loader(user_id)
+        if user is None:
+            return None
+        return self.put(user)
+
+    def put(self, user):
+        snapshot = UserSnapshot(user)
+        self.backend.set(snapshot.id, snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        self.backend.delete(user_id)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _on_change(self, mapper, connection, target):
+        self.invalidate(target.id)
+        session = Session.object_session(target)
+        if session is not None:
+            session.info.setdefault("changed_users", set()).add(target.id)
+
+    def _on_commit(self, session):
+        # A request that read the old row between flush and commit may have
+        # cached it again; evict once more now that the change is visible.
+        for user_id in session.info.pop("changed_users", ()):
+            self.invalidate(user_id)
+
+
+user_cache = UserCache()
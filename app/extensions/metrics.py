@@ -0,0 +1,213 @@
+import threading
+import time
+
+from flask import request
+from sqlalchemy.pool import QueuePool
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class _Shard:
+    """Counters written by exactly one thread, so updates need no lock."""
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.latency = {}  # (blueprint, endpoint) -> [bucket counts..., sum, count]
+        self.status = {}  # (blueprint, code) -> count
+        self.in_flight = 0
+        self.pool_wait = [0] * (len(POOL_WAIT_BUCKETS) + 2)
+
+
+def _observe(series, buckets, value):
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            series[i] += 1
+    series[-2] += value
+    series[-1] += 1
+
+
+def _merge(into, other):
+    for key, series in other.items():
+        total = into.get(key)
+        if total is None:
+            into[key] = list(series)
+        else:
+            for i, value in enumerate(series):
+                total[i] += value
+
+
+class Metrics:
+    """Process-wide request metrics rendered in Prometheus text format.
+
+    Each thread records into its own shard; :meth:`render` adds the shards
+    up. Shards of threads that have exited are folded into a retired total
+    so thread-per-request servers do not grow the shard list forever.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        @app.before_request
+        def _start_timer():
+            self._shard().in_flight += 1
+            request.environ["metrics.started"] = time.perf_counter()
+
+        @app.after_request
+        def _remember_status(response):
+            request.environ["metrics.status"] = response.status_code
+            return response
+
+        @app.teardown_request
+        def _stop_timer(exc):
+            started = request.environ.pop("metrics.started", None)
+            if started is None:
+                return
+            shard = self._shard()
+            shard.in_flight -= 1
+            blueprint = request.blueprint or "app"
+            key = (blueprint, request.endpoint or "none")
+            series = shard.latency.get(key)
+            if series is None:
+                series = shard.latency[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            _observe(series, LATENCY_BUCKETS, time.perf_counter() - started)
+            # after_request does not run when a view raises.
+            key = (blueprint, request.environ.pop("metrics.status", 500))
+            shard.status[key] = shard.status.get(key, 0) + 1
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe_pool_wait(self, seconds):
+        _observe(self._shard().pool_wait, POOL_WAIT_BUCKETS, seconds)
+
+    def _collect(self):
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                    continue
+                retired = self._retired
+                _merge(retired.latency, shard.latency)
+                for key, count in shard.status.items():
+                    retired.status[key] = retired.status.get(key, 0) + count
+                for i, value in enumerate(shard.pool_wait):
+                    retired.pool_wait[i] += value
+            self._shards = live
+            total = _Shard()
+            for shard in [self._retired] + live:
+                _merge(total.latency, shard.latency.copy())
+                for key, count in shard.status.copy().items():
+                    total.status[key] = total.status.get(key, 0) + count
+                for i, value in enumerate(list(shard.pool_wait)):
+                    total.pool_wait[i] += value
+                total.in_flight += shard.in_flight
+        return total
+
+    def render(self, engines=None, caches=None, password_hasher=None):
+        """Prometheus exposition text. ``engines`` maps bind names to engines;
+        ``caches`` maps cache names to objects with a ``stats()`` method;
+        ``password_hasher`` is a ``PasswordHasher``."""
+        engines = engines or {}
+        caches = caches or {}
+        total = self._collect()
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by blueprint and endpoint.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (blueprint, endpoint), series in sorted(total.latency.items()):
+            labels = f'blueprint="{blueprint}",endpoint="{endpoint}"'
+            lines.extend(_histogram("http_request_duration_seconds", labels, LATENCY_BUCKETS, series))
+
+        lines += [
+            "# HELP http_requests_total Responses by blueprint and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (blueprint, code), count in sorted(total.status.items()):
+            lines.append(f'http_requests_total{{blueprint="{blueprint}",code="{code}"}} {count}')
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {total.in_flight}",
+            "# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.",
+            "# TYPE db_pool_checkout_wait_seconds histogram",
+        ]
+        lines.extend(_histogram("db_pool_checkout_wait_seconds", "", POOL_WAIT_BUCKETS, total.pool_wait))
+
+        lines += [
+            "# HELP db_pool_connections Connections held by each engine's pool.",
+            "# TYPE db_pool_connections gauge",
+        ]
+        for name, engine in sorted(engines.items()):
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                lines.append(f'db_pool_connections{{bind="{name}",state="checked_out"}} {pool.checkedout()}')
+                lines.append(f'db_pool_connections{{bind="{name}",state="idle"}} {pool.checkedin()}')
+
+        lines += [
+            "# HELP cache_hits_total Cache lookups served from the cache.",
+            "# TYPE cache_hits_total counter",
+        ]
+        stats = {name: cache.stats() for name, cache in sorted(caches.items())}
+        lines += [f'cache_hits_total{{cache="{name}"}} {s["hits"]}' for name, s in stats.items()]
+        lines += ["# HELP cache_misses_total Cache lookups that hit the loader.", "# TYPE cache_misses_total counter"]
+        lines += [f'cache_misses_total{{cache="{name}"}} {s["misses"]}' for name, s in stats.items()]
+        lines += ["# HELP cache_hit_ratio Hits over lookups since start.", "# TYPE cache_hit_ratio gauge"]
+        lines += [f'cache_hit_ratio{{cache="{name}"}} {s["hit_ratio"]:.4f}' for name, s in stats.items()]
+
+        if password_hasher is not None:
+            s = password_hasher.stats()
+            lines += [
+                "# HELP password_hash_calls_total Password hashes and verifications completed.",
+                "# TYPE password_hash_calls_total counter",
+                f"password_hash_calls_total {s['calls']}",
+                "# HELP password_hash_rejected_total Calls refused because every hashing slot stayed busy.",
+                "# TYPE password_hash_rejected_total counter",
+                f"password_hash_rejected_total {s['rejected']}",
+                "# HELP password_hash_queue_seconds_total Time calls waited for a slot and a pool worker.",
+                "# TYPE password_hash_queue_seconds_total counter",
+                f"password_hash_queue_seconds_total {s['queue_seconds']:.6f}",
+                "# HELP password_hash_queue_seconds_max Longest wait of a single call since start.",
+                "# TYPE password_hash_queue_seconds_max gauge",
+                f"password_hash_queue_seconds_max {s['max_queue_seconds']:.6f}",
+                "# HELP password_hash_seconds_total Time spent hashing.",
+                "# TYPE password_hash_seconds_total counter",
+                f"password_hash_seconds_total {s['hash_seconds']:.6f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _histogram(name, labels, buckets, series):
+    sep = "," if labels else ""
+    lines = []
+    for bound, count in zip(list(buckets) + ["+Inf"], series[:-2] + [series[-1]]):
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {series[-2]:.6f}" if labels else f"{name}_sum {series[-2]:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {series[-1]}" if labels else f"{name}_count {series[-1]}")
+    return lines
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_pool_wait(time.perf_counter() - started)
+
+
+metrics = Metrics()
@@ -0,0 +1,136 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_WAIT seconds."""
+
+
+# These run in the pool processes. ``submitted`` is the caller's wall clock
+# so the time spent waiting for a slot and a free worker can be reported.
+def _hash(password, method, submitted):
+    started = time.time()
+    return generate_password_hash(password, method), started - submitted, time.time() - started
+
+
+def _verify(stored, password, submitted):
+    started = time.time()
+    return check_password_hash(stored, password), started - submitted, time.time() - started
+
+
+class PasswordHasher:
+    """Runs password hashing in a small process pool.
+
+    Key derivation is deliberately CPU-heavy; doing it on request threads lets
+    a burst of logins starve every other request in the worker. At most
+    ``PASSWORD_HASH_CONCURRENCY`` hashes are in flight per process; callers
+    beyond that wait up to ``PASSWORD_HASH_WAIT`` seconds and then get
+    :class:`PasswordHasherBusy`. With ``PASSWORD_HASH_WORKERS=0`` hashing runs
+    inline.
+
+    The pool is created on first use in each process so forked web workers do
+    not share one.
+    """
+
+    def __init__(self):
+        self.method = "scrypt"
+        self.workers = 0
+        self.concurrency = 1
+        self.wait = 5.0
+        self._prefix = None
+        self._pid = None
+        self._pool = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.rejected = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.concurrency = app.config["PASSWORD_HASH_CONCURRENCY"] or max(1, self.workers * 2)
+        self.wait = app.config["PASSWORD_HASH_WAIT"]
+        # werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1"),
+        # so compare stored hashes against a freshly generated prefix.
+        self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        self._pid = None
+
+    # -------- Public API -------- #
+    def hash(self, password):
+        return self._call(_hash, password, self.method)
+
+    def verify(self, stored, password):
+        return self._call(_verify, stored, password)
+
+    def needs_rehash(self, stored):
+        """True when ``stored`` was made with other parameters than the current policy."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return stored.split("$", 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "rejected": self.rejected,
+                "queue_seconds": self.queue_seconds,
+                "hash_seconds": self.hash_seconds,
+                "avg_queue_seconds": self.queue_seconds / self.calls if self.calls else 0.0,
+                "max_queue_seconds": self.max_queue_seconds,
+                "avg_hash_seconds": self.hash_seconds / self.calls if self.calls else 0.0,
+            }
+
+    # -------- Internals -------- #
+    def _ensure_pool(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # forkserver keeps the workers free of the web process's
+                    # threads and open sockets.
+                    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                    self._pool = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context(method)
+                    )
+                    self._slots = threading.BoundedSemaphore(self.concurrency)
+                    self._pid = os.getpid()
+        return self._pool, self._slots
+
+    def _call(self, fn, *args):
+        submitted = time.time()
+        if not self.workers:
+            result, queued, took = fn(*args, submitted)
+        else:
+            pool, slots = self._ensure_pool()
+            if not slots.acquire(timeout=self.wait):
+                with self._lock:
+                    self.rejected += 1
+                raise PasswordHasherBusy("password hashing is saturated")
+            try:
+                result, queued, took = pool.submit(fn, *args, submitted).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed); start a fresh pool next time
+                # and finish this call inline. The broken pool's management
+                # thread and surviving workers are released without waiting.
+                self._pid = None
+                pool.shutdown(wait=False)
+                result, queued, took = fn(*args, submitted)
+            finally:
+                slots.release()
+        with self._lock:
+            self.calls += 1
+            self.queue_seconds += queued
+            self.max_queue_seconds = max(self.max_queue_seconds, queued)
+            self.hash_seconds += took
+        return result
+
+
+password_hasher = PasswordHasher()
@@ -1,7 +1,10 @@
 from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from ..extensions.db import db
+from ..extensions.cache import hotel_cache
 from ..models import Role, Hotel, HotelPackage
+from ..services import geo
+from ..services.locations import location_index
 
 
 hotel_bp = Blueprint("hotel", __name__)
@@ -46,8 +49,15 @@ def create_hotel():
         contact_info=data.get("contact_info"),
         amenities=data.get("amenities"),
     )
+    try:
+        geo.set_coordinates(hotel, hotel.location, data)
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
     db.session.add(hotel)
     db.session.commit()
+    hotel_cache.bump()
+    location_index.add(hotel)
+    geo.hotel_geo_index.add(hotel)
     flash("Hotel created.", "success")
     return redirect(url_for("hotel.dashboard"))
 
@@ -62,7 +72,16 @@ def update_hotel(hotel_id):
     for field in ["name", "location", "description", "contact_info", "amenities"]:
         if field in data and data.get(field) is not None:
             setattr(hotel, field, data.get(field))
+    if any(field in data for field in ("location", "latitude", "longitude")):
+        try:
+            geo.set_coordinates(hotel, hotel.location, data)
+        except ValueError as exc:
+            db.session.rollback()
+            return {"error": str(exc)}, 400
     db.session.commit()
+    hotel_cache.bump()
+    location_index.add(hotel)
+    geo.hotel_geo_index.add(hotel)
     return {"message": "Hotel updated"}
 
 
@@ -74,6 +93,9 @@ def delete_hotel(hotel_id):
     hotel = Hotel.query.filter_by(id=hotel_id, user_id=current_user.id).first_or_404()
     db.session.delete(hotel)
     db.session.commit()
+    hotel_cache.bump()
+    location_index.remove(hotel_id)
+    geo.hotel_geo_index.remove(hotel_id)
     return {"message": "Hotel deleted"}
 
 
@@ -1,7 +1,7 @@
 from .user import User, Role
 from .hotel import Hotel, HotelPackage
-from .tourism import TourismPackage, TouristGuide, PackageGuide
-from .booking import Booking
+from .tourism import TourismPackage, TouristGuide, PackageGuide, SeatShard, PackageRecommendation
+from .booking import Booking, PackageBookingStats, ManagerBookingStats
 
 __all__ = [
     "User",
@@ -11,5 +11,9 @@ __all__ = [
     "TourismPackage",
     "TouristGuide",
     "PackageGuide",
+    "SeatShard",
+    "PackageRecommendation",
     "Booking",
+    "PackageBookingStats",
+    "ManagerBookingStats",
 ]
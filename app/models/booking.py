@@ -14,3 +14,51 @@ class Booking(db.Model):
     )
     status = db.Column(db.String(20), default="pending")
     booked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Provisional id handed out by the write-behind booking pipeline.
+    reference = db.Column(db.String(32), unique=True)
+    # Seat held for a capacity-limited package, released if still pending at expires_at.
+    seat_shard = db.Column(db.Integer)
+    expires_at = db.Column(db.DateTime)
+    # Package price locked in when the booking is confirmed; feeds revenue.
+    amount = db.Column(db.Numeric(10, 2))
+
+    __table_args__ = (
+        db.Index("ix_bookings_status_expires_at", "status", "expires_at"),
+        # Booking history pages walk one user's bookings newest first.
+        db.Index("ix_bookings_user_id_booked_at", "user_id", "booked_at"),
+    )
+
+
+class BookingStatsMixin:
+    """Booking counts per status and confirmed revenue, kept up to date by
+    ``services.booking_stats`` in the same transaction as the booking.
+
+    Each key's numbers are spread over several ``shard`` rows that are
+    summed on read, so concurrent bookings for one package or manager
+    update different rows instead of queueing on a single row lock.
+    """
+
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False, default=0)
+
+    total = db.Column(db.Integer, nullable=False, default=0)
+    pending = db.Column(db.Integer, nullable=False, default=0)
+    confirmed = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Integer, nullable=False, default=0)
+    expired = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+
+class PackageBookingStats(BookingStatsMixin, db.Model):
+    __tablename__ = "package_booking_stats"
+
+    package_id = db.Column(
+        db.Integer, db.ForeignKey("tourism_packages.id", ondelete="CASCADE"), primary_key=True
+    )
+
+
+class ManagerBookingStats(BookingStatsMixin, db.Model):
+    __tablename__ = "manager_booking_stats"
+
+    manager_id = db.Column(
+        db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
@@ -8,16 +8,22 @@ class Hotel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"))
     name = db.Column(db.String(100), nullable=False)
-    location = db.Column(db.String(100), nullable=False)
+    location = db.Column(db.String(100), nullable=False, index=True)
     description = db.Column(db.Text)
     contact_info = db.Column(db.String(100))
     amenities = db.Column(db.Text)
+    # Geocoded from location (or given explicitly); NULL when unknown.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     hotel_packages = db.relationship(
         "HotelPackage", backref="hotel", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (db.Index("ix_hotels_created_at_id", "created_at", "id"),)
+
 
 class HotelPackage(db.Model):
     __tablename__ = "hotel_packages"
@@ -11,14 +11,26 @@ class TourismPackage(db.Model):
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2), nullable=False)
     duration_days = db.Column(db.Integer)
+    # Seats on offer; NULL means unlimited. Free seats live in SeatShard rows.
+    capacity = db.Column(db.Integer)
+    # Geocoded from destination (or given explicitly); NULL when unknown.
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     created_by = db.Column(
         db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=True
     )
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     guides = db.relationship(
         "PackageGuide", backref="package", cascade="all, delete-orphan"
     )
+    seat_shards = db.relationship("SeatShard", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        db.Index("ix_tourism_packages_created_at_id", "created_at", "id"),
+        db.Index("ix_tourism_packages_created_by_created_at_id", "created_by", "created_at", "id"),
+    )
 
 
 class TouristGuide(db.Model):
@@ -31,6 +43,9 @@ class TouristGuide(db.Model):
     specialization = db.Column(db.String(100))
     experience_years = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_tourist_guides_created_at_id", "created_at", "id"),)
 
 
 class PackageGuide(db.Model):
@@ -43,3 +58,43 @@ class PackageGuide(db.Model):
     guide_id = db.Column(
         db.Integer, db.ForeignKey("tourist_guides.id", ondelete="CASCADE")
     )
+    # Dates the guide is committed to the package, end exclusive. Undated
+    # links never conflict with anything.
+    start_date = db.Column(db.Date)
+    end_date = db.Column(db.Date)
+
+    __table_args__ = (
+        db.Index("uq_package_guides_package_id_guide_id", "package_id", "guide_id", unique=True),
+        db.Index("ix_package_guides_guide_id_start_date", "guide_id", "start_date"),
+    )
+
+
+class SeatShard(db.Model):
+    """One slice of a package's free seats.
+
+    Splitting the counter over several rows lets concurrent bookings for the
+    same package decrement different rows instead of queueing on one lock.
+    """
+
+    __tablename__ = "package_seat_shards"
+
+    package_id = db.Column(
+        db.Integer, db.ForeignKey("tourism_packages.id", ondelete="CASCADE"), primary_key=True
+    )
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    available = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PackageRecommendation(db.Model):
+    """One precomputed "similar package" entry; ``rank`` 0 is the closest."""
+
+    __tablename__ = "package_recommendations"
+
+    package_id = db.Column(
+        db.Integer, db.ForeignKey("tourism_packages.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    similar_id = db.Column(
+        db.Integer, db.ForeignKey("tourism_packages.id", ondelete="CASCADE"), nullable=False
+    )
+    score = db.Column(db.Float, nullable=False)
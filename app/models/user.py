@@ -1,8 +1,8 @@
 from datetime import datetime
 from enum import Enum
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from ..extensions.db import db
+from ..extensions.passwords import password_hasher
 
 
 class Role(str, Enum):
@@ -27,7 +27,10 @@ class User(UserMixin, db.Model):
     )
 
     def set_password(self, password: str) -> None:
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+
+    def password_needs_rehash(self) -> bool:
+        return password_hasher.needs_rehash(self.password)
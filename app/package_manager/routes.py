@@ -1,7 +1,16 @@
-from flask import Blueprint, request, render_template, redirect, url_for, flash, jsonify
+from datetime import timedelta
+from flask import Blueprint, current_app, request, render_template, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.exc import IntegrityError
 from ..extensions.db import db
-from ..models import Role, TourismPackage, TouristGuide, PackageGuide
+from ..extensions.cache import catalog_cache
+from ..models import Booking, Role, TourismPackage, TouristGuide, PackageGuide
+from ..services import assignments, booking_stats, catalog, geo, importer, inventory
+from ..services.facets import facet_index
+from ..services.quotes import quote_index
+from ..services.recommendations import recommender
+from ..services.search import package_index
+from ..utils.pagination import get_page_args, keyset_page
 
 
 pkg_mgr_bp = Blueprint("pkg_mgr", __name__)
@@ -11,6 +20,14 @@ def require_package_manager():
     return current_user.is_authenticated and current_user.role == Role.package_manager
 
 
+def _capacity(data):
+    # Blank or missing means unlimited seats.
+    value = data.get("capacity")
+    if value in (None, ""):
+        return None
+    return max(0, int(value))
+
+
 @pkg_mgr_bp.before_request
 def ensure_pkg_role():
     if request.path.startswith("/manager") and request.method != "GET":
@@ -23,9 +40,30 @@ def ensure_pkg_role():
 def dashboard():
     if not require_package_manager():
         return redirect(url_for("auth.post_login_redirect"))
-    packages = TourismPackage.query.filter_by(created_by=current_user.id).all()
-    guides = TouristGuide.query.order_by(TouristGuide.created_at.desc()).all()
-    return render_template("package_manager/dashboard.html", packages=packages, guides=guides)
+    packages_cursor, limit = get_page_args("packages_cursor")
+    guides_cursor, _ = get_page_args("guides_cursor")
+    packages, next_packages_cursor = keyset_page(
+        TourismPackage.query.filter_by(created_by=current_user.id),
+        TourismPackage.created_at,
+        TourismPackage.id,
+        packages_cursor,
+        limit,
+    )
+    guides, next_guides_cursor = keyset_page(
+        TouristGuide.query, TouristGuide.created_at, TouristGuide.id, guides_cursor, limit
+    )
+    # Summary rows are maintained on every booking change, so the dashboard
+    # reads them instead of aggregating the bookings table.
+    package_stats = booking_stats.package_totals([p.id for p in packages])
+    return render_template(
+        "package_manager/dashboard.html",
+        packages=packages,
+        guides=guides,
+        stats=booking_stats.manager_totals(current_user.id),
+        package_stats=package_stats,
+        next_packages_cursor=next_packages_cursor,
+        next_guides_cursor=next_guides_cursor,
+    )
 
 
 @pkg_mgr_bp.route("/package", methods=["POST"])
@@ -34,6 +72,10 @@ def create_package():
     if not require_package_manager():
         return {"error": "Unauthorized"}, 403
     data = request.form if request.form else (request.json or {})
+    try:
+        capacity = _capacity(data)
+    except (TypeError, ValueError):
+        return {"error": "capacity must be a whole number"}, 400
     pkg = TourismPackage(
         title=data.get("title"),
         destination=data.get("destination"),
@@ -42,19 +84,31 @@ def create_package():
         duration_days=data.get("duration_days"),
         created_by=current_user.id,
     )
+    try:
+        geo.set_coordinates(pkg, pkg.destination, data)
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
     db.session.add(pkg)
     db.session.flush()
 
+    if capacity is not None:
+        inventory.set_capacity(pkg, capacity)
+
     # Optionally attach guides from form checkbox list
     guide_ids = request.form.getlist("guide_ids") if request.form else []
-    for gid in guide_ids:
-        try:
-            assoc = PackageGuide(package_id=pkg.id, guide_id=int(gid))
-            db.session.add(assoc)
-        except ValueError:
-            continue
+    try:
+        assignments.sync_guides({pkg.id: assignments.parse_guide_ids(guide_ids)})
+    except ValueError as exc:
+        db.session.rollback()
+        return {"error": str(exc)}, 400
 
     db.session.commit()
+    catalog_cache.bump()
+    package_index.add(pkg)
+    quote_index.refresh([pkg.id])
+    facet_index.refresh([pkg.id])
+    catalog.package_ids.refresh([pkg.id])
+    recommender.update(pkg)
     flash("Package created.", "success")
     return redirect(url_for("pkg_mgr.dashboard"))
 
@@ -66,10 +120,40 @@ def update_package(package_id):
         return {"error": "Unauthorized"}, 403
     pkg = TourismPackage.query.filter_by(id=package_id, created_by=current_user.id).first_or_404()
     data = request.form if request.form else (request.json or {})
+    old_duration = pkg.duration_days
     for field in ["title", "destination", "description", "price", "duration_days"]:
         if field in data and data.get(field) is not None:
             setattr(pkg, field, data.get(field))
+    if any(field in data for field in ("destination", "latitude", "longitude")):
+        try:
+            geo.set_coordinates(pkg, pkg.destination, data)
+        except ValueError as exc:
+            db.session.rollback()
+            return {"error": str(exc)}, 400
+    if str(pkg.duration_days) != str(old_duration):
+        # Dated guide assignments end duration_days after they start.
+        conflicts = assignments.reschedule(pkg)
+        if conflicts:
+            db.session.rollback()
+            return {
+                "error": "New duration would double-book guides",
+                "conflicts": [{"guide_id": g, "package_ids": p} for g, p in conflicts],
+            }, 409
+    if "capacity" in data:
+        try:
+            capacity = _capacity(data)
+        except (TypeError, ValueError):
+            db.session.rollback()
+            return {"error": "capacity must be a whole number"}, 400
+        if capacity != pkg.capacity:
+            inventory.set_capacity(pkg, capacity)
     db.session.commit()
+    catalog_cache.bump()
+    package_index.add(pkg)
+    quote_index.refresh([pkg.id])
+    facet_index.refresh([pkg.id])
+    catalog.package_ids.refresh([pkg.id])
+    recommender.update(pkg)
     return {"message": "Package updated"}
 
 
@@ -79,11 +163,59 @@ def delete_package(package_id):
     if not require_package_manager():
         return {"error": "Unauthorized"}, 403
     pkg = TourismPackage.query.filter_by(id=package_id, created_by=current_user.id).first_or_404()
+    booking_stats.forget_package(pkg.id)
     db.session.delete(pkg)
     db.session.commit()
+    catalog_cache.bump()
+    package_index.remove(package_id)
+    quote_index.refresh([package_id])
+    facet_index.refresh([package_id])
+    catalog.package_ids.refresh([package_id])
+    recommender.remove(package_id)
     return {"message": "Package deleted"}
 
 
+# Status changes a manager may make to a booking of one of their packages.
+BOOKING_TRANSITIONS = {"pending": {"confirmed", "cancelled"}, "confirmed": {"cancelled"}}
+
+
+@pkg_mgr_bp.route("/booking/<int:booking_id>", methods=["PUT", "PATCH"])
+@login_required
+def update_booking(booking_id):
+    if not require_package_manager():
+        return {"error": "Unauthorized"}, 403
+    booking = (
+        Booking.query.join(TourismPackage, TourismPackage.id == Booking.package_id)
+        .filter(Booking.id == booking_id, TourismPackage.created_by == current_user.id)
+        .first_or_404()
+    )
+    data = request.form if request.form else (request.json or {})
+    status = data.get("status")
+    old = booking.status
+    if status not in BOOKING_TRANSITIONS.get(old, ()):
+        return {"error": f"cannot change a {old} booking to {status}"}, 400
+
+    values = {"status": status, "expires_at": None}
+    amount = booking.amount
+    if status == "confirmed":
+        amount = values["amount"] = db.session.scalar(
+            db.select(TourismPackage.price).filter_by(id=booking.package_id)
+        )
+    # Conditional on the old status so a hold expiring at the same moment
+    # is not counted twice.
+    changed = db.session.execute(
+        db.update(Booking).where(Booking.id == booking.id, Booking.status == old).values(**values)
+    ).rowcount
+    if not changed:
+        db.session.rollback()
+        return {"error": "Booking changed meanwhile; reload and retry"}, 409
+    if status == "cancelled" and booking.seat_shard is not None:
+        inventory.release_seat(booking.package_id, booking.seat_shard)
+    booking_stats.record([(booking.package_id, old, status, amount)])
+    db.session.commit()
+    return {"message": "Booking updated", "status": status}
+
+
 @pkg_mgr_bp.route("/guide", methods=["POST"])
 @login_required
 def create_guide():
@@ -99,6 +231,8 @@ def create_guide():
     )
     db.session.add(guide)
     db.session.commit()
+    catalog_cache.bump()
+    quote_index.refresh_guide(guide.id)
     flash("Guide created.", "success")
     return redirect(url_for("pkg_mgr.dashboard"))
 
@@ -114,6 +248,8 @@ def update_guide(guide_id):
         if field in data and data.get(field) is not None:
             setattr(guide, field, data.get(field))
     db.session.commit()
+    catalog_cache.bump()
+    quote_index.refresh_guide(guide_id)
     return {"message": "Guide updated"}
 
 
@@ -125,6 +261,8 @@ def delete_guide(guide_id):
     guide = TouristGuide.query.get_or_404(guide_id)
     db.session.delete(guide)
     db.session.commit()
+    catalog_cache.bump()
+    quote_index.refresh_guide(guide_id)
     return {"message": "Guide deleted"}
 
 
@@ -138,12 +276,155 @@ def attach_guide(package_id):
     guide_id = data.get("guide_id")
     if not guide_id:
         return {"error": "guide_id required"}, 400
-    assoc = PackageGuide(package_id=pkg.id, guide_id=int(guide_id))
+    guide_id = int(guide_id)
+    assoc = PackageGuide(package_id=pkg.id, guide_id=guide_id)
+    # With a start_date the guide is booked for the package's duration and
+    # must not be assigned elsewhere in that window.
+    if data.get("start_date"):
+        try:
+            start = assignments.parse_date(data.get("start_date"), "start_date")
+        except ValueError as exc:
+            return {"error": str(exc)}, 400
+        start, end = assignments.assignment_window(pkg, start)
+        # The in-memory schedule turns away most conflicts without a lock;
+        # the locked query catches whatever it has not seen yet.
+        clash = assignments.guide_schedule.conflicts(guide_id, start, end)
+        if not clash:
+            clash = assignments.find_conflicts(guide_id, start, end, exclude_package=pkg.id)
+        if clash:
+            db.session.rollback()
+            return {"error": "Guide is not available for these dates", "package_ids": clash}, 409
+        assoc.start_date, assoc.end_date = start, end
     db.session.add(assoc)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return {"error": "Guide already attached"}, 409
+    catalog_cache.bump()
+    quote_index.refresh([pkg.id])
+    facet_index.refresh([pkg.id])
+    catalog.package_ids.refresh([pkg.id])
+    if assoc.start_date:
+        assignments.guide_schedule.add(guide_id, assoc.start_date, assoc.end_date, pkg.id)
     return {"message": "Guide attached"}
 
 
+def _window(args):
+    """``[start, end)`` from ``start`` plus ``end``, ``days`` or ``package_id``."""
+    start = assignments.parse_date(args.get("start"), "start")
+    if args.get("end"):
+        end = assignments.parse_date(args.get("end"), "end")
+    elif args.get("package_id"):
+        pkg = db.session.get(TourismPackage, args.get("package_id", type=int))
+        if pkg is None:
+            raise ValueError("unknown package_id")
+        end = assignments.assignment_window(pkg, start)[1]
+    else:
+        end = start + timedelta(days=args.get("days", 1, type=int))
+    if end <= start:
+        raise ValueError("end must be after start")
+    return start, end
+
+
+@pkg_mgr_bp.route("/guides/available", methods=["GET"])
+@login_required
+def available_guides():
+    """Guides free for a whole window, optionally of one specialization."""
+    if not require_package_manager():
+        return {"error": "Unauthorized"}, 403
+    try:
+        start, end = _window(request.args)
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    guides = assignments.guide_schedule.available(start, end, request.args.get("specialization") or None)
+    return jsonify({"start": start.isoformat(), "end": end.isoformat(), "guides": guides})
+
+
+@pkg_mgr_bp.route("/guide/<int:guide_id>/availability", methods=["GET"])
+@login_required
+def guide_availability(guide_id):
+    if not require_package_manager():
+        return {"error": "Unauthorized"}, 403
+    TouristGuide.query.get_or_404(guide_id)
+    try:
+        start, end = _window(request.args)
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    clash = assignments.guide_schedule.conflicts(guide_id, start, end)
+    return {"guide_id": guide_id, "start": start.isoformat(), "end": end.isoformat(),
+            "free": not clash, "package_ids": clash}
+
+
+def _apply_guide_sync(desired):
+    try:
+        report = assignments.sync_guides(desired)
+        db.session.commit()
+    except ValueError as exc:
+        db.session.rollback()
+        return {"error": str(exc)}, 400
+    except IntegrityError:
+        # Another sync linked the same guide between our read and insert.
+        db.session.rollback()
+        return {"error": "Guides changed meanwhile; retry the sync"}, 409
+    if report.changed:
+        catalog_cache.bump()
+        quote_index.refresh(desired)
+        facet_index.refresh(desired)
+        catalog.package_ids.refresh(desired)
+    return report.to_dict()
+
+
+@pkg_mgr_bp.route("/package/<int:package_id>/guides", methods=["PUT"])
+@login_required
+def sync_package_guides(package_id):
+    """Replace a package's guides with ``guide_ids`` in one transaction."""
+    if not require_package_manager():
+        return {"error": "Unauthorized"}, 403
+    pkg = TourismPackage.query.filter_by(id=package_id, created_by=current_user.id).first_or_404()
+    data = request.json if request.is_json else {"guide_ids": request.form.getlist("guide_ids")}
+    try:
+        guide_ids = assignments.parse_guide_ids((data or {}).get("guide_ids"))
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+    return _apply_guide_sync({pkg.id: guide_ids})
+
+
+@pkg_mgr_bp.route("/packages/guides", methods=["PUT"])
+@login_required
+def sync_guides_batch():
+    """Sync guides for many packages at once.
+
+    Body: ``{"packages": [{"package_id": 1, "guide_ids": [2, 3]}, ...]}``.
+    Either every package is updated or none is.
+    """
+    if not require_package_manager():
+        return {"error": "Unauthorized"}, 403
+    items = (request.json or {}).get("packages") if request.is_json else None
+    if not isinstance(items, list):
+        return {"error": "packages must be a list of {package_id, guide_ids}"}, 400
+    desired = {}
+    try:
+        for item in items:
+            desired[int(item["package_id"])] = assignments.parse_guide_ids(item.get("guide_ids"))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return {"error": "packages must be a list of {package_id, guide_ids}"}, 400
+    if len(desired) > current_app.config["GUIDE_SYNC_MAX_PACKAGES"]:
+        return {"error": f"at most {current_app.config['GUIDE_SYNC_MAX_PACKAGES']} packages per call"}, 400
+
+    owned = set(
+        db.session.scalars(
+            db.select(TourismPackage.id).filter(
+                TourismPackage.id.in_(list(desired)), TourismPackage.created_by == current_user.id
+            )
+        )
+    )
+    missing = sorted(set(desired) - owned)
+    if missing:
+        return {"error": "Package not found", "package_ids": missing}, 404
+    return _apply_guide_sync(desired)
+
+
 @pkg_mgr_bp.route("/package/<int:package_id>/guides/<int:guide_id>", methods=["DELETE"])
 @login_required
 def detach_guide(package_id, guide_id):
@@ -152,4 +433,32 @@ def detach_guide(package_id, guide_id):
     assoc = PackageGuide.query.filter_by(package_id=package_id, guide_id=guide_id).first_or_404()
     db.session.delete(assoc)
     db.session.commit()
+    catalog_cache.bump()
+    quote_index.refresh([package_id])
+    facet_index.refresh([package_id])
+    catalog.package_ids.refresh([package_id])
+    assignments.guide_schedule.remove(guide_id, package_id)
     return {"message": "Guide detached"}
+
+
+@pkg_mgr_bp.route("/import/<kind>", methods=["POST"])
+@login_required
+def import_catalog(kind):
+    if not require_package_manager():
+        return {"error": "Unauthorized"}, 403
+    if kind not in {"packages", "guides"}:
+        return {"error": "kind must be packages or guides"}, 404
+    # Either a multipart upload or the raw request body; both are read lazily.
+    upload = request.files.get("file")
+    stream = upload.stream if upload else request.stream
+    try:
+        fmt = importer.detect_format(upload.filename if upload else None, request.args.get("format"))
+    except ValueError as exc:
+        return {"error": str(exc)}, 400
+
+    chunk_size = request.args.get("chunk_size", type=int)
+    if kind == "packages":
+        report = importer.import_packages(stream, fmt, current_user.id, chunk_size)
+    else:
+        report = importer.import_guides(stream, fmt, chunk_size)
+    return jsonify(report.to_dict())
@@ -0,0 +1,142 @@
+"""Production server hooks, wired into gunicorn by ``gunicorn.conf.py``.
+
+The master preloads the app, warms it up and forks the workers; each worker
+then opens its own database pools and booking journal.
+"""
+import gc
+import logging
+import os
+import random
+import time
+
+from sqlalchemy import func
+
+from .extensions.db import check_database, db
+from .extensions.login import user_cache
+from .models import Booking, Role, User
+from .services.booking_pipeline import booking_pipeline
+
+
+logger = logging.getLogger(__name__)
+
+
+def check_settings(app, workers):
+    """Refuse to serve with settings that break once there are several workers."""
+    if workers > 1 and app.config["CACHE_BACKEND"] == "memory":
+        # Each worker would bump its own cache version, so a catalog change
+        # made in one worker would never reach the pages and indexes of the
+        # others.
+        raise RuntimeError(
+            f"CACHE_BACKEND=memory cannot be shared by {workers} workers; "
+            "set CACHE_BACKEND=redis or run a single worker"
+        )
+
+
+# -------- Warmup -------- #
+def warm_up(app):
+    """Pay cold-start costs once, in the master, before workers fork.
+
+    Compiles every template, builds the in-memory catalog and hotel indexes
+    and primes the catalog and user caches, so workers inherit all of it
+    (copy-on-write) instead of each paying for it on its first requests.
+    Database connections opened here are closed again; every worker opens
+    its own pool after forking. Runs at startup and again before a reload
+    forks the next generation of workers.
+    """
+    from .customer.routes import warm_catalog_cache
+    from .services.assignments import guide_schedule
+    from .services.catalog import package_ids
+    from .services.facets import facet_index
+    from .services.geo import hotel_geo_index
+    from .services.locations import location_index
+    from .services.quotes import quote_index
+    from .services.recommendations import recommender
+    from .services.search import package_index
+
+    started = time.perf_counter()
+    templates = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in templates:
+        app.jinja_env.get_template(name)
+
+    with app.app_context():
+        for index in (package_ids, package_index, facet_index, location_index, quote_index,
+                      guide_schedule, hotel_geo_index, recommender):
+            # Synchronously: a background rebuild would not survive the fork.
+            if not index.is_current:
+                index.build()
+        warm_catalog_cache(app)
+        users = _prime_user_cache(app.config["SERVER_WARMUP_USERS"])
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    # Keep the garbage collector from touching (and so copying) the
+    # preloaded objects in every worker.
+    gc.collect()
+    gc.freeze()
+    logger.info(
+        "warmed up in %.2fs: %d templates, %d users cached",
+        time.perf_counter() - started, len(templates), users,
+    )
+
+
+def _prime_user_cache(limit):
+    """Cache the users most likely to come back first: the latest bookers,
+    then staff accounts. Returns how many were cached."""
+    if limit <= 0:
+        return 0
+    ids = list(db.session.scalars(
+        db.select(Booking.user_id)
+        .group_by(Booking.user_id)
+        .order_by(func.max(Booking.booked_at).desc())
+        .limit(limit)
+    ))
+    if len(ids) < limit:
+        ids += db.session.scalars(
+            db.select(User.id)
+            .filter(User.role != Role.customer, User.id.notin_(ids))
+            .order_by(User.id.desc())
+            .limit(limit - len(ids))
+        )
+    cached = 0
+    for start in range(0, len(ids), 1000):
+        for user in User.query.filter(User.id.in_(ids[start:start + 1000])):
+            user_cache.put(user)
+            cached += 1
+    return cached
+
+
+def _open_pools(count):
+    """Open up to ``count`` connections per engine now instead of on the
+    first requests."""
+    for engine in db.engines.values():
+        size = min(count, engine.pool.size()) if hasattr(engine.pool, "size") else 1
+        connections = []
+        try:
+            for _ in range(size):
+                connections.append(engine.connect())
+        except Exception as exc:
+            logger.warning("could not pre-open database connections: %s", exc)
+        finally:
+            for connection in connections:
+                connection.close()
+
+
+# -------- Worker -------- #
+def start_worker(app, threads):
+    """Per-worker setup right after the fork, before it accepts requests."""
+    # Workers must not all pick the same replicas.
+    random.seed()
+    with app.app_context():
+        # Connections the master may still hold belong to the master.
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        _open_pools(threads)
+        # Answer the first readiness probes from a real result.
+        check_database(0)
+    booking_pipeline.start()
+
+
+def stop_worker(timeout):
+    """Give the worker's queued bookings up to ``timeout`` seconds to commit."""
+    if not booking_pipeline.drain(timeout):
+        logger.warning("worker %d exiting with queued bookings; they stay journaled", os.getpid())
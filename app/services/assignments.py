@@ -0,0 +1,301 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from sqlalchemy import delete, insert
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db
+from ..models import PackageGuide, TouristGuide
+from .indexing import VersionedIndex
+
+
+class SyncReport:
+    def __init__(self):
+        self.packages = 0
+        self.changed = 0
+        self.added = 0
+        self.removed = 0
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def parse_guide_ids(values):
+    """Guide ids from a list of ints or numeric strings; raises ValueError."""
+    if values is None or isinstance(values, (str, bytes, dict)):
+        raise ValueError("guide_ids must be a list of guide ids")
+    try:
+        return {int(value) for value in values}
+    except (TypeError, ValueError):
+        raise ValueError("guide_ids must be a list of guide ids")
+
+
+def sync_guides(assignments):
+    """Make each package's guides exactly the given set.
+
+    ``assignments`` maps package id to the desired set of guide ids. Current
+    links for every package are read in one query and diffed in Python; the
+    differences are applied as one executemany INSERT plus one DELETE per
+    package that loses guides, in the caller's transaction. Unknown guide
+    ids raise ValueError before anything is written. Concurrent syncs of the
+    same package surface as IntegrityError from the unique
+    ``(package_id, guide_id)`` index.
+    """
+    report = SyncReport()
+    report.packages = len(assignments)
+    if not assignments:
+        return report
+
+    wanted = set().union(*assignments.values())
+    if wanted:
+        known = set(db.session.scalars(db.select(TouristGuide.id).filter(TouristGuide.id.in_(wanted))))
+        unknown = wanted - known
+        if unknown:
+            raise ValueError(f"unknown guide ids: {', '.join(map(str, sorted(unknown)))}")
+
+    current = {package_id: set() for package_id in assignments}
+    rows = db.session.execute(
+        db.select(PackageGuide.package_id, PackageGuide.guide_id).filter(
+            PackageGuide.package_id.in_(list(assignments))
+        )
+    )
+    for package_id, guide_id in rows:
+        current[package_id].add(guide_id)
+
+    links = []
+    changed = []
+    for package_id in sorted(assignments):
+        add = assignments[package_id] - current[package_id]
+        remove = current[package_id] - assignments[package_id]
+        if remove:
+            db.session.execute(
+                delete(PackageGuide).where(
+                    PackageGuide.package_id == package_id, PackageGuide.guide_id.in_(remove)
+                )
+            )
+        links += [{"package_id": package_id, "guide_id": guide_id} for guide_id in sorted(add)]
+        if add or remove:
+            changed.append(package_id)
+        report.added += len(add)
+        report.removed += len(remove)
+    if links:
+        db.session.execute(insert(PackageGuide), links)
+    report.changed = len(changed)
+    return report
+
+
+# -------- Dated assignments -------- #
+def assignment_window(package, start):
+    """``[start, end)`` for a guide assigned to ``package`` from ``start``."""
+    return start, start + timedelta(days=int(package.duration_days or 1))
+
+
+def parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+
+def find_conflicts(guide_id, start, end, exclude_package=None):
+    """Packages the guide is already assigned to during ``[start, end)``.
+
+    Takes a row lock on the guide first, so two transactions assigning the
+    same guide queue here and the second sees the first's assignment. This
+    is the authoritative check; :class:`GuideSchedule` only answers from
+    memory.
+    """
+    db.session.execute(db.select(TouristGuide.id).filter_by(id=guide_id).with_for_update())
+    query = db.select(PackageGuide.package_id).filter(
+        PackageGuide.guide_id == guide_id,
+        PackageGuide.start_date < end,
+        PackageGuide.end_date > start,
+    )
+    if exclude_package is not None:
+        query = query.filter(PackageGuide.package_id != exclude_package)
+    return sorted(db.session.scalars(query))
+
+
+def reschedule(package):
+    """Recompute end dates after the package's duration changed.
+
+    Returns ``[(guide_id, conflicting package ids)]`` for assignments that
+    would now overlap another one; the caller should roll back if any.
+    """
+    conflicts = []
+    links = PackageGuide.query.filter(
+        PackageGuide.package_id == package.id, PackageGuide.start_date.isnot(None)
+    ).all()
+    for link in links:
+        link.start_date, link.end_date = assignment_window(package, link.start_date)
+        clash = find_conflicts(link.guide_id, link.start_date, link.end_date, exclude_package=package.id)
+        if clash:
+            conflicts.append((link.guide_id, clash))
+    return conflicts
+
+
+class _Intervals:
+    """One guide's assignments sorted by start date.
+
+    ``reach[i]`` is the latest end among the first ``i + 1`` intervals, so
+    "does anything overlap [start, end)" is one bisect on the starts plus a
+    lookup: only intervals starting before ``end`` can overlap, and among
+    those one does exactly when the furthest-reaching ends after ``start``.
+    Listing the overlaps bisects ``reach`` as well, skipping the prefix that
+    ends by ``start``. Overlapping assignments from before conflicts were
+    checked are handled the same way.
+
+    ``add`` and ``discard`` patch the three lists at one position; ``reach``
+    only changes over the run of entries the patched end dominated, which
+    is found by bisect on insert and ends at the first unchanged entry on
+    removal.
+    """
+
+    __slots__ = ("items", "starts", "reach", "spans")
+
+    def __init__(self):
+        self.items = []  # (start, end, package_id)
+        self.starts = []
+        self.reach = []
+        self.spans = {}  # package_id -> (start, end)
+
+    def add(self, start, end, package_id):
+        if package_id in self.spans:
+            self.discard(package_id)
+        i = bisect_left(self.items, (start, end, package_id))
+        self.items.insert(i, (start, end, package_id))
+        self.starts.insert(i, start)
+        self.spans[package_id] = (start, end)
+        if i and self.reach[i - 1] >= end:
+            self.reach.insert(i, self.reach[i - 1])
+            return
+        self.reach.insert(i, end)
+        stop = bisect_left(self.reach, end, i + 1)
+        self.reach[i + 1:stop] = [end] * (stop - i - 1)
+
+    def discard(self, package_id):
+        span = self.spans.pop(package_id, None)
+        if span is None:
+            return
+        i = bisect_left(self.items, (span[0], span[1], package_id))
+        del self.items[i], self.starts[i], self.reach[i]
+        furthest = self.reach[i - 1] if i else None
+        for j in range(i, len(self.items)):
+            end = self.items[j][1]
+            if furthest is None or end > furthest:
+                furthest = end
+            if self.reach[j] == furthest:
+                break
+            self.reach[j] = furthest
+
+    def _reindex(self):
+        self.starts = [item[0] for item in self.items]
+        self.spans = {package_id: (start, end) for start, end, package_id in self.items}
+        self.reach = []
+        furthest = None
+        for _, end, _ in self.items:
+            furthest = end if furthest is None or end > furthest else furthest
+            self.reach.append(furthest)
+
+    def is_free(self, start, end):
+        k = bisect_left(self.starts, end)
+        return k == 0 or self.reach[k - 1] <= start
+
+    def overlapping(self, start, end):
+        k = bisect_left(self.starts, end)
+        first = bisect_right(self.reach, start, 0, k)
+        return [package_id for s, e, package_id in self.items[first:k] if e > start]
+
+
+class GuideSchedule(VersionedIndex):
+    """Per-guide interval index over dated guide assignments.
+
+    Answers "is guide X free for [start, end)" with a bisect per guide and
+    "which guides with specialization S are free" with one such check per
+    guide of that specialization, without touching the database. Rebuilt
+    from two queries whenever the catalog version moves; attach and detach
+    patch it in place.
+    """
+
+    def __init__(self):
+        super().__init__(catalog_cache)
+        self._intervals = {}
+        self._guides = {}
+        self._by_specialization = {}
+
+    def load(self):
+        guides = db.session.execute(
+            db.select(
+                TouristGuide.id,
+                TouristGuide.name,
+                TouristGuide.specialization,
+                TouristGuide.rate_per_day,
+            ).order_by(TouristGuide.id)
+        ).all()
+        rows = db.session.execute(
+            db.select(
+                PackageGuide.guide_id,
+                PackageGuide.start_date,
+                PackageGuide.end_date,
+                PackageGuide.package_id,
+            ).filter(PackageGuide.start_date.isnot(None), PackageGuide.end_date.isnot(None))
+        ).all()
+
+        intervals = {}
+        for guide_id, start, end, package_id in rows:
+            intervals.setdefault(guide_id, _Intervals()).items.append((start, end, package_id))
+        for schedule in intervals.values():
+            schedule.items.sort()
+            schedule._reindex()
+        by_specialization = {}
+        for guide in guides:
+            by_specialization.setdefault(guide.specialization, []).append(guide.id)
+
+        self._intervals = intervals
+        self._guides = {guide.id: guide for guide in guides}
+        self._by_specialization = by_specialization
+
+    def add(self, guide_id, start, end, package_id):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._intervals.setdefault(guide_id, _Intervals()).add(start, end, package_id)
+            self._advance()
+
+    def remove(self, guide_id, package_id):
+        with self._lock:
+            if not self.is_built:
+                return
+            if guide_id in self._intervals:
+                self._intervals[guide_id].discard(package_id)
+            self._advance()
+
+    def conflicts(self, guide_id, start, end):
+        with self._lock:
+            self.ensure_current()
+            schedule = self._intervals.get(guide_id)
+            return schedule.overlapping(start, end) if schedule else []
+
+    def available(self, start, end, specialization=None):
+        """Guides free for the whole window, as dicts ordered by guide id."""
+        with self._lock:
+            self.ensure_current()
+            if specialization is None:
+                candidates = self._guides
+            else:
+                candidates = self._by_specialization.get(specialization, ())
+            free = []
+            for guide_id in candidates:
+                schedule = self._intervals.get(guide_id)
+                if schedule is None or schedule.is_free(start, end):
+                    guide = self._guides[guide_id]
+                    free.append({
+                        "id": guide.id,
+                        "name": guide.name,
+                        "specialization": guide.specialization,
+                        "rate_per_day": float(guide.rate_per_day),
+                    })
+            return free
+
+
+guide_schedule = GuideSchedule()
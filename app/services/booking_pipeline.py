@@ -0,0 +1,355 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from ..extensions.cache import MemoryBackend, create_backend
+from ..extensions.db import db
+from ..models import Booking
+from . import booking_stats
+
+
+logger = logging.getLogger(__name__)
+
+# How many recently failed references to remember for the status endpoint.
+MAX_FAILED = 10000
+
+
+class BookingPipeline:
+    """Write-behind queue that turns many booking requests into few commits.
+
+    ``submit`` appends the booking to an on-disk journal, queues it and
+    returns a provisional reference straight away. A background thread
+    drains the queue and inserts up to ``BOOKING_BATCH_SIZE`` bookings per
+    transaction. A booking is acknowledged only once its journal line is
+    written (and fsynced unless ``BOOKING_JOURNAL_FSYNC`` is off), so a crash
+    loses nothing: journals left behind by dead processes are replayed, and
+    the unique ``bookings.reference`` column makes the replay idempotent.
+
+    Journal writes are group-committed: submitters append under the lock
+    and then wait until their line is synced; whichever of them finds no
+    sync running flushes and fsyncs everything appended so far, so one
+    fsync acknowledges every booking that arrived meanwhile.
+
+    Queued references are also recorded in the cache backend until they are
+    committed, so a status poll answered by another worker is one lookup.
+
+    Journals are split into segments that are deleted once every booking in
+    them is committed. Each worker process has its own journal files, named
+    by pid and a random token so a process that inherits a dead one's pid
+    never writes to (or deletes) its journals, and its own flush thread.
+    ``start`` replays journals of dead processes and starts the thread;
+    servers call it when a worker boots so recovery never runs inside a
+    request. ``submit`` starts the thread lazily if nobody did.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(threading.Lock())
+        self._pid = None
+        self._references = MemoryBackend()
+
+    def init_app(self, app):
+        self.app = app
+        self._references = create_backend(app)
+
+    @property
+    def enabled(self):
+        return bool(self.app and self.app.config["BOOKING_PIPELINE"])
+
+    # -------- Public API -------- #
+    def submit(self, user_id, package_id):
+        self._ensure_started()
+        reference = uuid.uuid4().hex
+        row = {
+            "reference": reference,
+            "user_id": user_id,
+            "package_id": package_id,
+            "status": "pending",
+            "booked_at": datetime.utcnow().isoformat(),
+        }
+        with self._lock:
+            if self._segment_entries >= self.app.config["BOOKING_JOURNAL_SEGMENT_SIZE"]:
+                self._rotate()
+            self._journal.write(json.dumps(row) + "\n")
+            self._appended += 1
+            sequence = self._appended
+            self._segment_entries += 1
+            self._outstanding[self._segment] += 1
+            self._pending[reference] = (self._segment, user_id)
+        self._sync_through(sequence)
+        self._references.set(self._reference_key(reference), user_id, self.app.config["BOOKING_STATUS_TTL"])
+        self._queue.put(row)
+        return reference
+
+    def start(self):
+        """Replay journals left by dead processes, then start this process's
+        flush thread. Does nothing when the pipeline is off or running."""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self.app.app_context():
+            try:
+                recovered = self.recover()
+                if recovered:
+                    logger.info("booking pipeline recovered %d journaled bookings", recovered)
+            except Exception:
+                db.session.rollback()
+                logger.exception("booking journal recovery failed")
+        self._ensure_started()
+
+    def status(self, reference, user_id):
+        """``queued``, ``failed`` or ``None`` (not known to this process)."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return None
+            entry = self._pending.get(reference)
+            if entry is not None and entry[1] == user_id:
+                return "queued"
+            failed = self._failed.get(reference)
+            if failed is not None and failed == user_id:
+                return "failed"
+        return None
+
+    def journaled(self, reference, user_id):
+        """Whether the booking was accepted (possibly by another worker) and
+        is not committed yet."""
+        return self._references.get(self._reference_key(reference)) == user_id
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._pid == os.getpid() else 0
+
+    def drain(self, timeout):
+        """Wait up to ``timeout`` seconds for this process's queued bookings
+        to be committed, e.g. before a worker exits. Returns False if some
+        are still pending; they stay journaled for recovery."""
+        if self._pid != os.getpid():
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+    # -------- Startup and recovery -------- #
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pending = {}
+            self._failed = OrderedDict()
+            self._outstanding = Counter()
+            self._segment = 0
+            self._journal = None
+            self._appended = 0
+            self._synced_through = 0
+            self._syncing = False
+            self._token = uuid.uuid4().hex[:12]
+            self._pid = os.getpid()
+            self._rotate()
+            threading.Thread(target=self._run, name="booking-pipeline", daemon=True).start()
+
+    def _journal_dir(self):
+        path = self.app.config["BOOKING_JOURNAL_DIR"]
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _segment_path(self, segment):
+        return os.path.join(self._journal_dir(), f"bookings-{self._pid}-{self._token}-{segment}.jsonl")
+
+    @staticmethod
+    def _reference_key(reference):
+        return f"booking-queued:{reference}"
+
+    def _sync_through(self, sequence):
+        """Return once journal line ``sequence`` is flushed (and fsynced)."""
+        with self._synced:
+            while self._synced_through < sequence:
+                if self._syncing:
+                    self._synced.wait()
+                    continue
+                self._syncing = True
+                break
+            else:
+                return
+        try:
+            with self._lock:
+                self._journal.flush()
+                target = self._appended
+                # A duplicate descriptor stays valid if the segment rotates
+                # while we sync outside the lock.
+                fd = os.dup(self._journal.fileno()) if self.app.config["BOOKING_JOURNAL_FSYNC"] else None
+            if fd is not None:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        except BaseException:
+            with self._synced:
+                self._syncing = False
+                self._synced.notify_all()
+            raise
+        with self._synced:
+            self._synced_through = max(self._synced_through, target)
+            self._syncing = False
+            self._synced.notify_all()
+
+    def _rotate(self):
+        if self._journal is not None:
+            # Lines appended since the last group sync live only in this
+            # segment; make them durable before it is closed.
+            self._journal.flush()
+            if self.app.config["BOOKING_JOURNAL_FSYNC"]:
+                os.fsync(self._journal.fileno())
+            self._journal.close()
+            if not self._outstanding[self._segment]:
+                os.remove(self._segment_path(self._segment))
+        self._segment += 1
+        self._segment_entries = 0
+        self._journal = open(self._segment_path(self._segment), "a", encoding="utf-8")
+
+    def recover(self):
+        """Replay journals left by processes that are no longer running.
+
+        Returns the number of bookings inserted.
+        """
+        recovered = 0
+        for path in sorted(glob.glob(os.path.join(self._journal_dir(), "bookings-*.jsonl"))):
+            # bookings-<pid>-<token>-<segment>.jsonl
+            pid, token = os.path.basename(path).split("-")[1:3]
+            if int(pid) == os.getpid():
+                # Ours, or left by an earlier process with the same pid.
+                if self._pid == os.getpid() and token == self._token:
+                    continue
+            elif _process_alive(int(pid)):
+                continue
+            # Claim the file first so two recovering workers never replay it twice.
+            claimed = f"{path}.replay-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            rows = []
+            with open(claimed, encoding="utf-8") as journal:
+                for line in journal:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        # A torn final line was never acknowledged.
+                        continue
+            recovered += self._insert_missing(rows)
+            for row in rows:
+                self._references.delete(self._reference_key(row["reference"]))
+            os.remove(claimed)
+        return recovered
+
+    def _insert_missing(self, rows):
+        inserted = 0
+        for start in range(0, len(rows), self.app.config["BOOKING_BATCH_SIZE"]):
+            chunk = rows[start:start + self.app.config["BOOKING_BATCH_SIZE"]]
+            refs = [row["reference"] for row in chunk]
+            existing = set(
+                db.session.scalars(db.select(Booking.reference).filter(Booking.reference.in_(refs)))
+            )
+            missing = [row for row in chunk if row["reference"] not in existing]
+            inserted += len(missing) - len(self._write(missing))
+        return inserted
+
+    # -------- Flushing -------- #
+    def _run(self):
+        batch_size = self.app.config["BOOKING_BATCH_SIZE"]
+        interval = self.app.config["BOOKING_FLUSH_INTERVAL"]
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            with self.app.app_context():
+                failed = self._write_with_retry(batch)
+            self._settle(batch, failed)
+
+    def _write_with_retry(self, batch):
+        delay = 0.1
+        while True:
+            try:
+                return self._write(batch)
+            except SQLAlchemyError:
+                db.session.rollback()
+                logger.exception("booking flush failed; retrying in %.1fs", delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def _write(self, rows):
+        """Insert rows in one transaction; returns the references that could
+        not be stored (e.g. the package was deleted meanwhile)."""
+        if not rows:
+            return []
+        values = [dict(row, booked_at=datetime.fromisoformat(row["booked_at"])) for row in rows]
+        try:
+            db.session.execute(insert(Booking), values)
+            booking_stats.record((row["package_id"], None, "pending", None) for row in values)
+            db.session.commit()
+            return []
+        except IntegrityError:
+            db.session.rollback()
+
+        failed = []
+        for row in values:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(Booking), [row])
+                    booking_stats.record([(row["package_id"], None, "pending", None)])
+            except IntegrityError:
+                failed.append(row["reference"])
+        db.session.commit()
+        return failed
+
+    def _settle(self, batch, failed):
+        failed = set(failed)
+        for row in batch:
+            self._references.delete(self._reference_key(row["reference"]))
+        with self._lock:
+            for row in batch:
+                segment, user_id = self._pending.pop(row["reference"])
+                if row["reference"] in failed:
+                    self._failed[row["reference"]] = user_id
+                    if len(self._failed) > MAX_FAILED:
+                        self._failed.popitem(last=False)
+                self._outstanding[segment] -= 1
+                if not self._outstanding[segment] and segment != self._segment:
+                    del self._outstanding[segment]
+                    os.remove(self._segment_path(segment))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+booking_pipeline = BookingPipeline()
@@ -0,0 +1,198 @@
+import random
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, literal, update
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions.db import db
+from ..models import Booking, ManagerBookingStats, PackageBookingStats, TourismPackage
+
+
+STATUSES = ("pending", "confirmed", "cancelled", "expired")
+COLUMNS = ("total",) + STATUSES + ("revenue",)
+
+
+def _delta(old, new, amount):
+    """Column changes for one booking moving from ``old`` to ``new`` status.
+
+    ``old=None`` is a new booking and ``new=None`` a deleted one. ``amount``
+    counts towards revenue while the booking is confirmed.
+    """
+    delta = Counter()
+    if old is None:
+        delta["total"] += 1
+    elif old in STATUSES:
+        delta[old] -= 1
+    if new is None:
+        delta["total"] -= 1
+    elif new in STATUSES:
+        delta[new] += 1
+    if old == "confirmed":
+        delta["revenue"] -= amount or 0
+    if new == "confirmed":
+        delta["revenue"] += amount or 0
+    return delta
+
+
+def _apply(model, key_column, key, shard, delta):
+    values = {column: getattr(model, column) + n for column, n in delta.items() if n}
+    if not values:
+        return
+    stmt = update(model).where(key_column == key, model.shard == shard).values(values)
+    if db.session.execute(stmt).rowcount:
+        return
+    # First booking on this shard: create the row, unless a concurrent
+    # transaction just did, in which case fall back to the update.
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model), [{key_column.key: key, "shard": shard, **delta}])
+    except IntegrityError:
+        db.session.execute(stmt)
+
+
+def _summed(model, key_column):
+    columns = [func.coalesce(func.sum(getattr(model, column)), 0).label(column) for column in COLUMNS]
+    return db.select(key_column, *columns).group_by(key_column)
+
+
+def package_totals(package_ids):
+    """Summed summaries for ``package_ids``, keyed by package id; packages
+    without bookings are missing from the result."""
+    if not package_ids:
+        return {}
+    query = _summed(PackageBookingStats, PackageBookingStats.package_id).filter(
+        PackageBookingStats.package_id.in_(list(package_ids))
+    )
+    return {row.package_id: row for row in db.session.execute(query)}
+
+
+def manager_totals(manager_id):
+    """Summed summary of every package a manager owns, or None."""
+    query = _summed(ManagerBookingStats, ManagerBookingStats.manager_id).filter(
+        ManagerBookingStats.manager_id == manager_id
+    )
+    return db.session.execute(query).first()
+
+
+def record(changes):
+    """Fold booking changes into the summaries inside the caller's transaction.
+
+    ``changes`` is an iterable of ``(package_id, old_status, new_status,
+    amount)``. Deltas are summed per package and per manager first, so a
+    batch of bookings costs one UPDATE per affected key rather than one per
+    booking. The whole call writes to one randomly chosen shard, and rows
+    are touched in key order to keep lock order stable.
+    """
+    by_package = defaultdict(Counter)
+    for package_id, old, new, amount in changes:
+        by_package[package_id].update(_delta(old, new, amount))
+    if not by_package:
+        return
+
+    owners = dict(
+        db.session.execute(
+            db.select(TourismPackage.id, TourismPackage.created_by).filter(
+                TourismPackage.id.in_(list(by_package))
+            )
+        ).all()
+    )
+    by_manager = defaultdict(Counter)
+    for package_id, delta in by_package.items():
+        if owners.get(package_id) is not None:
+            by_manager[owners[package_id]].update(delta)
+
+    shard = random.randrange(current_app.config["BOOKING_STATS_SHARDS"])
+    for package_id in sorted(by_package):
+        _apply(PackageBookingStats, PackageBookingStats.package_id, package_id, shard, by_package[package_id])
+    for manager_id in sorted(by_manager):
+        _apply(ManagerBookingStats, ManagerBookingStats.manager_id, manager_id, shard, by_manager[manager_id])
+
+
+def forget_package(package_id):
+    """Take a package's numbers out of its manager's totals and drop its
+    summary rows, before the package and its bookings are deleted."""
+    stats = package_totals([package_id]).get(package_id)
+    if stats is None:
+        return
+    manager_id = db.session.scalar(db.select(TourismPackage.created_by).filter_by(id=package_id))
+    if manager_id is not None:
+        delta = Counter({column: -(getattr(stats, column) or 0) for column in COLUMNS})
+        shard = random.randrange(current_app.config["BOOKING_STATS_SHARDS"])
+        _apply(ManagerBookingStats, ManagerBookingStats.manager_id, manager_id, shard, delta)
+    db.session.execute(delete(PackageBookingStats).where(PackageBookingStats.package_id == package_id))
+
+
+# -------- Backfill and verification -------- #
+def _package_aggregate():
+    columns = [Booking.package_id.label("package_id"), func.count(Booking.id).label("total")]
+    for status in STATUSES:
+        columns.append(func.coalesce(func.sum(case((Booking.status == status, 1), else_=0)), 0).label(status))
+    columns.append(
+        func.coalesce(
+            func.sum(case((Booking.status == "confirmed", func.coalesce(Booking.amount, 0)), else_=0)), 0
+        ).label("revenue")
+    )
+    return db.select(*columns).group_by(Booking.package_id)
+
+
+def _manager_aggregate():
+    packages = _package_aggregate().subquery()
+    columns = [TourismPackage.created_by.label("manager_id")]
+    columns += [func.sum(packages.c[column]).label(column) for column in COLUMNS]
+    return (
+        db.select(*columns)
+        .join(packages, packages.c.package_id == TourismPackage.id)
+        .filter(TourismPackage.created_by.isnot(None))
+        .group_by(TourismPackage.created_by)
+    )
+
+
+def rebuild():
+    """Recompute both summary tables from ``bookings`` in one transaction.
+
+    Every key's totals land in shard 0; later bookings spread over the rest.
+    """
+    db.session.execute(delete(PackageBookingStats))
+    db.session.execute(delete(ManagerBookingStats))
+    for model, key, aggregate in (
+        (PackageBookingStats, "package_id", _package_aggregate()),
+        (ManagerBookingStats, "manager_id", _manager_aggregate()),
+    ):
+        rows = aggregate.subquery()
+        db.session.execute(
+            insert(model).from_select(
+                (key, "shard") + COLUMNS,
+                db.select(rows.c[key], literal(0), *(rows.c[column] for column in COLUMNS)),
+            )
+        )
+    db.session.commit()
+
+
+def _normalize(row):
+    return tuple(Decimal(str(row.get(c) or 0)) if c == "revenue" else int(row.get(c) or 0) for c in COLUMNS)
+
+
+def check():
+    """Compare the summaries with a fresh aggregate.
+
+    Returns a list of ``(table, key, stored, expected)`` for every row that
+    differs; an empty list means the summaries are consistent.
+    """
+    problems = []
+    for table, model, key, aggregate in (
+        ("package", PackageBookingStats, "package_id", _package_aggregate()),
+        ("manager", ManagerBookingStats, "manager_id", _manager_aggregate()),
+    ):
+        expected = {row[key]: _normalize(row) for row in db.session.execute(aggregate).mappings()}
+        stored = {
+            row[key]: _normalize(row)
+            for row in db.session.execute(_summed(model, getattr(model, key))).mappings()
+        }
+        empty = _normalize({})
+        for k in sorted(set(expected) | set(stored)):
+            have, want = stored.get(k, empty), expected.get(k, empty)
+            if have != want:
+                problems.append((table, k, dict(zip(COLUMNS, have)), dict(zip(COLUMNS, want))))
+    return problems
@@ -0,0 +1,275 @@
+import json
+from itertools import groupby
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db, from_primary
+from ..models import TourismPackage, TouristGuide, PackageGuide, User
+from ..utils.pagination import apply_cursor, page_result
+from .indexing import VersionedIndex
+
+
+class CatalogRow:
+    """Read-only view of a package with its guides and creator flattened in.
+
+    ``guide_names``, ``guide_contacts`` and ``guide_rates`` are ", "-joined
+    strings because that is what the customer templates split on.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "destination",
+        "description",
+        "price",
+        "duration_days",
+        "created_by",
+        "created_at",
+        "created_by_name",
+        "guides",
+    )
+
+    def __init__(self, row):
+        self.id = row.id
+        self.title = row.title
+        self.destination = row.destination
+        self.description = row.description
+        self.price = row.price
+        self.duration_days = row.duration_days
+        self.created_by = row.created_by
+        self.created_at = row.created_at
+        self.created_by_name = row.created_by_name or ""
+        self.guides = []
+
+    @property
+    def guide_names(self):
+        return ", ".join(g[0] for g in self.guides)
+
+    @property
+    def guide_contacts(self):
+        return ", ".join(g[1] or "" for g in self.guides)
+
+    @property
+    def guide_rates(self):
+        return ", ".join(f"{g[2]:.2f}" for g in self.guides)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "title": self.title,
+            "destination": self.destination,
+            "description": self.description,
+            "price": float(self.price),
+            "duration_days": self.duration_days,
+            "created_by_name": self.created_by_name,
+            "guides": [
+                {"name": name, "contact_info": contact, "rate_per_day": float(rate)}
+                for name, contact, rate in self.guides
+            ],
+        }
+
+
+def _package_columns():
+    return db.select(
+        TourismPackage.id,
+        TourismPackage.title,
+        TourismPackage.destination,
+        TourismPackage.description,
+        TourismPackage.price,
+        TourismPackage.duration_days,
+        TourismPackage.created_by,
+        TourismPackage.created_at,
+    )
+
+
+def _load_rows(page):
+    """Join a derived table of packages to creators and guides in one query.
+
+    The page is limited before the join so guide fan-out cannot eat into the
+    page size. Rows come back one per (package, guide) and are folded here.
+    """
+    page = page.subquery("page")
+    stmt = (
+        db.select(
+            page,
+            User.username.label("created_by_name"),
+            TouristGuide.name.label("guide_name"),
+            TouristGuide.contact_info.label("guide_contact"),
+            TouristGuide.rate_per_day.label("guide_rate"),
+        )
+        .select_from(page)
+        .outerjoin(User, User.id == page.c.created_by)
+        .outerjoin(PackageGuide, PackageGuide.package_id == page.c.id)
+        .outerjoin(TouristGuide, TouristGuide.id == PackageGuide.guide_id)
+        .order_by(page.c.created_at.desc(), page.c.id.desc(), PackageGuide.id)
+    )
+    rows = {}
+    for record in db.session.execute(stmt):
+        row = rows.get(record.id)
+        if row is None:
+            row = rows[record.id] = CatalogRow(record)
+        if record.guide_name is not None:
+            row.guides.append((record.guide_name, record.guide_contact, record.guide_rate))
+    return list(rows.values())
+
+
+def fetch_page(cursor, limit, created_by=None, filters=None):
+    """One keyset page of catalog rows, newest first. Returns ``(rows, next_cursor)``."""
+    query = _package_columns()
+    if created_by is not None:
+        query = query.filter(TourismPackage.created_by == created_by)
+    if filters:
+        query = filters.apply(query)
+    query = apply_cursor(query, TourismPackage.created_at, TourismPackage.id, cursor)
+    query = query.order_by(TourismPackage.created_at.desc(), TourismPackage.id.desc()).limit(limit + 1)
+    return page_result(_load_rows(query), limit)
+
+
+def fetch_by_ids(ids):
+    """Catalog rows for ``ids``, returned in the order given."""
+    if not ids:
+        return []
+    rows = {row.id: row for row in _load_rows(_package_columns().filter(TourismPackage.id.in_(ids)))}
+    return [rows[i] for i in ids if i in rows]
+
+
+# Columns an export may ask for, in output order. "guides" and
+# "created_by_name" need joins and are only added when requested.
+EXPORT_FIELDS = (
+    "id",
+    "title",
+    "destination",
+    "description",
+    "price",
+    "duration_days",
+    "capacity",
+    "created_at",
+    "updated_at",
+    "created_by_name",
+    "guides",
+)
+
+
+def _export_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if value is not None and not isinstance(value, (int, str)):
+        return float(value)
+    return value
+
+
+def iter_export(fields, since=None, batch_size=1000):
+    """Yield one dict per package, oldest first, without loading the catalog.
+
+    Rows are fetched through a server-side cursor ``batch_size`` at a time.
+    Guide rows arrive ordered by package, so each package's guides are
+    folded as soon as the next package starts.
+    """
+    columns = [getattr(TourismPackage, f) for f in fields if f not in ("created_by_name", "guides")]
+    if "id" not in fields:
+        columns.append(TourismPackage.id)
+    stmt = db.select(*columns)
+    if "created_by_name" in fields:
+        stmt = stmt.add_columns(User.username.label("created_by_name")).outerjoin(
+            User, User.id == TourismPackage.created_by
+        )
+    if "guides" in fields:
+        stmt = (
+            stmt.add_columns(
+                TouristGuide.name.label("guide_name"),
+                TouristGuide.contact_info.label("guide_contact"),
+                TouristGuide.rate_per_day.label("guide_rate"),
+            )
+            .outerjoin(PackageGuide, PackageGuide.package_id == TourismPackage.id)
+            .outerjoin(TouristGuide, TouristGuide.id == PackageGuide.guide_id)
+        )
+    if since is not None:
+        stmt = stmt.filter(TourismPackage.created_at >= since)
+    stmt = stmt.order_by(TourismPackage.id)
+    if "guides" in fields:
+        stmt = stmt.order_by(PackageGuide.id)
+
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for _, rows in groupby(result, key=lambda row: row.id):
+        rows = list(rows)
+        first = rows[0]
+        item = {}
+        for field in fields:
+            if field == "guides":
+                item["guides"] = [
+                    {"name": r.guide_name, "contact_info": r.guide_contact, "rate_per_day": float(r.guide_rate)}
+                    for r in rows
+                    if r.guide_name is not None
+                ]
+            else:
+                item[field] = _export_value(getattr(first, field))
+        yield item
+
+
+def export_ndjson(items):
+    for item in items:
+        yield json.dumps(item) + "\n"
+
+
+def export_json_array(items):
+    yield "["
+    separator = "\n"
+    for item in items:
+        yield separator + json.dumps(item)
+        separator = ",\n"
+    yield "\n]\n"
+
+
+class PackageIdSet(VersionedIndex):
+    """Ids of every package, for validating bookings without a DB lookup.
+
+    Packages with a seat limit are tracked separately because they need an
+    authoritative seat reservation at booking time. While the set is behind
+    the catalog version, lookups go to the database instead: a package
+    created or given a seat limit elsewhere must not be missed.
+    """
+
+    def __init__(self):
+        super().__init__(catalog_cache)
+        self._ids = frozenset()
+        self._limited = frozenset()
+
+    def load(self):
+        rows = db.session.execute(db.select(TourismPackage.id, TourismPackage.capacity)).all()
+        self._ids = frozenset(row.id for row in rows)
+        self._limited = frozenset(row.id for row in rows if row.capacity is not None)
+
+    def refresh(self, package_ids):
+        """Re-read ``package_ids`` after a change; gone ids are dropped."""
+        package_ids = set(package_ids)
+        with self._lock:
+            if not self.is_built or not package_ids:
+                return
+            rows = db.session.execute(
+                db.select(TourismPackage.id, TourismPackage.capacity).filter(TourismPackage.id.in_(package_ids))
+            ).all()
+            self._ids = self._ids - package_ids | {row.id for row in rows}
+            self._limited = self._limited - package_ids | {row.id for row in rows if row.capacity is not None}
+            self._advance()
+
+    def _lookup(self, package_id):
+        """``(exists, limited)`` for a package the set may not know yet."""
+        with from_primary():
+            row = db.session.execute(
+                db.select(TourismPackage.capacity).filter_by(id=package_id)
+            ).first()
+        return row is not None, row is not None and row.capacity is not None
+
+    def __contains__(self, package_id):
+        with self._lock:
+            if self.ensure_current():
+                return package_id in self._ids
+        return self._lookup(package_id)[0]
+
+    def is_limited(self, package_id):
+        with self._lock:
+            if self.ensure_current():
+                return package_id in self._limited
+        return self._lookup(package_id)[1]
+
+
+package_ids = PackageIdSet()
@@ -0,0 +1,322 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db
+from ..models import PackageGuide, TourismPackage, TouristGuide
+from .indexing import VersionedIndex
+
+
+# (value, low, high) with low inclusive and high exclusive; None is open.
+PRICE_BUCKETS = [("0-100", 0, 100), ("100-500", 100, 500), ("500-1000", 500, 1000), ("1000+", 1000, None)]
+DURATION_BUCKETS = [("1", 1, 2), ("2-3", 2, 4), ("4-7", 4, 8), ("7+", 8, None)]
+
+# Most frequent values listed for open-ended facets.
+FACET_LIMIT = 20
+
+
+def _bucket(buckets, value):
+    for name, low, high in buckets:
+        if name == value:
+            return low, high
+    raise ValueError(f"unknown range {value!r}")
+
+
+class PackageFilters:
+    """Catalog filters parsed from query arguments.
+
+    Ranges can be given as a bucket (``price=100-500``, ``duration=4-7``, the
+    values the facet counts use) or as explicit bounds (``min_price``,
+    ``max_price``, ``min_days``, ``max_days``; min inclusive, max exclusive).
+    ``destination`` and ``specialization`` may repeat and match any value.
+    """
+
+    def __init__(self, min_price=None, max_price=None, min_days=None, max_days=None,
+                 destinations=(), specializations=()):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_days = min_days
+        self.max_days = max_days
+        self.destinations = frozenset(destinations)
+        self.specializations = frozenset(specializations)
+
+    @classmethod
+    def from_args(cls, args):
+        """Build filters from ``request.args``; raises ValueError on bad input."""
+        min_price, max_price = cls._range(args, "price", PRICE_BUCKETS, "min_price", "max_price", Decimal)
+        min_days, max_days = cls._range(args, "duration", DURATION_BUCKETS, "min_days", "max_days", int)
+        return cls(
+            min_price,
+            max_price,
+            min_days,
+            max_days,
+            [d for d in args.getlist("destination") if d],
+            [s for s in args.getlist("specialization") if s],
+        )
+
+    @staticmethod
+    def _range(args, bucket_arg, buckets, low_arg, high_arg, convert):
+        if args.get(bucket_arg):
+            return _bucket(buckets, args[bucket_arg])
+        bounds = []
+        for arg in (low_arg, high_arg):
+            value = args.get(arg)
+            try:
+                bounds.append(convert(value) if value not in (None, "") else None)
+            except (InvalidOperation, ValueError):
+                raise ValueError(f"{arg} must be a number")
+        return tuple(bounds)
+
+    def __bool__(self):
+        return any(
+            v is not None for v in (self.min_price, self.max_price, self.min_days, self.max_days)
+        ) or bool(self.destinations or self.specializations)
+
+    def cache_key(self):
+        return "|".join(
+            str(part)
+            for part in (
+                self.min_price, self.max_price, self.min_days, self.max_days,
+                ",".join(sorted(self.destinations)), ",".join(sorted(self.specializations)),
+            )
+        )
+
+    def apply(self, query):
+        """Add the filters to a select of ``TourismPackage`` as SQL WHERE clauses."""
+        if self.min_price is not None:
+            query = query.filter(TourismPackage.price >= self.min_price)
+        if self.max_price is not None:
+            query = query.filter(TourismPackage.price < self.max_price)
+        # Packages without a duration count as one day, like the listing shows them.
+        days = db.func.coalesce(TourismPackage.duration_days, 1)
+        if self.min_days is not None:
+            query = query.filter(days >= self.min_days)
+        if self.max_days is not None:
+            query = query.filter(days < self.max_days)
+        if self.destinations:
+            query = query.filter(TourismPackage.destination.in_(self.destinations))
+        if self.specializations:
+            guided = (
+                db.select(PackageGuide.package_id)
+                .join(TouristGuide, TouristGuide.id == PackageGuide.guide_id)
+                .filter(TouristGuide.specialization.in_(self.specializations))
+            )
+            query = query.filter(TourismPackage.id.in_(guided))
+        return query
+
+
+def _mask(positions, size):
+    """Bitset with the given bit positions set."""
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+class FacetIndex(VersionedIndex):
+    """Bitsets over the catalog for facet counts and in-memory filtering.
+
+    Every package gets a bit position. Each facet value (a price bucket, a
+    duration bucket, a destination, a guide specialization) owns a bitset of
+    the packages that have it. Counting a facet under the current filters is
+    then an AND of bitsets plus a popcount. Counts are disjunctive: a
+    dimension's own selection is ignored while counting that dimension, so
+    the UI can show what picking another value would give.
+
+    Writers call :meth:`refresh` for the packages they changed; a changed
+    package moves to a fresh bit position and its old bit is cleared, so
+    positions only grow until the next full load.
+    """
+
+    def __init__(self):
+        super().__init__(catalog_cache)
+        self._size = 0
+        self._all = 0
+        self._position = {}
+        self._prices = []  # (price, position) sorted by price
+        self._days = []  # (duration, position) sorted by duration
+        self._keys = {}  # position -> (price, duration), to find its sorted entries
+        self._values = {"price": {}, "duration": {}, "destination": {}, "specialization": {}}
+
+    def load(self):
+        rows = db.session.execute(
+            db.select(
+                TourismPackage.id,
+                TourismPackage.price,
+                TourismPackage.duration_days,
+                TourismPackage.destination,
+            ).order_by(TourismPackage.id)
+        ).all()
+        guide_rows = db.session.execute(
+            db.select(PackageGuide.package_id, TouristGuide.specialization)
+            .join(TouristGuide, TouristGuide.id == PackageGuide.guide_id)
+            .filter(TouristGuide.specialization.isnot(None))
+            .distinct()
+        ).all()
+
+        size = len(rows)
+        position = {row.id: i for i, row in enumerate(rows)}
+        prices = sorted((row.price, i) for i, row in enumerate(rows))
+        days = sorted((row.duration_days or 1, i) for i, row in enumerate(rows))
+        groups = {"price": {}, "duration": {}, "destination": {}, "specialization": {}}
+        for i, row in enumerate(rows):
+            groups["price"].setdefault(self._bucket_of(PRICE_BUCKETS, row.price), []).append(i)
+            groups["duration"].setdefault(self._bucket_of(DURATION_BUCKETS, row.duration_days or 1), []).append(i)
+            groups["destination"].setdefault(row.destination, []).append(i)
+        for package_id, specialization in guide_rows:
+            if package_id in position:
+                groups["specialization"].setdefault(specialization, []).append(position[package_id])
+
+        self._size = size
+        self._all = (1 << size) - 1
+        self._position = position
+        self._prices = prices
+        self._days = days
+        self._keys = {i: (row.price, row.duration_days or 1) for i, row in enumerate(rows)}
+        self._values = {
+            dimension: {value: _mask(positions, size) for value, positions in values.items()}
+            for dimension, values in groups.items()
+        }
+
+    def refresh(self, package_ids):
+        """Re-read ``package_ids`` (price, duration, destination and guide
+        specializations) after a change; gone ids are dropped."""
+        package_ids = set(package_ids)
+        with self._lock:
+            if not self.is_built or not package_ids:
+                return
+            rows = db.session.execute(
+                db.select(
+                    TourismPackage.id,
+                    TourismPackage.price,
+                    TourismPackage.duration_days,
+                    TourismPackage.destination,
+                ).filter(TourismPackage.id.in_(package_ids))
+            ).all()
+            specializations = {}
+            for package_id, specialization in db.session.execute(
+                db.select(PackageGuide.package_id, TouristGuide.specialization)
+                .join(TouristGuide, TouristGuide.id == PackageGuide.guide_id)
+                .filter(PackageGuide.package_id.in_(package_ids), TouristGuide.specialization.isnot(None))
+                .distinct()
+            ):
+                specializations.setdefault(package_id, []).append(specialization)
+
+            for package_id in package_ids:
+                self._discard(package_id)
+            for row in rows:
+                position = self._size
+                self._size += 1
+                self._position[row.id] = position
+                bit = 1 << position
+                self._all |= bit
+                days = row.duration_days or 1
+                self._keys[position] = (row.price, days)
+                insort(self._prices, (row.price, position))
+                insort(self._days, (days, position))
+                entries = [
+                    ("price", self._bucket_of(PRICE_BUCKETS, row.price)),
+                    ("duration", self._bucket_of(DURATION_BUCKETS, days)),
+                    ("destination", row.destination),
+                ]
+                entries += [("specialization", value) for value in specializations.get(row.id, ())]
+                for dimension, value in entries:
+                    values = self._values[dimension]
+                    values[value] = values.get(value, 0) | bit
+            self._advance()
+
+    def _discard(self, package_id):
+        position = self._position.pop(package_id, None)
+        if position is None:
+            return
+        bit = 1 << position
+        self._all &= ~bit
+        price, days = self._keys.pop(position)
+        del self._prices[bisect_left(self._prices, (price, position))]
+        del self._days[bisect_left(self._days, (days, position))]
+        for values in self._values.values():
+            for value, mask in list(values.items()):
+                if mask >> position & 1:
+                    mask &= ~bit
+                    if mask:
+                        values[value] = mask
+                    else:
+                        del values[value]
+
+    @staticmethod
+    def _bucket_of(buckets, value):
+        for name, low, high in buckets:
+            if value >= low and (high is None or value < high):
+                return name
+        return None
+
+    def _range_mask(self, pairs, low, high):
+        if low is None and high is None:
+            return self._all
+        start = 0 if low is None else bisect_left(pairs, (low,))
+        stop = len(pairs) if high is None else bisect_left(pairs, (high,))
+        return _mask((position for _, position in pairs[start:stop]), self._size)
+
+    def _any_of(self, dimension, values):
+        mask = 0
+        for value in values:
+            mask |= self._values[dimension].get(value, 0)
+        return mask
+
+    def _dimension_masks(self, filters):
+        return {
+            "price": self._range_mask(self._prices, filters.min_price, filters.max_price),
+            "duration": self._range_mask(self._days, filters.min_days, filters.max_days),
+            "destination": self._any_of("destination", filters.destinations) if filters.destinations else self._all,
+            "specialization": (
+                self._any_of("specialization", filters.specializations) if filters.specializations else self._all
+            ),
+        }
+
+    def facets(self, filters, within=None):
+        """Counts per facet value plus the total matching ``filters``.
+
+        ``within`` optionally restricts counting to a set of package ids,
+        such as the results of a text search.
+        """
+        with self._lock:
+            self.ensure_current()
+            base = self._all
+            if within is not None:
+                base = _mask((self._position[i] for i in within if i in self._position), self._size)
+            masks = self._dimension_masks(filters)
+            total = base
+            for mask in masks.values():
+                total &= mask
+
+            result = {"total": total.bit_count()}
+            for dimension, values in self._values.items():
+                others = base
+                for name, mask in masks.items():
+                    if name != dimension:
+                        others &= mask
+                counts = Counter({value: (bits & others).bit_count() for value, bits in values.items()})
+                if dimension == "price":
+                    order = [name for name, _, _ in PRICE_BUCKETS]
+                elif dimension == "duration":
+                    order = [name for name, _, _ in DURATION_BUCKETS]
+                else:
+                    # Keep selected values listed even when they fall outside the top.
+                    selected = filters.destinations if dimension == "destination" else filters.specializations
+                    order = [value for value, n in counts.most_common(FACET_LIMIT) if n]
+                    order += sorted(selected - set(order))
+                result[dimension] = [{"value": value, "count": counts.get(value, 0)} for value in order]
+            return result
+
+    def matching(self, filters, ids):
+        """The ids (in their given order) that pass ``filters``."""
+        with self._lock:
+            self.ensure_current()
+            combined = self._all
+            for mask in self._dimension_masks(filters).values():
+                combined &= mask
+            return [i for i in ids if i in self._position and combined >> self._position[i] & 1]
+
+
+facet_index = FacetIndex()
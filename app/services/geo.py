@@ -0,0 +1,265 @@
+import csv
+import heapq
+import math
+import os
+import threading
+
+from flask import current_app
+
+from ..extensions.cache import hotel_cache
+from ..extensions.db import db
+from ..models import Hotel
+from .indexing import VersionedIndex
+from .locations import normalize_location
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# -------- Geocoding -------- #
+class Gazetteer:
+    """Place names to coordinates, read from an offline CSV file.
+
+    The file needs ``name``, ``country``, ``latitude`` and ``longitude``
+    columns and may have ``population``. Places are looked up by
+    "name, country" and by bare name; when several places share a bare
+    name the most populous one wins.
+    """
+
+    def __init__(self, places):
+        self._places = places  # normalized key -> (latitude, longitude, population)
+
+    @classmethod
+    def from_csv(cls, path):
+        places = {}
+        with open(path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                try:
+                    point = (float(row["latitude"]), float(row["longitude"]), int(row.get("population") or 0))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                for key in (normalize_location(f"{row.get('name')} {row.get('country') or ''}"),
+                            normalize_location(row.get("name"))):
+                    if key and (key not in places or places[key][2] < point[2]):
+                        places[key] = point
+        return cls(places)
+
+    def __len__(self):
+        return len(self._places)
+
+    def lookup(self, text):
+        """``(latitude, longitude)`` for free text like "Paris, France", or None."""
+        if not text:
+            return None
+        parts = [part for part in (normalize_location(p) for p in text.split(",")) if part]
+        candidates = [normalize_location(text)]
+        if len(parts) > 1:
+            candidates.append(f"{parts[0]} {parts[-1]}")
+        candidates += parts[:1]
+        for key in candidates:
+            point = self._places.get(key)
+            if point is not None:
+                return point[:2]
+        return None
+
+
+_gazetteer = None
+_gazetteer_key = None
+_gazetteer_lock = threading.Lock()
+
+
+def gazetteer():
+    """The configured gazetteer (GAZETTEER_PATH), reloaded when the file
+    changes; None when no file is configured or it does not exist."""
+    global _gazetteer, _gazetteer_key
+    path = current_app.config.get("GAZETTEER_PATH")
+    if not path or not os.path.exists(path):
+        return None
+    key = (path, os.path.getmtime(path))
+    with _gazetteer_lock:
+        if key != _gazetteer_key:
+            _gazetteer = Gazetteer.from_csv(path)
+            _gazetteer_key = key
+        return _gazetteer
+
+
+def geocode(text):
+    places = gazetteer()
+    return places.lookup(text) if places is not None else None
+
+
+def set_coordinates(obj, text, data=None):
+    """Fill ``obj.latitude``/``obj.longitude`` from explicit ``latitude`` and
+    ``longitude`` in ``data``, else by geocoding ``text``.
+
+    Raises ValueError for explicit coordinates that are not valid.
+    """
+    data = data or {}
+    if data.get("latitude") not in (None, "") or data.get("longitude") not in (None, ""):
+        try:
+            latitude, longitude = float(data.get("latitude")), float(data.get("longitude"))
+        except (TypeError, ValueError):
+            raise ValueError("latitude and longitude must both be numbers")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("latitude must be within ±90 and longitude within ±180")
+        obj.latitude, obj.longitude = latitude, longitude
+        return
+    point = geocode(text)
+    obj.latitude, obj.longitude = point if point else (None, None)
+
+
+# -------- Spatial index -------- #
+class HotelGeoIndex(VersionedIndex):
+    """Uniform latitude/longitude grid over hotels with coordinates.
+
+    Each cell is ``GEO_GRID_DEGREES`` on a side and holds the hotels inside
+    it. A radius query visits only the cells overlapping the circle's
+    bounding box (wrapping at the antimeridian) and measures exact
+    great-circle distances for the hotels found there. Nearest-neighbour
+    queries grow the radius until enough hotels are in range.
+    """
+
+    def __init__(self):
+        super().__init__(hotel_cache)
+        self._cells = {}
+        self._points = {}
+        self._degrees = 0.1
+
+    @property
+    def _columns(self):
+        return max(1, round(360 / self._degrees))
+
+    def _cell(self, latitude, longitude):
+        return (
+            math.floor((latitude + 90) / self._degrees),
+            math.floor((longitude + 180) / self._degrees) % self._columns,
+        )
+
+    # -------- Maintenance -------- #
+    def load(self):
+        self._degrees = current_app.config["GEO_GRID_DEGREES"]
+        self._cells = {}
+        self._points = {}
+        rows = db.session.execute(
+            db.select(Hotel.id, Hotel.latitude, Hotel.longitude).filter(
+                Hotel.latitude.isnot(None), Hotel.longitude.isnot(None)
+            )
+        )
+        for hotel_id, latitude, longitude in rows:
+            self._add(hotel_id, latitude, longitude)
+
+    def add(self, hotel):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(hotel.id)
+            if hotel.latitude is not None and hotel.longitude is not None:
+                self._add(hotel.id, hotel.latitude, hotel.longitude)
+            self._advance()
+
+    def remove(self, hotel_id):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(hotel_id)
+            self._advance()
+
+    def _add(self, hotel_id, latitude, longitude):
+        cell = self._cell(latitude, longitude)
+        self._points[hotel_id] = (latitude, longitude, cell)
+        self._cells.setdefault(cell, []).append((hotel_id, latitude, longitude))
+
+    def _remove(self, hotel_id):
+        point = self._points.pop(hotel_id, None)
+        if point is None:
+            return
+        bucket = [entry for entry in self._cells[point[2]] if entry[0] != hotel_id]
+        if bucket:
+            self._cells[point[2]] = bucket
+        else:
+            del self._cells[point[2]]
+
+    # -------- Querying -------- #
+    def _in_radius(self, latitude, longitude, radius_km):
+        lat_span = radius_km / KM_PER_DEGREE
+        low = math.floor((max(-90.0, latitude - lat_span) + 90) / self._degrees)
+        high = math.floor((min(90.0, latitude + lat_span) + 90) / self._degrees)
+        # Longitude degrees shrink towards the poles; near them, scan all columns.
+        widest = max(abs(latitude) + lat_span, 0)
+        cos = math.cos(math.radians(widest)) if widest < 89 else 0
+        columns = self._columns
+        if cos <= 0 or radius_km / (KM_PER_DEGREE * cos) >= 180:
+            column_range = range(columns)
+        else:
+            lng_span = radius_km / (KM_PER_DEGREE * cos)
+            first = math.floor((longitude - lng_span + 180) / self._degrees)
+            last = math.floor((longitude + lng_span + 180) / self._degrees)
+            column_range = sorted({c % columns for c in range(first, last + 1)})
+
+        found = []
+        if (high - low + 1) * len(column_range) > len(self._cells):
+            # A wide box has more cells than there are occupied ones.
+            columns_in = set(column_range)
+            cells = [
+                bucket for (row, column), bucket in self._cells.items()
+                if low <= row <= high and column in columns_in
+            ]
+        else:
+            cells = [
+                self._cells[(row, column)]
+                for row in range(low, high + 1)
+                for column in column_range
+                if (row, column) in self._cells
+            ]
+        for bucket in cells:
+            for hotel_id, lat, lng in bucket:
+                distance = haversine_km(latitude, longitude, lat, lng)
+                if distance <= radius_km:
+                    found.append((distance, hotel_id))
+        return found
+
+    def _all(self, latitude, longitude, radius_km):
+        found = []
+        for hotel_id, (lat, lng, _) in self._points.items():
+            distance = haversine_km(latitude, longitude, lat, lng)
+            if distance <= radius_km:
+                found.append((distance, hotel_id))
+        return found
+
+    def within(self, latitude, longitude, radius_km, limit=None):
+        """``[(distance_km, hotel_id)]`` within ``radius_km``, nearest first."""
+        with self._lock:
+            self.ensure_current()
+            found = self._in_radius(latitude, longitude, radius_km)
+        return heapq.nsmallest(limit, found) if limit else sorted(found)
+
+    def nearest(self, latitude, longitude, k, max_km=None):
+        """The ``k`` nearest hotels, optionally no further than ``max_km``."""
+        limit = max_km if max_km is not None else math.pi * EARTH_RADIUS_KM
+        with self._lock:
+            self.ensure_current()
+            if not self._points:
+                return []
+            if k >= len(self._points):
+                # Every hotel is wanted; no point growing a search box.
+                return heapq.nsmallest(k, self._all(latitude, longitude, limit))
+            radius = min(limit, self._degrees * KM_PER_DEGREE)
+            while True:
+                found = self._in_radius(latitude, longitude, radius)
+                if len(found) >= k or radius >= limit:
+                    return heapq.nsmallest(k, found)
+                if radius >= KM_PER_DEGREE * 90:
+                    # Past a quarter of the globe the box covers most of it;
+                    # scanning every hotel is cheaper than another doubling.
+                    return heapq.nsmallest(k, self._all(latitude, longitude, limit))
+                radius = min(limit, radius * 2)
+
+
+hotel_geo_index = HotelGeoIndex()
@@ -0,0 +1,265 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db
+from ..models import TourismPackage, TouristGuide, PackageGuide
+
+
+FORMATS = {"csv", "jsonl"}
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def detect_format(filename, explicit=None):
+    fmt = (explicit or "").lower()
+    if not fmt and filename:
+        fmt = filename.rsplit(".", 1)[-1].lower()
+    if fmt == "ndjson":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError("format must be csv or jsonl")
+    return fmt
+
+
+def iter_records(stream, fmt):
+    """Yield ``(line_number, record_or_None, error_or_None)`` from a byte stream.
+
+    Lines are decoded one at a time so memory use does not depend on the
+    size of the upload.
+    """
+    lines = (raw.decode("utf-8-sig") if isinstance(raw, bytes) else raw for raw in stream)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f"invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "expected a JSON object"
+            continue
+        yield number, record, None
+
+
+# -------- Validation -------- #
+def _text(record, field, required=True, max_length=100):
+    value = record.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value in (None, ""):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    value = str(value)
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{field} is longer than {max_length} characters")
+    return value
+
+
+def _decimal(record, field):
+    try:
+        value = Decimal(str(record.get(field)).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{field} must be a number")
+    if not value.is_finite() or value < 0:
+        raise ValueError(f"{field} must be a non-negative number")
+    return value
+
+
+def _integer(record, field):
+    value = record.get(field)
+    if value in (None, ""):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer")
+    if value < 0:
+        raise ValueError(f"{field} must be non-negative")
+    return value
+
+
+def _guide_refs(record):
+    refs = record.get("guides")
+    if refs in (None, ""):
+        return []
+    if isinstance(refs, str):
+        refs = refs.split(";")
+    if not isinstance(refs, list):
+        raise ValueError("guides must be a list or a ;-separated string")
+    refs = [str(ref).strip() for ref in refs if ref is not None]
+    return [ref for ref in refs if ref]
+
+
+def validate_package(record, created_by):
+    return {
+        "title": _text(record, "title"),
+        "destination": _text(record, "destination"),
+        "description": _text(record, "description", required=False, max_length=None),
+        "price": _decimal(record, "price"),
+        "duration_days": _integer(record, "duration_days"),
+        "created_by": created_by,
+    }, _guide_refs(record)
+
+
+def validate_guide(record):
+    return {
+        "name": _text(record, "name"),
+        "contact_info": _text(record, "contact_info"),
+        "rate_per_day": _decimal(record, "rate_per_day"),
+        "specialization": _text(record, "specialization", required=False),
+        "experience_years": _integer(record, "experience_years"),
+    }
+
+
+# -------- Chunk writers -------- #
+def _resolve_guides(refs):
+    """Map every guide reference in a chunk (numeric id or exact name) to a
+    guide id, with one query for ids and one for names."""
+    ids = {int(ref) for ref in refs if ref.isdigit()}
+    names = {ref for ref in refs if not ref.isdigit()}
+    resolved = {}
+    if ids:
+        query = db.select(TouristGuide.id).filter(TouristGuide.id.in_(ids))
+        for guide_id in db.session.scalars(query):
+            resolved[str(guide_id)] = guide_id
+    if names:
+        query = db.select(TouristGuide.name, TouristGuide.id).filter(TouristGuide.name.in_(names))
+        for name, guide_id in db.session.execute(query):
+            resolved.setdefault(name, guide_id)
+    return resolved
+
+
+def _write_packages(rows):
+    """Insert ``[(line, values, guide_ids)]``. Packages without guides go through
+    one executemany; the rest need their ids back for the link rows."""
+    plain = [values for _, values, guide_ids in rows if not guide_ids]
+    linked = [(values, guide_ids) for _, values, guide_ids in rows if guide_ids]
+    if plain:
+        db.session.execute(insert(TourismPackage), plain)
+    if linked:
+        packages = [TourismPackage(**values) for values, _ in linked]
+        db.session.add_all(packages)
+        db.session.flush()
+        links = [
+            {"package_id": package.id, "guide_id": guide_id}
+            for package, (_, guide_ids) in zip(packages, linked)
+            for guide_id in guide_ids
+        ]
+        db.session.execute(insert(PackageGuide), links)
+
+
+def _write_guides(rows):
+    db.session.execute(insert(TouristGuide), [values for _, values in rows])
+
+
+def _commit_chunk(rows, writer, report):
+    """Write a chunk in one transaction. If the database rejects it, retry row
+    by row inside savepoints so one bad row does not sink its neighbours."""
+    if not rows:
+        return
+    try:
+        writer(rows)
+        db.session.commit()
+        report.inserted += len(rows)
+    except SQLAlchemyError:
+        db.session.rollback()
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    writer([row])
+                report.inserted += 1
+            except SQLAlchemyError as exc:
+                report.error(row[0], f"database error: {getattr(exc, 'orig', None) or exc}")
+        db.session.commit()
+    catalog_cache.bump()
+
+
+# -------- Entry points -------- #
+def import_packages(stream, fmt, created_by, chunk_size=None):
+    chunk_size = chunk_size or current_app.config["IMPORT_CHUNK_SIZE"]
+    report = ImportReport()
+    pending = []
+
+    def flush():
+        refs = {ref for _, _, guide_refs in pending for ref in guide_refs}
+        resolved = _resolve_guides(refs) if refs else {}
+        rows = []
+        for line, values, guide_refs in pending:
+            missing = [ref for ref in guide_refs if ref not in resolved]
+            if missing:
+                report.error(line, f"unknown guides: {', '.join(missing)}")
+                continue
+            guide_ids = sorted({resolved[ref] for ref in guide_refs})
+            rows.append((line, values, guide_ids))
+        _commit_chunk(rows, _write_packages, report)
+        pending.clear()
+
+    for line, record, error in iter_records(stream, fmt):
+        report.processed += 1
+        if error:
+            report.error(line, error)
+            continue
+        try:
+            values, guide_refs = validate_package(record, created_by)
+        except ValueError as exc:
+            report.error(line, str(exc))
+            continue
+        pending.append((line, values, guide_refs))
+        if len(pending) >= chunk_size:
+            flush()
+    flush()
+    return report
+
+
+def import_guides(stream, fmt, chunk_size=None):
+    chunk_size = chunk_size or current_app.config["IMPORT_CHUNK_SIZE"]
+    report = ImportReport()
+    pending = []
+    for line, record, error in iter_records(stream, fmt):
+        report.processed += 1
+        if error:
+            report.error(line, error)
+            continue
+        try:
+            pending.append((line, validate_guide(record)))
+        except ValueError as exc:
+            report.error(line, str(exc))
+            continue
+        if len(pending) >= chunk_size:
+            _commit_chunk(pending, _write_guides, report)
+            pending = []
+    _commit_chunk(pending, _write_guides, report)
+    return report
@@ -0,0 +1,110 @@
+import logging
+import threading
+
+from flask import current_app
+
+from ..extensions.db import db, from_primary
+
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedIndex:
+    """Base class for in-memory indexes mirroring database tables.
+
+    An index remembers the version of its ``VersionedCache`` it was built at.
+    Writers in this process bump the version and then patch the index in
+    place. A bump the index was not patched for (one from another worker, or
+    a write that did not touch it) leaves it behind: :meth:`ensure_current`
+    then rebuilds it in a background thread, and requests keep being served
+    from the previous contents until the new ones are swapped in. Only an
+    index that was never built is loaded on the request path.
+
+    Subclasses implement :meth:`load`, which replaces the index contents from
+    the database, and call :meth:`_advance` after patching. ``load`` reads
+    from the primary so the rows are at least as new as the version.
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._lock = threading.RLock()
+        self._version = None
+        self._rebuilding = False
+
+    def load(self):
+        raise NotImplementedError
+
+    def build(self):
+        with self._lock:
+            version = self._cache.version()
+            with from_primary():
+                self.load()
+            self._version = version
+
+    def ensure_current(self):
+        """Build on first use, or start a rebuild if behind. Returns whether
+        the contents are current."""
+        with self._lock:
+            if self._version is None:
+                self.build()
+            elif self._version != self._cache.version():
+                self._rebuild_later()
+                return False
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+
+    @property
+    def is_built(self):
+        return self._version is not None
+
+    @property
+    def is_current(self):
+        return self._version is not None and self._version == self._cache.version()
+
+    def _advance(self):
+        # Called right after the writer bumped the version. If that bump is
+        # the only change since we were current, stay current.
+        if self._version is not None and self._cache.version() == self._version + 1:
+            self._version += 1
+
+    def _state(self):
+        """The attributes :meth:`load` fills, for swapping in a fresh copy."""
+        return {name: value for name, value in vars(self).items()
+                if name not in ("_cache", "_lock", "_rebuilding")}
+
+    def _rebuild_later(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild, args=(current_app._get_current_object(),),
+            name=f"{type(self).__name__}-rebuild", daemon=True,
+        ).start()
+
+    def _rebuild(self, app):
+        """Load a fresh copy outside the lock and swap it in; loops until the
+        index caught up with the version."""
+        with app.app_context():
+            try:
+                while True:
+                    with self._lock:
+                        if self._version == self._cache.version():
+                            self._rebuilding = False
+                            return
+                    fresh = type(self)()
+                    fresh.build()
+                    with self._lock:
+                        # A write in this process may have patched the index
+                        # up to date meanwhile; that copy is newer.
+                        if not self.is_current:
+                            self.__dict__.update(fresh._state())
+            except Exception:
+                logger.exception("%s rebuild failed", type(self).__name__)
+                with self._lock:
+                    self._rebuilding = False
+            finally:
+                db.session.remove()
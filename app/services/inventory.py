@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, update
+
+from ..extensions.db import db
+from ..models import Booking, SeatShard
+from . import booking_stats
+
+
+ACTIVE_STATUSES = ("pending", "confirmed")
+
+# Random shards probed before falling back to a lookup of non-empty shards.
+RANDOM_PROBES = 2
+
+# Package id -> when this process last released its expired holds inline.
+_last_release = {}
+_last_release_lock = threading.Lock()
+
+
+def _split(total, parts):
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def set_capacity(package, capacity):
+    """Change a package's capacity, adjusting the free-seat shards.
+
+    Seats already held by pending or confirmed bookings stay taken. Shrinking
+    below what is already sold leaves the package sold out rather than
+    cancelling anyone. Runs inside the caller's transaction.
+    """
+    old = package.capacity
+    package.capacity = capacity
+    if capacity is None:
+        db.session.execute(delete(SeatShard).where(SeatShard.package_id == package.id))
+        return
+
+    if old is None:
+        taken = db.session.scalar(
+            db.select(func.count(Booking.id)).filter(
+                Booking.package_id == package.id, Booking.status.in_(ACTIVE_STATUSES)
+            )
+        )
+        shards = current_app.config["SEAT_SHARDS"]
+        free = _split(max(0, capacity - taken), shards)
+        db.session.execute(
+            insert(SeatShard),
+            [{"package_id": package.id, "shard": i, "available": n} for i, n in enumerate(free)],
+        )
+        return
+
+    delta = capacity - old
+    shards = db.session.execute(
+        db.select(SeatShard.shard, SeatShard.available)
+        .filter(SeatShard.package_id == package.id)
+        .order_by(SeatShard.available.desc())
+    ).all()
+    if not shards:
+        return
+    if delta > 0:
+        for (shard, _), n in zip(shards, _split(delta, len(shards))):
+            if n:
+                _adjust(package.id, shard, n)
+    else:
+        remaining = -delta
+        for shard, available in shards:
+            take = min(available, remaining)
+            if take and _adjust(package.id, shard, -take):
+                remaining -= take
+            if not remaining:
+                break
+
+
+def _adjust(package_id, shard, delta):
+    """Add ``delta`` free seats to a shard without letting it go negative."""
+    stmt = (
+        update(SeatShard)
+        .where(SeatShard.package_id == package_id, SeatShard.shard == shard)
+        .values(available=SeatShard.available + delta)
+    )
+    if delta < 0:
+        stmt = stmt.where(SeatShard.available >= -delta)
+    return db.session.execute(stmt).rowcount == 1
+
+
+def reserve(package_id):
+    """Take one seat; returns the shard it came from or None when sold out.
+
+    Each attempt is a single conditional ``UPDATE ... WHERE available > 0``,
+    so two bookings can never take the same seat. Random shards are tried
+    first to spread concurrent bookings across rows; when those are empty
+    the remaining non-empty shards are looked up and tried in turn. The
+    decrement belongs to the caller's transaction and is undone if it rolls
+    back.
+    """
+    shard_count = current_app.config["SEAT_SHARDS"]
+    probes = random.sample(range(shard_count), min(RANDOM_PROBES, shard_count))
+    for shard in probes:
+        if _adjust(package_id, shard, -1):
+            return shard
+
+    candidates = db.session.scalars(
+        db.select(SeatShard.shard).filter(
+            SeatShard.package_id == package_id, SeatShard.available > 0
+        )
+    ).all()
+    random.shuffle(candidates)
+    for shard in candidates:
+        if _adjust(package_id, shard, -1):
+            return shard
+    return None
+
+
+def release_seat(package_id, shard):
+    """Give a cancelled booking's seat back to its shard."""
+    _adjust(package_id, shard, 1)
+
+
+def hold_expiry():
+    return datetime.utcnow() + timedelta(minutes=current_app.config["SEAT_HOLD_MINUTES"])
+
+
+def release_expired(package_id=None, limit=1000):
+    """Expire pending bookings whose hold ran out and return their seats.
+
+    The status flip is conditional on the booking still being pending, so a
+    booking confirmed (or expired by another worker) at the same moment is
+    never released twice. Returns the number of bookings expired.
+    """
+    query = db.select(Booking.id, Booking.package_id, Booking.seat_shard).filter(
+        Booking.status == "pending",
+        Booking.expires_at < datetime.utcnow(),
+        Booking.seat_shard.isnot(None),
+    )
+    if package_id is not None:
+        query = query.filter(Booking.package_id == package_id)
+    expired = db.session.execute(query.limit(limit)).all()
+
+    released = Counter()
+    changes = []
+    for booking_id, pkg_id, shard in expired:
+        flipped = db.session.execute(
+            update(Booking)
+            .where(Booking.id == booking_id, Booking.status == "pending")
+            .values(status="expired", expires_at=None)
+        ).rowcount
+        if flipped:
+            released[(pkg_id, shard)] += 1
+            changes.append((pkg_id, "pending", "expired", None))
+    for (pkg_id, shard), count in released.items():
+        _adjust(pkg_id, shard, count)
+    booking_stats.record(changes)
+    db.session.commit()
+    return sum(released.values())
+
+
+def release_expired_throttled(package_id):
+    """:func:`release_expired` for one sold-out package, at most once per
+    ``SEAT_RELEASE_INTERVAL`` seconds per process.
+
+    Keeps a burst of bookings against a sold-out package from scanning its
+    pending bookings on every request; the ``release-expired-bookings``
+    command frees the rest. Returns the number of bookings expired.
+    """
+    interval = current_app.config["SEAT_RELEASE_INTERVAL"]
+    if interval <= 0:
+        return 0
+    now = time.monotonic()
+    with _last_release_lock:
+        if now - _last_release.get(package_id, -interval) < interval:
+            return 0
+        _last_release[package_id] = now
+    return release_expired(package_id)
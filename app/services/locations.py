@@ -0,0 +1,144 @@
+import heapq
+import re
+from collections import Counter, defaultdict
+
+from ..extensions.cache import hotel_cache
+from ..extensions.db import db
+from ..models import Hotel
+from .indexing import VersionedIndex
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_location(text):
+    """Case-fold and drop punctuation: ``"Paris,  France"`` -> ``"paris france"``."""
+    if not text:
+        return ""
+    return " ".join(_WORD_RE.findall(text.casefold()))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class LocationIndex(VersionedIndex):
+    """Trigram index over the distinct values of ``Hotel.location``.
+
+    Hotels share a handful of locations, so the index is keyed by normalized
+    location and remembers the raw spellings (with hotel counts) behind each.
+    Substring lookups intersect trigram posting sets instead of scanning every
+    hotel row.
+    """
+
+    def __init__(self):
+        super().__init__(hotel_cache)
+        self._variants = defaultdict(Counter)
+        self._trigrams = defaultdict(set)
+        self._hotel_locations = {}
+
+    # -------- Maintenance -------- #
+    def load(self):
+        self._variants = defaultdict(Counter)
+        self._trigrams = defaultdict(set)
+        self._hotel_locations = {}
+        for hotel_id, location in db.session.execute(db.select(Hotel.id, Hotel.location)):
+            self._add(hotel_id, location)
+
+    def add(self, hotel):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(hotel.id)
+            self._add(hotel.id, hotel.location)
+            self._advance()
+
+    def remove(self, hotel_id):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(hotel_id)
+            self._advance()
+
+    def _add(self, hotel_id, location):
+        location = location or ""
+        key = normalize_location(location)
+        if not key:
+            return
+        if key not in self._variants:
+            for gram in trigrams(key):
+                self._trigrams[gram].add(key)
+        self._variants[key][location] += 1
+        self._hotel_locations[hotel_id] = location
+
+    def _remove(self, hotel_id):
+        location = self._hotel_locations.pop(hotel_id, None)
+        if location is None:
+            return
+        key = normalize_location(location)
+        variants = self._variants[key]
+        variants[location] -= 1
+        if variants[location] <= 0:
+            del variants[location]
+        if not variants:
+            del self._variants[key]
+            for gram in trigrams(key):
+                keys = self._trigrams.get(gram)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._trigrams[gram]
+
+    # -------- Querying -------- #
+    def _matching_keys(self, query):
+        if len(query) < 3:
+            # Too short for trigrams; the distinct-location set is small.
+            return [key for key in self._variants if query in key]
+        postings = []
+        for gram in trigrams(query):
+            keys = self._trigrams.get(gram)
+            if not keys:
+                return []
+            postings.append(keys)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        # Trigrams can match out of order; confirm the real substring.
+        return [key for key in candidates if query in key]
+
+    def search(self, text):
+        """Raw ``Hotel.location`` values whose normalized form contains ``text``."""
+        query = normalize_location(text)
+        if not query:
+            return []
+        with self._lock:
+            self.ensure_current()
+            return [raw for key in self._matching_keys(query) for raw in self._variants[key]]
+
+    def suggest(self, text, limit=10):
+        """Ranked ``(location, hotel_count)`` suggestions for a partial location.
+
+        Locations starting with the query rank first, then those with a word
+        starting with it, then any other substring match; ties go to the
+        location with more hotels.
+        """
+        query = normalize_location(text)
+        if not query:
+            return []
+        with self._lock:
+            self.ensure_current()
+            ranked = []
+            for key in self._matching_keys(query):
+                variants = self._variants[key]
+                if key.startswith(query):
+                    tier = 0
+                elif (" " + query) in key:
+                    tier = 1
+                else:
+                    tier = 2
+                display = variants.most_common(1)[0][0]
+                ranked.append((tier, -sum(variants.values()), key, display))
+        best = heapq.nsmallest(limit, ranked)
+        return [(display, -negative_count) for _, negative_count, _, display in best]
+
+
+location_index = LocationIndex()
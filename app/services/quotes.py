@@ -0,0 +1,230 @@
+import numpy as np
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db
+from ..models import PackageGuide, TourismPackage, TouristGuide
+from .indexing import VersionedIndex
+
+
+SORT_ORDERS = ("total", "-total")
+
+
+class QuoteIndex(VersionedIndex):
+    """Columnar snapshot of what a trip costs in total.
+
+    A package's quote is its base price plus, for every attached guide, the
+    guide's daily rate times the package's duration (packages without a
+    duration count as one day). Packages are stored column-wise in NumPy
+    arrays indexed by position, together with the sum of their guides'
+    rates; the load computes those sums for the whole catalog with one
+    ``bincount``. Sorting and range filters over the totals are vectorized.
+
+    Guide links are kept both ways (package position -> guide slots and
+    guide slot -> package positions), so writers patch only what they touch:
+    :meth:`refresh` re-reads the packages whose price, duration or links
+    changed and recomputes just their totals, and :meth:`refresh_guide`
+    shifts the rate sums of the packages linked to a guide whose rate
+    changed.
+    """
+
+    def __init__(self):
+        super().__init__(catalog_cache)
+        self._reset(0)
+
+    def _reset(self, size):
+        self._ids = np.zeros(size, dtype=np.int64)
+        self._price = np.zeros(size)
+        self._days = np.ones(size)
+        self._created = np.zeros(size)
+        self._alive = np.zeros(size, dtype=bool)
+        self._rate_sums = np.zeros(size)
+        self._totals = np.zeros(size)
+        self._position = {}
+        self._rates = np.zeros(0)
+        self._slot = {}
+        self._guides_of = {}  # package position -> set of guide slots
+        self._packages_of = {}  # guide slot -> set of package positions
+
+    # -------- Maintenance -------- #
+    def load(self):
+        packages = db.session.execute(
+            db.select(
+                TourismPackage.id,
+                TourismPackage.price,
+                TourismPackage.duration_days,
+                TourismPackage.created_at,
+            ).order_by(TourismPackage.id)
+        ).all()
+        guides = db.session.execute(db.select(TouristGuide.id, TouristGuide.rate_per_day)).all()
+        links = db.session.execute(db.select(PackageGuide.package_id, PackageGuide.guide_id)).all()
+
+        self._reset(len(packages))
+        for i, row in enumerate(packages):
+            self._position[row.id] = i
+            self._set(i, row)
+        for guide_id, rate in guides:
+            self._guide_slot(guide_id, rate)
+        pairs = [
+            (self._position[package_id], self._slot[guide_id])
+            for package_id, guide_id in links
+            if package_id in self._position and guide_id in self._slot
+        ]
+        for position, slot in pairs:
+            self._link(position, slot)
+        link_package = np.fromiter((p for p, _ in pairs), dtype=np.int64, count=len(pairs))
+        link_guide = np.fromiter((g for _, g in pairs), dtype=np.int64, count=len(pairs))
+        self._rate_sums = np.bincount(
+            link_package, weights=self._rates[link_guide], minlength=len(self._ids)
+        ).astype(float)
+        self._totals = self._price + self._days * self._rate_sums
+
+    def _set(self, i, row):
+        self._ids[i] = row.id
+        self._price[i] = float(row.price)
+        self._days[i] = row.duration_days or 1
+        self._created[i] = row.created_at.timestamp() if row.created_at else 0.0
+        self._alive[i] = True
+
+    def _guide_slot(self, guide_id, rate):
+        """Slot of ``guide_id``, storing ``rate``; packages already linked to
+        the guide have their totals shifted by the change."""
+        slot = self._slot.get(guide_id)
+        if slot is None:
+            slot = self._slot[guide_id] = len(self._rates)
+            self._rates = np.append(self._rates, 0.0)
+        change = float(rate) - self._rates[slot]
+        self._rates[slot] = float(rate)
+        if change and self._packages_of.get(slot):
+            positions = np.fromiter(self._packages_of[slot], dtype=np.int64)
+            self._rate_sums[positions] += change
+            self._update_totals(positions)
+        return slot
+
+    def _link(self, position, slot):
+        self._guides_of.setdefault(position, set()).add(slot)
+        self._packages_of.setdefault(slot, set()).add(position)
+
+    def _unlink_package(self, position):
+        for slot in self._guides_of.pop(position, ()):
+            self._packages_of[slot].discard(position)
+
+    def _update_totals(self, positions):
+        self._totals[positions] = self._price[positions] + self._days[positions] * self._rate_sums[positions]
+
+    def refresh(self, package_ids):
+        """Re-read ``package_ids`` (price, duration, guides) after a change.
+
+        Ids that no longer exist are dropped from the snapshot. Costs two
+        small queries and work proportional to the packages' links.
+        """
+        package_ids = set(package_ids)
+        with self._lock:
+            if not self.is_built or not package_ids:
+                return
+            packages = db.session.execute(
+                db.select(
+                    TourismPackage.id,
+                    TourismPackage.price,
+                    TourismPackage.duration_days,
+                    TourismPackage.created_at,
+                ).filter(TourismPackage.id.in_(package_ids))
+            ).all()
+            links = db.session.execute(
+                db.select(PackageGuide.package_id, TouristGuide.id, TouristGuide.rate_per_day)
+                .join(TouristGuide, TouristGuide.id == PackageGuide.guide_id)
+                .filter(PackageGuide.package_id.in_(package_ids))
+            ).all()
+
+            new = [row for row in packages if row.id not in self._position]
+            if new:
+                start = len(self._ids)
+                grow = len(new)
+                self._ids = np.concatenate([self._ids, np.zeros(grow, dtype=np.int64)])
+                self._price = np.concatenate([self._price, np.zeros(grow)])
+                self._days = np.concatenate([self._days, np.ones(grow)])
+                self._created = np.concatenate([self._created, np.zeros(grow)])
+                self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+                self._rate_sums = np.concatenate([self._rate_sums, np.zeros(grow)])
+                self._totals = np.concatenate([self._totals, np.zeros(grow)])
+                for offset, row in enumerate(new):
+                    self._position[row.id] = start + offset
+            for row in packages:
+                self._set(self._position[row.id], row)
+                self._unlink_package(self._position[row.id])
+            for package_id in package_ids - {row.id for row in packages}:
+                position = self._position.pop(package_id, None)
+                if position is not None:
+                    self._alive[position] = False
+                    self._unlink_package(position)
+
+            touched = np.fromiter((self._position[row.id] for row in packages), dtype=np.int64)
+            self._rate_sums[touched] = 0.0
+            for package_id, guide_id, rate in links:
+                position = self._position[package_id]
+                slot = self._guide_slot(guide_id, rate)
+                self._link(position, slot)
+                self._rate_sums[position] += self._rates[slot]
+            self._update_totals(touched)
+            self._advance()
+
+    def refresh_guide(self, guide_id):
+        """Pick up a changed (or deleted) guide rate for every linked package."""
+        with self._lock:
+            if not self.is_built:
+                return
+            rate = db.session.scalar(db.select(TouristGuide.rate_per_day).filter_by(id=guide_id))
+            slot = self._slot.get(guide_id)
+            if rate is None:
+                if slot is not None:
+                    # Deleting a guide cascades to its links.
+                    self._guide_slot(guide_id, 0.0)
+                    for position in self._packages_of.pop(slot, ()):
+                        self._guides_of[position].discard(slot)
+            else:
+                self._guide_slot(guide_id, rate)
+            self._advance()
+
+    # -------- Querying -------- #
+    def quotes(self, package_ids):
+        """``{package_id: total}`` for the ids the snapshot knows."""
+        with self._lock:
+            self.ensure_current()
+            return {
+                package_id: round(float(self._totals[self._position[package_id]]), 2)
+                for package_id in package_ids
+                if package_id in self._position
+            }
+
+    def select(self, ids=None, min_total=None, max_total=None, order=None):
+        """Package ids whose total is in ``[min_total, max_total)``.
+
+        ``ids`` restricts and orders the candidates (e.g. ranked search
+        results); without it the whole catalog is used, newest first.
+        ``order`` is ``"total"`` or ``"-total"`` to sort by quote instead;
+        ties keep the candidate order.
+        """
+        with self._lock:
+            self.ensure_current()
+            if ids is None:
+                positions = np.flatnonzero(self._alive)
+                # Newest first, like the catalog pages: created_at desc, id desc.
+                positions = positions[np.lexsort((-self._ids[positions], -self._created[positions]))]
+            else:
+                positions = np.fromiter(
+                    (self._position[i] for i in ids if i in self._position), dtype=np.int64
+                )
+            totals = self._totals[positions]
+            mask = np.ones(len(positions), dtype=bool)
+            if min_total is not None:
+                mask &= totals >= float(min_total)
+            if max_total is not None:
+                mask &= totals < float(max_total)
+            positions, totals = positions[mask], totals[mask]
+            if order == "total":
+                positions = positions[np.argsort(totals, kind="stable")]
+            elif order == "-total":
+                positions = positions[np.argsort(-totals, kind="stable")]
+            return self._ids[positions].tolist()
+
+
+quote_index = QuoteIndex()
@@ -0,0 +1,475 @@
+import logging
+import math
+import threading
+from collections import Counter
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db
+from ..models import PackageRecommendation, TourismPackage
+from .indexing import VersionedIndex
+from .search import FIELD_WEIGHTS, tokenize
+
+
+logger = logging.getLogger(__name__)
+
+
+def _term_counts(title, destination, description):
+    counts = Counter()
+    for field, text in (("title", title), ("destination", destination), ("description", description)):
+        for token in tokenize(text):
+            counts[token] += FIELD_WEIGHTS[field]
+    return counts
+
+
+def _room_for_one(buffer, size):
+    """``buffer`` (holding ``size`` rows) with space for one more. Capacity
+    doubles when full, so appending n rows copies O(n) rows in total."""
+    if size < len(buffer):
+        return buffer
+    grown = np.empty((max(8, 2 * size),) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:size] = buffer[:size]
+    return grown
+
+
+class Recommender(VersionedIndex):
+    """Similar-package recommendations from TF-IDF text vectors plus price
+    and duration.
+
+    Each package is an L2-normalized TF-IDF vector over its title,
+    destination and description tokens (weighted like the search index),
+    stored sparsely as one (positions, weights) pair of NumPy arrays per
+    term. Scoring one package against the catalog walks only its own
+    terms' postings. The text cosine is blended with a price/duration
+    closeness in ``[0, 1]``, weighted by ``RECOMMENDATION_NUMERIC_WEIGHT``.
+
+    The top ``RECOMMENDATION_K`` neighbours of every package are computed in
+    batch (``flask recommendations rebuild``) and persisted in
+    ``package_recommendations``; in memory they sit in two ``(n, k)``
+    arrays indexed by package position, so a lookup is a dict access plus
+    a row slice. When a package is created, edited or deleted only its own
+    row and the rows it enters or leaves are recomputed and written back.
+    The per-position arrays and postings are views over buffers with spare
+    capacity, so a new package is written in place rather than copying them.
+    IDF weights are those of the last full build until the next batch run.
+
+    When the catalog moved on without this process seeing the change (a
+    bump from another worker), the index is rebuilt in a background thread
+    while requests keep being served from the previous table.
+    """
+
+    def __init__(self):
+        super().__init__(catalog_cache)
+        self._k = 10
+        self._numeric_weight = 0.2
+        self._reset()
+        self._queued = set()  # package ids to refresh once caught up
+        self._catching_up = False
+
+    # Per-position arrays; each is a view over ``_buffers[name]``.
+    _GROWING = ("_ids", "_alive", "_log_price", "_days", "_neighbors", "_scores")
+
+    def _reset(self):
+        self._vocabulary = {}
+        self._idf = []
+        self._postings = []  # term id -> (positions, weights)
+        self._posting_buffers = []  # term id -> buffers under the postings
+        self._doc_terms = {}  # position -> (term ids, weights)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._log_price = np.zeros(0)
+        self._days = np.zeros(0)
+        self._price_scale = 1.0
+        self._days_scale = 1.0
+        self._position = {}
+        self._neighbors = np.full((0, self._k), -1, dtype=np.int64)
+        self._scores = np.full((0, self._k), -np.inf, dtype=np.float32)
+        self._buffers = {name: getattr(self, name) for name in self._GROWING}
+        self._dirty = set()  # rows recomputed at load, not yet persisted
+
+    # -------- Maintenance -------- #
+    def load(self):
+        self._k = current_app.config["RECOMMENDATION_K"]
+        self._numeric_weight = current_app.config["RECOMMENDATION_NUMERIC_WEIGHT"]
+        rows = db.session.execute(
+            db.select(
+                TourismPackage.id,
+                TourismPackage.title,
+                TourismPackage.destination,
+                TourismPackage.description,
+                TourismPackage.price,
+                TourismPackage.duration_days,
+            ).order_by(TourismPackage.id)
+        ).all()
+        counts = [_term_counts(row.title, row.destination, row.description) for row in rows]
+        df = Counter()
+        for doc in counts:
+            df.update(doc.keys())
+
+        self._reset()
+        n = len(rows)
+        for token, frequency in df.items():
+            self._vocabulary[token] = len(self._idf)
+            self._idf.append(math.log((1 + n) / (1 + frequency)) + 1)
+
+        self._ids = np.array([row.id for row in rows], dtype=np.int64)
+        self._alive = np.ones(n, dtype=bool)
+        self._log_price = np.log1p(np.array([float(row.price) for row in rows]))
+        self._days = np.array([float(row.duration_days or 1) for row in rows])
+        if n:
+            self._price_scale = float(self._log_price.std()) or 1.0
+            self._days_scale = float(self._days.std()) or 1.0
+        self._position = {row.id: i for i, row in enumerate(rows)}
+
+        postings = [([], []) for _ in self._idf]
+        for position, doc in enumerate(counts):
+            term_ids, weights = self._vector(doc, grow=False)
+            self._doc_terms[position] = (term_ids, weights)
+            for term_id, weight in zip(term_ids.tolist(), weights.tolist()):
+                postings[term_id][0].append(position)
+                postings[term_id][1].append(weight)
+        self._postings = [
+            (np.array(positions, dtype=np.int64), np.array(weights)) for positions, weights in postings
+        ]
+        self._posting_buffers = list(self._postings)
+
+        self._neighbors = np.full((n, self._k), -1, dtype=np.int64)
+        self._scores = np.full((n, self._k), -np.inf, dtype=np.float32)
+        self._buffers = {name: getattr(self, name) for name in self._GROWING}
+        stored = db.session.execute(
+            db.select(
+                PackageRecommendation.package_id,
+                PackageRecommendation.rank,
+                PackageRecommendation.similar_id,
+                PackageRecommendation.score,
+            ).filter(PackageRecommendation.rank < self._k)
+        )
+        for package_id, rank, similar_id, score in stored:
+            position = self._position.get(package_id)
+            if position is not None:
+                self._neighbors[position, rank] = similar_id
+                self._scores[position, rank] = score
+        # Deleting a package cascades to the rows naming it, which leaves
+        # holes (or short lists) in other packages' rows; refill those.
+        filled = self._neighbors != -1
+        started = filled.any(axis=1)
+        holes = started & (filled[:, 1:] & ~filled[:, :-1]).any(axis=1)
+        holes |= started & ~filled[:, 0]
+        if n - 1 > self._k:
+            holes |= started & ~filled[:, -1]
+        for position in np.flatnonzero(holes).tolist():
+            self._top(position)
+            self._dirty.add(int(self._ids[position]))
+
+    def _state(self):
+        state = super()._state()
+        del state["_queued"], state["_catching_up"]
+        return state
+
+    def _vector(self, counts, grow):
+        term_ids, weights = [], []
+        for token, tf in counts.items():
+            term_id = self._vocabulary.get(token)
+            if term_id is None:
+                if not grow:
+                    continue
+                # A term first seen after the build is as rare as it gets.
+                term_id = self._vocabulary[token] = len(self._idf)
+                self._idf.append(math.log((1 + len(self._ids)) / 2) + 1)
+                self._postings.append((np.zeros(0, dtype=np.int64), np.zeros(0)))
+                self._posting_buffers.append(self._postings[-1])
+            term_ids.append(term_id)
+            weights.append(tf * self._idf[term_id])
+        weights = np.array(weights)
+        norm = np.linalg.norm(weights)
+        if norm:
+            weights /= norm
+        return np.array(term_ids, dtype=np.int64), weights
+
+    def _append(self, package):
+        """Give ``package`` a fresh position; an edited package's old one dies."""
+        old = self._position.pop(package.id, None)
+        if old is not None:
+            self._alive[old] = False
+        position = len(self._ids)
+        self._position[package.id] = position
+        for name in self._GROWING:
+            buffer = self._buffers[name] = _room_for_one(self._buffers[name], position)
+            setattr(self, name, buffer[:position + 1])
+        self._ids[position] = package.id
+        self._alive[position] = True
+        self._log_price[position] = math.log1p(float(package.price))
+        self._days[position] = float(package.duration_days or 1)
+        self._neighbors[position] = -1
+        self._scores[position] = -np.inf
+
+        term_ids, weights = self._vector(
+            _term_counts(package.title, package.destination, package.description), grow=True
+        )
+        self._doc_terms[position] = (term_ids, weights)
+        for term_id, weight in zip(term_ids.tolist(), weights.tolist()):
+            size = len(self._postings[term_id][0])
+            positions, values = self._posting_buffers[term_id] = tuple(
+                _room_for_one(buffer, size) for buffer in self._posting_buffers[term_id]
+            )
+            positions[size] = position
+            values[size] = weight
+            self._postings[term_id] = (positions[:size + 1], values[:size + 1])
+        return position
+
+    # -------- Scoring -------- #
+    def _similarity(self, position):
+        text = np.zeros(len(self._ids))
+        term_ids, weights = self._doc_terms[position]
+        for term_id, weight in zip(term_ids.tolist(), weights.tolist()):
+            positions, values = self._postings[term_id]
+            text[positions] += weight * values
+        numeric = 1.0 / (
+            1.0
+            + np.abs(self._log_price - self._log_price[position]) / self._price_scale
+            + np.abs(self._days - self._days[position]) / self._days_scale
+        )
+        score = (1 - self._numeric_weight) * text + self._numeric_weight * numeric
+        score[~self._alive] = -np.inf
+        score[position] = -np.inf
+        return score
+
+    def _top(self, position, score=None):
+        if score is None:
+            score = self._similarity(position)
+        candidates = np.flatnonzero(np.isfinite(score))
+        if len(candidates) > self._k:
+            candidates = candidates[np.argpartition(-score[candidates], self._k - 1)[: self._k]]
+        candidates = candidates[np.argsort(-score[candidates], kind="stable")]
+        self._neighbors[position] = -1
+        self._scores[position] = -np.inf
+        self._neighbors[position, : len(candidates)] = self._ids[candidates]
+        self._scores[position, : len(candidates)] = score[candidates]
+
+    def _refresh_around(self, position):
+        """Recompute ``position``'s row and fix up rows it enters or leaves.
+
+        Returns the package ids whose rows changed.
+        """
+        score = self._similarity(position)
+        self._top(position, score)
+        package_id = int(self._ids[position])
+        listed = (self._neighbors == package_id).any(axis=1)
+        filled = self._neighbors[:, 0] != -1
+        full = self._neighbors[:, -1] != -1
+        kth = self._scores[:, -1]
+        # Rows nobody has computed yet stay empty; similar() scores them on
+        # first use.
+        affected = np.flatnonzero(
+            self._alive & np.isfinite(score) & filled & (listed | ~full | (score > kth))
+        )
+        changed = {package_id}
+        for j in affected.tolist():
+            keep = (self._neighbors[j] != package_id) & (self._neighbors[j] != -1)
+            ids, scores = self._neighbors[j][keep], self._scores[j][keep]
+            if not full[j] or (listed[j] and len(ids) == self._k - 1 and score[j] < scores[-1]):
+                # A short row (small catalog), or it fell out of a full row
+                # and the replacement may be anyone.
+                self._top(j)
+            else:
+                ids = np.append(ids, package_id)
+                scores = np.append(scores, score[j])
+                order = np.argsort(-scores, kind="stable")[: self._k]
+                self._neighbors[j] = -1
+                self._scores[j] = -np.inf
+                self._neighbors[j, : len(order)] = ids[order]
+                self._scores[j, : len(order)] = scores[order]
+            changed.add(int(self._ids[j]))
+        return changed
+
+    def _persist(self, package_ids):
+        """Write the rows of ``package_ids`` back as an upsert.
+
+        Several workers may persist the same package at once (each catching
+        up after the same change), so existing ranks are updated in place
+        and only missing ones inserted; an insert that loses the race to
+        another worker falls back to updating its row.
+        """
+        package_ids = sorted(package_ids)
+        for start in range(0, len(package_ids), 1000):
+            chunk = package_ids[start:start + 1000]
+            stored = {}
+            for package_id, rank in db.session.execute(
+                db.select(PackageRecommendation.package_id, PackageRecommendation.rank).filter(
+                    PackageRecommendation.package_id.in_(chunk)
+                )
+            ):
+                stored.setdefault(package_id, set()).add(rank)
+            rows = []
+            for package_id in chunk:
+                position = self._position.get(package_id)
+                if position is None:
+                    continue
+                for rank, (similar_id, score) in enumerate(zip(self._neighbors[position], self._scores[position])):
+                    if similar_id == -1:
+                        break
+                    rows.append({
+                        "package_id": package_id, "rank": rank,
+                        "similar_id": int(similar_id), "score": float(score),
+                    })
+            length = Counter(row["package_id"] for row in rows)
+            for package_id, ranks in stored.items():
+                # A row got shorter (or its package is gone): drop the tail.
+                if max(ranks) >= length[package_id]:
+                    db.session.execute(
+                        delete(PackageRecommendation).where(
+                            PackageRecommendation.package_id == package_id,
+                            PackageRecommendation.rank >= length[package_id],
+                        )
+                    )
+            existing = [row for row in rows if row["rank"] in stored.get(row["package_id"], ())]
+            missing = [row for row in rows if row["rank"] not in stored.get(row["package_id"], ())]
+            if existing:
+                db.session.execute(update(PackageRecommendation), existing)
+            if missing:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(PackageRecommendation), missing)
+                except IntegrityError:
+                    for row in missing:
+                        self._upsert(row)
+
+    def _upsert(self, row):
+        stmt = (
+            update(PackageRecommendation)
+            .where(PackageRecommendation.package_id == row["package_id"], PackageRecommendation.rank == row["rank"])
+            .values(similar_id=row["similar_id"], score=row["score"])
+        )
+        if db.session.execute(stmt).rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(PackageRecommendation), [row])
+        except IntegrityError:
+            db.session.execute(stmt)
+
+    # -------- Public API -------- #
+    def rebuild(self):
+        """Batch job: recompute every package's neighbours and persist them.
+
+        Returns the number of packages processed.
+        """
+        with self._lock:
+            self.build()
+            alive = np.flatnonzero(self._alive).tolist()
+            for position in alive:
+                self._top(position)
+            db.session.execute(delete(PackageRecommendation))
+            self._persist(self._position)
+            db.session.commit()
+            return len(alive)
+
+    def update(self, package):
+        """Refresh recommendations after ``package`` was created or edited.
+
+        Call after committing the package and bumping the catalog version.
+        If that bump was not the only change since the index was built, the
+        package is queued for the background catch-up instead.
+        """
+        with self._lock:
+            if not self._catching_up and self.is_built and self._cache.version() == self._version + 1:
+                self._append(package)
+                self._advance()
+                self._persist(self._refresh_around(self._position[package.id]))
+                db.session.commit()
+                return
+            self._queued.add(package.id)
+            self._catch_up_later()
+
+    def remove(self, package_id):
+        """Drop a deleted package and refill the rows that listed it."""
+        with self._lock:
+            if not self._catching_up and self.is_built and self._cache.version() == self._version + 1:
+                position = self._position.pop(package_id, None)
+                if position is not None:
+                    self._alive[position] = False
+                self._advance()
+                rows = np.flatnonzero(self._alive & (self._neighbors == package_id).any(axis=1)).tolist()
+                for position in rows:
+                    self._top(position)
+                self._persist(int(self._ids[position]) for position in rows)
+                db.session.commit()
+                return
+            # The rebuild refills the lists the delete cascaded out of.
+            self._catch_up_later()
+
+    def ensure_current(self):
+        # Catching up also persists the rows of queued packages, so it
+        # replaces the plain background rebuild.
+        with self._lock:
+            if not self.is_built:
+                self.build()
+            elif self._version != self._cache.version():
+                self._catch_up_later()
+                return False
+            return True
+
+    def _catch_up_later(self):
+        with self._lock:
+            if self._catching_up:
+                return
+            self._catching_up = True
+        threading.Thread(
+            target=self._catch_up, args=(current_app._get_current_object(),),
+            name="recommendations", daemon=True,
+        ).start()
+
+    def _catch_up(self, app):
+        """Rebuild from the database off the request path, then refresh the
+        queued packages; loops until nothing changed meanwhile."""
+        with app.app_context():
+            try:
+                while True:
+                    with self._lock:
+                        queued, self._queued = self._queued, set()
+                        if not queued and self._version == self._cache.version():
+                            self._catching_up = False
+                            return
+                    fresh = Recommender()
+                    fresh.build()
+                    with self._lock:
+                        self.__dict__.update(fresh._state())
+                        changed, self._dirty = self._dirty, set()
+                        for package_id in queued:
+                            position = self._position.get(package_id)
+                            if position is not None:
+                                changed |= self._refresh_around(position)
+                        self._persist(changed)
+                        db.session.commit()
+            except Exception:
+                logger.exception("recommendation catch-up failed")
+                db.session.rollback()
+                with self._lock:
+                    self._catching_up = False
+            finally:
+                db.session.remove()
+
+    def similar(self, package_id, limit=None):
+        """``[(package_id, score)]`` most similar first, or None for an
+        unknown package. Packages the batch job has not seen yet are scored
+        on the spot. A stale index keeps answering while it catches up."""
+        with self._lock:
+            self.ensure_current()
+            position = self._position.get(package_id)
+            if position is None:
+                return None
+            if self._neighbors[position, 0] == -1:
+                self._top(position)
+            pairs = [
+                (int(similar_id), round(float(score), 4))
+                for similar_id, score in zip(self._neighbors[position], self._scores[position])
+                if similar_id != -1
+            ]
+        return pairs[:limit] if limit else pairs
+
+
+recommender = Recommender()
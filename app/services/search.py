@@ -0,0 +1,157 @@
+import heapq
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+from ..extensions.cache import catalog_cache
+from ..extensions.db import db
+from ..models import TourismPackage
+from .indexing import VersionedIndex
+
+
+# Field weights used when scoring a match: a hit in the title matters more
+# than one buried in the description.
+FIELD_WEIGHTS = {"title": 3.0, "destination": 2.0, "description": 1.0}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex(VersionedIndex):
+    """In-memory inverted index over the tourism package catalog.
+
+    Postings map a token to ``{package_id: weighted term frequency}``. A sorted
+    vocabulary list allows the last query token to be expanded as a prefix so
+    results keep up with as-you-type queries.
+    """
+
+    def __init__(self):
+        super().__init__(catalog_cache)
+        self._postings = defaultdict(dict)
+        self._doc_tokens = {}
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+
+    # -------- Maintenance -------- #
+    def load(self):
+        rows = db.session.execute(
+            db.select(
+                TourismPackage.id,
+                TourismPackage.title,
+                TourismPackage.destination,
+                TourismPackage.description,
+            )
+        ).all()
+        self._postings = defaultdict(dict)
+        self._doc_tokens = {}
+        for row in rows:
+            self._add(row.id, row.title, row.destination, row.description)
+        self._vocabulary = sorted(self._postings)
+        self._vocabulary_dirty = False
+
+    def add(self, package):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(package.id)
+            self._add(package.id, package.title, package.destination, package.description)
+            self._advance()
+
+    def remove(self, package_id):
+        with self._lock:
+            if not self.is_built:
+                return
+            self._remove(package_id)
+            self._advance()
+
+    def _add(self, package_id, title, destination, description):
+        weights = defaultdict(float)
+        for field, text in (("title", title), ("destination", destination), ("description", description)):
+            for token in tokenize(text):
+                weights[token] += FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._vocabulary_dirty = True
+            self._postings[token][package_id] = weight
+        self._doc_tokens[package_id] = tuple(weights)
+
+    def _remove(self, package_id):
+        for token in self._doc_tokens.pop(package_id, ()):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(package_id, None)
+            if not posting:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+
+    # -------- Querying -------- #
+    def _expand_prefix(self, prefix):
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        matches = []
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            matches.append(self._vocabulary[position])
+            position += 1
+        return matches
+
+    def _idf(self, token):
+        df = len(self._postings.get(token, ()))
+        return math.log(1 + len(self._doc_tokens) / (1 + df))
+
+    def search(self, query, limit=None):
+        """Return package ids matching every query token, best match first.
+
+        The final token is treated as a prefix; earlier tokens must match
+        exactly.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self._lock:
+            self.ensure_current()
+
+            scores = None
+            for position, token in enumerate(tokens):
+                if position == len(tokens) - 1:
+                    candidates = self._expand_prefix(token)
+                else:
+                    candidates = [token] if token in self._postings else []
+
+                token_scores = defaultdict(float)
+                for candidate in candidates:
+                    idf = self._idf(candidate)
+                    # Prefix expansions score lower than the exact word.
+                    bonus = 1.0 if candidate == token else 0.5
+                    for package_id, weight in self._postings[candidate].items():
+                        token_scores[package_id] += weight * idf * bonus
+
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        package_id: score + token_scores[package_id]
+                        for package_id, score in scores.items()
+                        if package_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        # Ties are broken by newest package (highest id) to match the listing order.
+        rank_key = lambda item: (-item[1], -item[0])
+        if limit is not None:
+            ranked = heapq.nsmallest(limit, scores.items(), key=rank_key)
+        else:
+            ranked = sorted(scores.items(), key=rank_key)
+        return [package_id for package_id, _ in ranked]
+
+
+package_index = SearchIndex()
@@ -1,5 +1,7 @@
 import os
 
+from ..extensions.metrics import TimedQueuePool
+
 
 def load_config(app):
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-change")
@@ -9,7 +11,132 @@ def load_config(app):
     mysql_port = int(os.getenv("MYSQL_PORT", "3306"))
     mysql_db = os.getenv("MYSQL_DB", "tourism_management")
 
-    app.config["SQLALCHEMY_DATABASE_URI"] = (
-        f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db}"
-    )
+    # DB_BACKEND=sqlite runs against a local file (SQLITE_PATH) for
+    # development and benchmarks; DATABASE_URL overrides both backends.
+    if os.getenv("DB_BACKEND", "mysql") == "sqlite":
+        sqlite_path = os.getenv("SQLITE_PATH", os.path.join(app.instance_path, "tourism.db"))
+        os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+        default_url = f"sqlite:///{os.path.abspath(sqlite_path)}"
+    else:
+        default_url = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db}"
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", default_url)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Connection pool settings, applied to the primary and every replica.
+    # SQLite URLs keep SQLAlchemy's own pool defaults. TimedQueuePool feeds
+    # checkout wait times into /metrics.
+    pool_options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    }
+
+    def engine_options(url):
+        return {} if url.startswith("sqlite") else dict(pool_options)
+
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+
+    # Read replicas (comma-separated URLs). GET/HEAD requests read from a
+    # replica unless the user wrote something in the last
+    # DATABASE_STICKY_SECONDS; everything else uses the primary.
+    replica_urls = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"replica_{i}": dict(engine_options(url), url=url) for i, url in enumerate(replica_urls)
+    }
+    app.config["DATABASE_REPLICAS"] = list(app.config["SQLALCHEMY_BINDS"])
+    app.config["DATABASE_STICKY_SECONDS"] = float(os.getenv("DATABASE_STICKY_SECONDS", "5"))
+
+    # Listing pages are keyset paginated; clients may ask for up to MAX_PAGE_SIZE rows.
+    app.config["PAGE_SIZE"] = int(os.getenv("PAGE_SIZE", "24"))
+    app.config["MAX_PAGE_SIZE"] = int(os.getenv("MAX_PAGE_SIZE", "100"))
+
+    # Catalog cache. "memory" is a per-process LRU; "redis" shares entries and
+    # the catalog version counter across workers via CACHE_URL.
+    app.config["CACHE_BACKEND"] = os.getenv("CACHE_BACKEND", "memory")
+    app.config["CACHE_URL"] = os.getenv("CACHE_URL", "redis://127.0.0.1:6379/0")
+    app.config["CACHE_DEFAULT_TTL"] = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+    app.config["CACHE_MAX_ENTRIES"] = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+    # Rows per transaction for bulk catalog imports.
+    app.config["IMPORT_CHUNK_SIZE"] = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+
+    # Write-behind booking pipeline (off by default): bookings are journaled
+    # locally and inserted in batches by a background thread.
+    app.config["BOOKING_PIPELINE"] = os.getenv("BOOKING_PIPELINE", "0") == "1"
+    app.config["BOOKING_BATCH_SIZE"] = int(os.getenv("BOOKING_BATCH_SIZE", "500"))
+    app.config["BOOKING_FLUSH_INTERVAL"] = float(os.getenv("BOOKING_FLUSH_INTERVAL", "0.05"))
+    app.config["BOOKING_JOURNAL_DIR"] = os.getenv(
+        "BOOKING_JOURNAL_DIR", os.path.join(app.instance_path, "booking-journal")
+    )
+    app.config["BOOKING_JOURNAL_FSYNC"] = os.getenv("BOOKING_JOURNAL_FSYNC", "1") == "1"
+    app.config["BOOKING_JOURNAL_SEGMENT_SIZE"] = int(os.getenv("BOOKING_JOURNAL_SEGMENT_SIZE", "10000"))
+    # Queued references are also recorded in the cache backend for this
+    # long, so any worker can answer status polls for them.
+    app.config["BOOKING_STATUS_TTL"] = int(os.getenv("BOOKING_STATUS_TTL", "86400"))
+
+    # Seat inventory: free seats of capacity-limited packages are split over
+    # SEAT_SHARDS rows; pending bookings hold a seat for SEAT_HOLD_MINUTES.
+    app.config["SEAT_SHARDS"] = int(os.getenv("SEAT_SHARDS", "8"))
+    app.config["SEAT_HOLD_MINUTES"] = int(os.getenv("SEAT_HOLD_MINUTES", "30"))
+    # A booking that finds a package sold out releases its expired holds at
+    # most once per SEAT_RELEASE_INTERVAL seconds per worker; 0 leaves that
+    # to the release-expired-bookings command.
+    app.config["SEAT_RELEASE_INTERVAL"] = float(os.getenv("SEAT_RELEASE_INTERVAL", "10"))
+    # Booking summaries are spread over BOOKING_STATS_SHARDS rows per package
+    # and per manager for the same reason.
+    app.config["BOOKING_STATS_SHARDS"] = int(os.getenv("BOOKING_STATS_SHARDS", "8"))
+
+    # Per-process cache of the logged-in user's identity, so @login_required
+    # does not cost a users query on every request.
+    app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", "4096"))
+    app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", "60"))
+
+    # Password hashing runs in PASSWORD_HASH_WORKERS processes (0 = inline).
+    # Changing PASSWORD_HASH_METHOD (werkzeug syntax, e.g. "scrypt:32768:8:1"
+    # or "pbkdf2:sha256:600000") rehashes each password at its next login.
+    # PASSWORD_HASH_CONCURRENCY caps hashes queued or running per process
+    # (0 = twice the workers); callers wait PASSWORD_HASH_WAIT seconds for a slot.
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_WORKERS"] = int(
+        os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+    )
+    app.config["PASSWORD_HASH_CONCURRENCY"] = int(os.getenv("PASSWORD_HASH_CONCURRENCY", "0"))
+    app.config["PASSWORD_HASH_WAIT"] = float(os.getenv("PASSWORD_HASH_WAIT", "5"))
+
+    # Per-request SQL stats: Server-Timing header, and a log line for requests
+    # that repeat one statement SQL_N_PLUS_ONE_THRESHOLD+ times (or for every
+    # request with SQL_LOG_REQUESTS=1).
+    app.config["SQL_INSTRUMENTATION"] = os.getenv("SQL_INSTRUMENTATION", "1") == "1"
+    app.config["SQL_N_PLUS_ONE_THRESHOLD"] = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+    app.config["SQL_LOG_REQUESTS"] = os.getenv("SQL_LOG_REQUESTS", "0") == "1"
+
+    # /health runs SELECT 1 against the primary at most this often.
+    app.config["HEALTH_CHECK_CACHE_SECONDS"] = float(os.getenv("HEALTH_CHECK_CACHE_SECONDS", "2"))
+
+    # Rows fetched per round trip by the streaming catalog export.
+    app.config["EXPORT_BATCH_SIZE"] = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+    # Upper bound on packages in one batch guide sync request.
+    app.config["GUIDE_SYNC_MAX_PACKAGES"] = int(os.getenv("GUIDE_SYNC_MAX_PACKAGES", "1000"))
+
+    # Offline gazetteer CSV (name,country,latitude,longitude[,population]) used
+    # to geocode hotel locations and package destinations, and the cell size
+    # of the in-memory hotel grid. Nearby-hotel queries return at most
+    # GEO_MAX_RESULTS hotels.
+    app.config["GAZETTEER_PATH"] = os.getenv(
+        "GAZETTEER_PATH", os.path.join(app.instance_path, "gazetteer.csv")
+    )
+    app.config["GEO_GRID_DEGREES"] = float(os.getenv("GEO_GRID_DEGREES", "0.1"))
+    app.config["GEO_MAX_RESULTS"] = int(os.getenv("GEO_MAX_RESULTS", "100"))
+
+    # Similar-package recommendations: neighbours kept per package, and how
+    # much price/duration closeness counts against text similarity (0..1).
+    app.config["RECOMMENDATION_K"] = int(os.getenv("RECOMMENDATION_K", "10"))
+    app.config["RECOMMENDATION_NUMERIC_WEIGHT"] = float(os.getenv("RECOMMENDATION_NUMERIC_WEIGHT", "0.2"))
+
+    # Production server (gunicorn.conf.py holds the process settings): before
+    # forking, the master caches up to SERVER_WARMUP_USERS recently active users.
+    app.config["SERVER_WARMUP_USERS"] = int(os.getenv("SERVER_WARMUP_USERS", "1000"))
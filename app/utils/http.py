@@ -0,0 +1,59 @@
+import hashlib
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+
+def cache_marker(*caches):
+    """Version of each ``VersionedCache`` the response is derived from, plus
+    the latest time any of them changed. Returns ``(marker, last_modified)``.
+
+    Every write to the data behind a cache bumps its version, so the marker
+    changes exactly when the cached pages do, and reading it is a counter
+    lookup rather than a query.
+    """
+    marker = "|".join(f"{cache.namespace}:{cache.version()}" for cache in caches)
+    return marker, max(cache.last_modified() for cache in caches)
+
+
+def make_etag(*parts):
+    raw = "|".join(str(p) for p in parts).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def page_etag(marker):
+    """ETag for a rendered page: the data marker plus everything else the
+    template depends on (query string and the signed-in user)."""
+    user_id = current_user.get_id() if current_user.is_authenticated else ""
+    return make_etag(marker, request.full_path, user_id)
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client's validators still match, else None.
+
+    Pages with pending flash messages are always rendered, otherwise the
+    message would never be shown.
+    """
+    if session.get("_flashes"):
+        return None
+    if request.if_none_match:
+        matched = etag in request.if_none_match
+    elif request.if_modified_since and last_modified is not None:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
+        return None
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Let browsers keep the copy but revalidate before every reuse.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,100 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import abort, current_app, request
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(values: dict) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def get_page_args(cursor_arg="cursor"):
+    """Read ``(cursor, limit)`` from the query string, rejecting bad cursors."""
+    default = current_app.config["PAGE_SIZE"]
+    maximum = current_app.config["MAX_PAGE_SIZE"]
+    limit = request.args.get("limit", default, type=int)
+    limit = max(1, min(limit, maximum))
+
+    cursor = request.args.get(cursor_arg)
+    if not cursor:
+        return None, limit
+    try:
+        return decode_cursor(cursor), limit
+    except ValueError:
+        abort(400, "Invalid cursor")
+
+
+def apply_cursor(query, created_col, id_col, cursor):
+    """Restrict a Query or Select to rows after ``cursor`` in (created_at, id) order."""
+    if not cursor:
+        return query
+    try:
+        created_at = datetime.fromisoformat(cursor["c"])
+        last_id = int(cursor["i"])
+    except (KeyError, TypeError, ValueError):
+        abort(400, "Invalid cursor")
+    return query.filter(
+        or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < last_id),
+        )
+    )
+
+
+def page_result(items, limit, created_attr="created_at"):
+    """Trim the look-ahead row fetched with ``limit + 1`` and build the next cursor."""
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor({"c": getattr(last, created_attr).isoformat(), "i": last.id})
+    return items, next_cursor
+
+
+def keyset_page(query, created_col, id_col, cursor, limit):
+    """Fetch one page ordered newest first on ``(created_at, id)``.
+
+    Any timestamp column works in place of ``created_at``; rows must expose
+    it and ``id`` under the columns' own names.
+
+    Rows after the cursor are found with a range predicate instead of an
+    OFFSET, so page N costs the same as page 1. Returns
+    ``(items, next_cursor)``.
+    """
+    query = apply_cursor(query, created_col, id_col, cursor)
+    items = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    return page_result(items, limit, created_col.key)
+
+
+def offset_page(fetch_ids, cursor, limit):
+    """Page through a ranked id list such as search results.
+
+    ``fetch_ids(n)`` must return the first ``n`` ids in rank order.
+    """
+    offset = 0
+    if cursor:
+        try:
+            offset = max(0, int(cursor["o"]))
+        except (KeyError, TypeError, ValueError):
+            abort(400, "Invalid cursor")
+    ids = fetch_ids(offset + limit + 1)
+    page = ids[offset:offset + limit]
+    next_cursor = None
+    if len(ids) > offset + limit:
+        next_cursor = encode_cursor({"o": offset + limit})
+    return page, next_cursor
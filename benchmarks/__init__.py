@@ -0,0 +1 @@
+"""Load tests and synthetic data for performance work; see ``__main__``."""
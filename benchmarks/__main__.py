@@ -0,0 +1,125 @@
+"""Command line entry point: ``python -m benchmarks seed|run``.
+
+Both commands default to a SQLite file (``--db``) so nothing but Python is
+needed locally::
+
+    python -m benchmarks seed --packages 10000
+    python -m benchmarks run --save-baseline benchmarks/baseline.json
+    python -m benchmarks run --baseline benchmarks/baseline.json --threshold 0.2
+
+Pass ``--url`` to ``run`` to drive a server that is already running on the
+same database instead of the in-process test client.
+"""
+import json
+import os
+import platform
+import sys
+
+import click
+
+
+def _app(db_path):
+    # Must be set before the app reads its config.
+    if db_path:
+        os.environ["DB_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = db_path
+    from app import create_app
+
+    return create_app()
+
+
+@click.group()
+def cli():
+    """Synthetic data and load scenarios for the tourism app."""
+
+
+@cli.command()
+@click.option("--db", "db_path", default="instance/benchmark.db", show_default=True,
+              help="SQLite file to seed; pass an empty string to use DATABASE_URL / MySQL settings.")
+@click.option("--packages", default=1000, show_default=True, help="Tourism packages; other tables scale from it.")
+@click.option("--seed", "seed_value", default=42, show_default=True)
+@click.option("--chunk-size", default=5000, show_default=True)
+@click.option("--reset", is_flag=True, help="Drop and recreate all tables first.")
+def seed(db_path, packages, seed_value, chunk_size, reset):
+    """Generate a reproducible dataset."""
+    from app.extensions.db import db
+    from .datagen import Scale, seed as generate
+
+    app = _app(db_path)
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+        counts = generate(packages, seed_value, chunk_size, app.config["PASSWORD_HASH_METHOD"])
+    click.echo(json.dumps({"scale": Scale(packages).to_dict(), "rows": counts}, indent=2))
+
+
+@cli.command()
+@click.option("--db", "db_path", default="instance/benchmark.db", show_default=True)
+@click.option("--url", help="Base URL of a running server; default is the in-process test client.")
+@click.option("--scenario", "scenarios", multiple=True, help="Repeatable; default is every scenario.")
+@click.option("--concurrency", default=8, show_default=True)
+@click.option("--requests", "total", default=400, show_default=True, help="Requests per scenario.")
+@click.option("--warmup", default=5, show_default=True, help="Unrecorded requests per thread.")
+@click.option("--seed", "seed_value", default=1, show_default=True)
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Fail on regression against this file.")
+@click.option("--threshold", default=0.2, show_default=True, help="Allowed slowdown as a fraction.")
+@click.option("--save-baseline", type=click.Path(dir_okay=False), help="Write results as a new baseline.")
+def run(db_path, url, scenarios, concurrency, total, warmup, seed_value, baseline, threshold, save_baseline):
+    """Run scenarios concurrently and report throughput and p50/p95/p99."""
+    from sqlalchemy import func
+
+    from app.extensions.db import db
+    from app.models import Role, TourismPackage, User
+    from .datagen import PASSWORD
+    from .runner import compare, load_baseline, run_scenario, save_baseline as write_baseline
+    from .scenarios import SCENARIOS, HttpClient, World
+
+    app = _app(db_path)
+    with app.app_context():
+        world = World(
+            customers=db.session.scalar(db.select(func.count(User.id)).filter(User.role == Role.customer)),
+            packages=db.session.scalar(db.select(func.max(TourismPackage.id))) or 0,
+        )
+    if not world.customers or not world.packages:
+        raise click.ClickException("no data; run `python -m benchmarks seed` first")
+
+    def make_client(index):
+        client = HttpClient(url) if url else app.test_client()
+        client.post("/login/customer", data={"username": f"customer{index % world.customers + 1}", "password": PASSWORD})
+        return client
+
+    names = scenarios or list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise click.BadParameter(", ".join(sorted(unknown)), param_hint="--scenario")
+
+    results = {}
+    click.echo(f"{'scenario':<16}{'reqs':>7}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in names:
+        result = run_scenario(name, make_client, world, concurrency, total, warmup, seed_value)
+        results[name] = row = result.to_dict()
+        click.echo(
+            f"{name:<16}{row['requests']:>7}{row['errors']:>8}{row['throughput']:>10.1f}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+        )
+
+    if save_baseline:
+        write_baseline(save_baseline, results, {
+            "concurrency": concurrency,
+            "requests": total,
+            "target": url or "test-client",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        })
+        click.echo(f"baseline written to {save_baseline}")
+    if baseline:
+        problems = compare(results, load_baseline(baseline), threshold)
+        for problem in problems:
+            click.echo(f"REGRESSION {problem}", err=True)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
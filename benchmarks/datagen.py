@@ -0,0 +1,238 @@
+"""Seeded synthetic data for benchmarks.
+
+Rows are written with Core executemany in chunks and explicit primary keys,
+so seeding a million packages stays a matter of minutes and the same seed
+always produces the same database.
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+from app.extensions.db import db
+from app.services import booking_stats
+from app.models import (
+    Booking,
+    Hotel,
+    HotelPackage,
+    PackageGuide,
+    Role,
+    TourismPackage,
+    TouristGuide,
+    User,
+)
+
+
+# Every generated account shares this password so scenarios can log in.
+PASSWORD = "benchmark"
+
+CITIES = [
+    ("Bali", "Indonesia"), ("Kyoto", "Japan"), ("Lisbon", "Portugal"), ("Cusco", "Peru"),
+    ("Reykjavik", "Iceland"), ("Marrakesh", "Morocco"), ("Queenstown", "New Zealand"),
+    ("Goa", "India"), ("Jaipur", "India"), ("Kerala", "India"), ("Manali", "India"),
+    ("Cape Town", "South Africa"), ("Hanoi", "Vietnam"), ("Santorini", "Greece"),
+    ("Dubrovnik", "Croatia"), ("Banff", "Canada"), ("Havana", "Cuba"), ("Zanzibar", "Tanzania"),
+    ("Petra", "Jordan"), ("Istanbul", "Turkey"), ("Prague", "Czechia"), ("Seville", "Spain"),
+    ("Chiang Mai", "Thailand"), ("Bora Bora", "French Polynesia"), ("Patagonia", "Chile"),
+    ("Edinburgh", "Scotland"), ("Florence", "Italy"), ("Kathmandu", "Nepal"),
+    ("Maldives", "Maldives"), ("Cairo", "Egypt"),
+]
+# Approximate city centres for the seeded coordinates.
+COORDINATES = {
+    "Bali": (-8.65, 115.22), "Kyoto": (35.01, 135.77), "Lisbon": (38.72, -9.14),
+    "Cusco": (-13.53, -71.97), "Reykjavik": (64.15, -21.94), "Marrakesh": (31.63, -7.99),
+    "Queenstown": (-45.03, 168.66), "Goa": (15.50, 73.83), "Jaipur": (26.91, 75.79),
+    "Kerala": (9.93, 76.27), "Manali": (32.24, 77.19), "Cape Town": (-33.92, 18.42),
+    "Hanoi": (21.03, 105.85), "Santorini": (36.39, 25.46), "Dubrovnik": (42.65, 18.09),
+    "Banff": (51.18, -115.57), "Havana": (23.11, -82.37), "Zanzibar": (-6.16, 39.19),
+    "Petra": (30.33, 35.44), "Istanbul": (41.01, 28.98), "Prague": (50.08, 14.44),
+    "Seville": (37.39, -5.98), "Chiang Mai": (18.79, 98.98), "Bora Bora": (-16.50, -151.74),
+    "Patagonia": (-50.94, -73.41), "Edinburgh": (55.95, -3.19), "Florence": (43.77, 11.26),
+    "Kathmandu": (27.72, 85.32), "Maldives": (4.18, 73.51), "Cairo": (30.04, 31.24),
+}
+THEMES = ["Adventure", "Heritage", "Wellness", "Culinary", "Wildlife", "Beach", "Trekking", "Family"]
+ADJECTIVES = ["Grand", "Hidden", "Classic", "Luxury", "Budget", "Weekend", "Ultimate", "Slow"]
+SPECIALIZATIONS = ["history", "mountains", "wildlife", "food", "diving", "architecture", "photography"]
+AMENITIES = ["wifi", "pool", "spa", "breakfast", "gym", "parking", "airport shuttle", "bar"]
+WORDS = (
+    "explore discover local markets temples beaches sunset hike guided tour cuisine "
+    "culture museum island river valley old town festival boat ride village"
+).split()
+
+
+class Scale:
+    """Row counts derived from the number of tourism packages."""
+
+    def __init__(self, packages):
+        self.packages = packages
+        self.customers = packages
+        self.hotel_owners = max(1, packages // 20)
+        self.managers = max(1, packages // 100)
+        self.hotels = max(1, packages // 5)
+        self.hotel_packages_per_hotel = 3
+        self.guides = max(1, packages // 10)
+        self.bookings = packages * 2
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _write(model, rows, chunk_size):
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        db.session.execute(insert(model), chunk)
+        db.session.commit()
+        count += len(chunk)
+    return count
+
+
+def seed(packages=1000, seed=42, chunk_size=5000, password_method="scrypt"):
+    """Fill an empty database. Returns the number of rows written per table."""
+    if db.session.scalar(db.select(func.count(User.id))):
+        raise RuntimeError("database is not empty; seed into a fresh database or pass --reset")
+
+    rng = random.Random(seed)
+    scale = Scale(packages)
+    now = datetime(2026, 1, 1)
+    password = generate_password_hash(PASSWORD, password_method)
+
+    def created():
+        stamp = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        return {"created_at": stamp}
+
+    # Users: ids 1..customers are customers, then hotel owners, then managers.
+    first_owner = scale.customers + 1
+    first_manager = first_owner + scale.hotel_owners
+
+    def users():
+        roles = (
+            [(Role.customer, "customer", scale.customers)]
+            + [(Role.hotel, "hotel", scale.hotel_owners)]
+            + [(Role.package_manager, "manager", scale.managers)]
+        )
+        user_id = 0
+        for role, prefix, count in roles:
+            for i in range(1, count + 1):
+                user_id += 1
+                yield dict(
+                    id=user_id,
+                    username=f"{prefix}{i}",
+                    email=f"{prefix}{i}@bench.example",
+                    password=password,
+                    role=role,
+                    **created(),
+                )
+
+    def hotels():
+        for hotel_id in range(1, scale.hotels + 1):
+            city, country = rng.choice(CITIES)
+            row = created()
+            latitude, longitude = COORDINATES[city]
+            yield dict(
+                # Spread hotels up to ~15 km around the centre.
+                latitude=latitude + rng.uniform(-0.1, 0.1),
+                longitude=longitude + rng.uniform(-0.1, 0.1),
+                id=hotel_id,
+                user_id=first_owner + (hotel_id - 1) % scale.hotel_owners,
+                name=f"{rng.choice(ADJECTIVES)} {city} Stay {hotel_id}",
+                location=f"{city}, {country}",
+                description=_sentence(rng),
+                contact_info=f"+1-555-{hotel_id:07d}",
+                amenities=", ".join(rng.sample(AMENITIES, 3)),
+                updated_at=row["created_at"],
+                **row,
+            )
+
+    def hotel_packages():
+        for hotel_id in range(1, scale.hotels + 1):
+            for n in range(scale.hotel_packages_per_hotel):
+                yield dict(
+                    hotel_id=hotel_id,
+                    title=f"{rng.choice(THEMES)} room offer {n + 1}",
+                    description=_sentence(rng, 8),
+                    price=Decimal(rng.randrange(4000, 40000)) / 100,
+                    amenities=", ".join(rng.sample(AMENITIES, 2)),
+                    **created(),
+                )
+
+    def guides():
+        for guide_id in range(1, scale.guides + 1):
+            row = created()
+            yield dict(
+                id=guide_id,
+                name=f"Guide {guide_id}",
+                contact_info=f"guide{guide_id}@bench.example",
+                rate_per_day=Decimal(rng.randrange(2000, 15000)) / 100,
+                specialization=rng.choice(SPECIALIZATIONS),
+                experience_years=rng.randrange(1, 30),
+                updated_at=row["created_at"],
+                **row,
+            )
+
+    prices = {}
+
+    def packages_():
+        for package_id in range(1, scale.packages + 1):
+            city, country = rng.choice(CITIES)
+            row = created()
+            prices[package_id] = Decimal(rng.randrange(20000, 500000)) / 100
+            latitude, longitude = COORDINATES[city]
+            yield dict(
+                latitude=latitude,
+                longitude=longitude,
+                id=package_id,
+                title=f"{rng.choice(ADJECTIVES)} {city} {rng.choice(THEMES)}",
+                destination=f"{city}, {country}",
+                description=_sentence(rng, 20),
+                price=prices[package_id],
+                duration_days=rng.randrange(2, 15),
+                created_by=first_manager + (package_id - 1) % scale.managers,
+                updated_at=row["created_at"],
+                **row,
+            )
+
+    def package_guides():
+        for package_id in range(1, scale.packages + 1):
+            for guide_id in rng.sample(range(1, scale.guides + 1), min(scale.guides, rng.randrange(0, 4))):
+                yield dict(package_id=package_id, guide_id=guide_id)
+
+    def bookings():
+        for _ in range(scale.bookings):
+            package_id = rng.randrange(1, scale.packages + 1)
+            status = rng.choice(["pending", "confirmed", "confirmed", "cancelled"])
+            yield dict(
+                user_id=rng.randrange(1, scale.customers + 1),
+                package_id=package_id,
+                status=status,
+                amount=prices[package_id] if status == "confirmed" else None,
+                booked_at=now - timedelta(seconds=rng.randrange(180 * 24 * 3600)),
+            )
+
+    counts = {
+        "users": _write(User, users(), chunk_size),
+        "hotels": _write(Hotel, hotels(), chunk_size),
+        "hotel_packages": _write(HotelPackage, hotel_packages(), chunk_size),
+        "tourist_guides": _write(TouristGuide, guides(), chunk_size),
+        "tourism_packages": _write(TourismPackage, packages_(), chunk_size),
+        "package_guides": _write(PackageGuide, package_guides(), chunk_size),
+        "bookings": _write(Booking, bookings(), chunk_size),
+    }
+    booking_stats.rebuild()
+    return counts
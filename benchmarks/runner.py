@@ -0,0 +1,109 @@
+"""Concurrent scenario driver, latency statistics and baseline comparison."""
+import json
+import math
+import random
+import threading
+import time
+
+from .scenarios import SCENARIOS
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Result:
+    def __init__(self, scenario, latencies, errors, elapsed):
+        latencies.sort()
+        self.scenario = scenario
+        self.requests = len(latencies)
+        self.errors = errors
+        self.elapsed = elapsed
+        self.throughput = self.requests / elapsed if elapsed else 0.0
+        self.p50 = percentile(latencies, 50)
+        self.p95 = percentile(latencies, 95)
+        self.p99 = percentile(latencies, 99)
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput": round(self.throughput, 2),
+            "p50_ms": round(self.p50 * 1000, 3),
+            "p95_ms": round(self.p95 * 1000, 3),
+            "p99_ms": round(self.p99 * 1000, 3),
+        }
+
+
+def run_scenario(name, make_client, world, concurrency, requests, warmup=0, seed=0):
+    """Run ``requests`` calls of scenario ``name`` spread over ``concurrency``
+    threads, each with its own logged-in client. Status codes of 400 and
+    above count as errors; their latencies are still recorded."""
+    scenario = SCENARIOS[name]
+    per_thread = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    clients = [make_client(i) for i in range(concurrency)]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = clients[index]
+        for _ in range(warmup):
+            scenario(client, rng, world)
+        start.wait()
+        mine = []
+        failed = 0
+        for _ in range(per_thread[index]):
+            began = time.perf_counter()
+            status = scenario(client, rng, world)
+            mine.append(time.perf_counter() - began)
+            if status >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return Result(name, latencies, errors[0], time.perf_counter() - began)
+
+
+def compare(results, baseline, threshold):
+    """Regressions against a saved baseline, as human-readable strings.
+
+    A scenario regresses when its p95 latency grows, or its throughput
+    drops, by more than ``threshold`` (a fraction, e.g. 0.2 for 20%).
+    """
+    problems = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            problems.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+        if previous["throughput"] and current["throughput"] < previous["throughput"] * (1 - threshold):
+            problems.append(
+                f"{name}: throughput {current['throughput']}/s vs baseline {previous['throughput']}/s"
+            )
+    return problems
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)["scenarios"]
+
+
+def save_baseline(path, results, meta):
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump({"meta": meta, "scenarios": results}, handle, indent=2, sort_keys=True)
@@ -0,0 +1,114 @@
+"""Benchmark scenarios.
+
+A scenario is a function ``(client, rng, world)`` that performs one user
+action and returns the HTTP status. ``client`` is a logged-in Flask test
+client or an :class:`HttpClient` against a running server; ``world`` holds
+the id ranges of the seeded data.
+"""
+import http.cookiejar
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .datagen import CITIES, PASSWORD
+
+
+class World:
+    """What the scenarios need to know about the seeded database."""
+
+    def __init__(self, customers, packages):
+        self.customers = customers
+        self.packages = packages
+        self.destinations = [city for city, _ in CITIES]
+
+
+def login(client, rng, world):
+    username = f"customer{rng.randrange(1, world.customers + 1)}"
+    response = client.post("/login/customer", data={"username": username, "password": PASSWORD})
+    # A failed login redirects back to the form instead of /post-login.
+    return response.status_code if "post-login" in response.headers.get("Location", "") else 401
+
+
+def catalog_search(client, rng, world):
+    term = rng.choice(world.destinations).split()[0].lower()
+    return client.get(f"/customer/api/packages?q={urllib.parse.quote(term)}").status_code
+
+
+def hotel_search(client, rng, world):
+    # Type-ahead style: a prefix of a city, which exercises the trigram index.
+    city = rng.choice(world.destinations)
+    prefix = city[: rng.randrange(3, len(city) + 1)]
+    return client.get(f"/customer/search-hotels?location={urllib.parse.quote(prefix)}").status_code
+
+
+def booking(client, rng, world):
+    package_id = rng.randrange(1, world.packages + 1)
+    return client.post("/customer/book", json={"package_id": package_id}).status_code
+
+
+def nearby_hotels(client, rng, world):
+    package_id = rng.randrange(1, world.packages + 1)
+    return client.get(f"/customer/api/packages/{package_id}/nearby-hotels?radius_km=10").status_code
+
+
+def dashboard(client, rng, world):
+    return client.get("/customer/dashboard").status_code
+
+
+SCENARIOS = {
+    "login": login,
+    "catalog_search": catalog_search,
+    "hotel_search": hotel_search,
+    "booking": booking,
+    "nearby_hotels": nearby_hotels,
+    "dashboard": dashboard,
+}
+
+
+class _Response:
+    def __init__(self, status_code, headers):
+        self.status_code = status_code
+        self.headers = headers
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """Tiny stand-in for the Flask test client that talks to a real server.
+
+    Redirects are not followed, matching the test client's default.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+
+    def _open(self, method, path, data=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers["Content-Type"] = "application/json"
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request = urllib.request.Request(self.base_url + path, body, headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return _Response(response.status, response.headers)
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return _Response(exc.code, exc.headers)
+
+    def get(self, path):
+        return self._open("GET", path)
+
+    def post(self, path, data=None, json=None):
+        return self._open("POST", path, data=data, json_body=json)
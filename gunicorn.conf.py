@@ -0,0 +1,65 @@
+"""Production server settings; ``gunicorn`` picks this file up when started
+from the repository root. run.py stays the development server.
+
+The app is created and warmed up once in the master (``preload_app``) and
+forked into SERVER_WORKERS processes (one per CPU with CACHE_BACKEND=redis,
+otherwise one) with SERVER_THREADS request threads each. A worker is replaced after SERVER_MAX_REQUESTS requests (0 = never),
+plus up to SERVER_MAX_REQUESTS_JITTER so workers do not all restart
+together.
+
+Signals to the master: HUP re-reads this file, warms the app up again and
+replaces the workers gracefully. Preloaded code is not re-imported by HUP;
+to deploy new code send USR2, which starts a new master next to the old one,
+then QUIT the old master once the new workers are up. TERM stops gracefully,
+waiting SERVER_GRACEFUL_TIMEOUT seconds for in-flight requests.
+"""
+import logging
+import os
+
+from app.server import check_settings, start_worker, stop_worker, warm_up
+
+
+# gunicorn's own loggers do not propagate; this is for the app's.
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s"
+)
+
+wsgi_app = "app:create_app()"
+preload_app = True
+bind = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+backlog = 2048
+# Workers only share catalog versions through redis (see check_settings),
+# so the memory cache backend defaults to a single worker.
+if os.getenv("CACHE_BACKEND", "memory") == "redis":
+    default_workers = os.cpu_count() or 1
+else:
+    default_workers = 1
+workers = int(os.getenv("SERVER_WORKERS", str(default_workers)))
+worker_class = "gthread"
+threads = int(os.getenv("SERVER_THREADS", "8"))
+max_requests = int(os.getenv("SERVER_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+# Seconds an idle keep-alive connection is held open for its next request.
+keepalive = int(os.getenv("SERVER_KEEPALIVE", "5"))
+
+
+def on_starting(server):
+    check_settings(server.app.wsgi(), server.cfg.workers)
+
+
+def when_ready(server):
+    warm_up(server.app.wsgi())
+
+
+def on_reload(server):
+    check_settings(server.app.wsgi(), server.cfg.workers)
+    warm_up(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    start_worker(worker.app.wsgi(), server.cfg.threads)
+
+
+def worker_exit(server, worker):
+    stop_worker(server.cfg.graceful_timeout)
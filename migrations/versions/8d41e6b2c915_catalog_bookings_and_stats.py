@@ -0,0 +1,145 @@
+"""catalog indexes, seat inventory, booking pipeline and stats
+
+Revision ID: 8d41e6b2c915
+Revises: 3f2a9c1d7b40
+Create Date: 2026-10-17 09:31:02.655018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41e6b2c915'
+down_revision = '3f2a9c1d7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('manager_booking_stats',
+    sa.Column('manager_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('pending', sa.Integer(), nullable=False),
+    sa.Column('confirmed', sa.Integer(), nullable=False),
+    sa.Column('cancelled', sa.Integer(), nullable=False),
+    sa.Column('expired', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['manager_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('manager_id', 'shard')
+    )
+    op.create_table('package_booking_stats',
+    sa.Column('package_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('pending', sa.Integer(), nullable=False),
+    sa.Column('confirmed', sa.Integer(), nullable=False),
+    sa.Column('cancelled', sa.Integer(), nullable=False),
+    sa.Column('expired', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.ForeignKeyConstraint(['package_id'], ['tourism_packages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('package_id', 'shard')
+    )
+    op.create_table('package_recommendations',
+    sa.Column('package_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('similar_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['package_id'], ['tourism_packages.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['similar_id'], ['tourism_packages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('package_id', 'rank')
+    )
+    op.create_table('package_seat_shards',
+    sa.Column('package_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('available', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['package_id'], ['tourism_packages.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('package_id', 'shard')
+    )
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reference', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('seat_shard', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=True))
+        batch_op.create_index('ix_bookings_status_expires_at', ['status', 'expires_at'], unique=False)
+        batch_op.create_index('ix_bookings_user_id_booked_at', ['user_id', 'booked_at'], unique=False)
+        batch_op.create_unique_constraint('uq_bookings_reference', ['reference'])
+
+    with op.batch_alter_table('hotels', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_hotels_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hotels_location'), ['location'], unique=False)
+
+    # Links were never unique before, so double-clicked attaches may have
+    # left duplicates; keep the oldest row of each pair. The extra derived
+    # table lets MySQL delete from the table it is reading.
+    op.execute(
+        "DELETE FROM package_guides WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM package_guides "
+        "GROUP BY package_id, guide_id) AS keep)"
+    )
+    with op.batch_alter_table('package_guides', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('start_date', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('end_date', sa.Date(), nullable=True))
+        batch_op.create_index('ix_package_guides_guide_id_start_date', ['guide_id', 'start_date'], unique=False)
+        batch_op.create_index('uq_package_guides_package_id_guide_id', ['package_id', 'guide_id'], unique=True)
+
+    with op.batch_alter_table('tourism_packages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('capacity', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_tourism_packages_created_at_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_tourism_packages_created_by_created_at_id', ['created_by', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('tourist_guides', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_tourist_guides_created_at_id', ['created_at', 'id'], unique=False)
+
+    # Existing rows have not changed since they were created.
+    for table in ('hotels', 'tourism_packages', 'tourist_guides'):
+        op.execute(f"UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('tourist_guides', schema=None) as batch_op:
+        batch_op.drop_index('ix_tourist_guides_created_at_id')
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('tourism_packages', schema=None) as batch_op:
+        batch_op.drop_index('ix_tourism_packages_created_by_created_at_id')
+        batch_op.drop_index('ix_tourism_packages_created_at_id')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+        batch_op.drop_column('capacity')
+
+    with op.batch_alter_table('package_guides', schema=None) as batch_op:
+        batch_op.drop_index('uq_package_guides_package_id_guide_id')
+        batch_op.drop_index('ix_package_guides_guide_id_start_date')
+        batch_op.drop_column('end_date')
+        batch_op.drop_column('start_date')
+
+    with op.batch_alter_table('hotels', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_hotels_location'))
+        batch_op.drop_index('ix_hotels_created_at_id')
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_bookings_reference', type_='unique')
+        batch_op.drop_index('ix_bookings_user_id_booked_at')
+        batch_op.drop_index('ix_bookings_status_expires_at')
+        batch_op.drop_column('amount')
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('seat_shard')
+        batch_op.drop_column('reference')
+
+    op.drop_table('package_seat_shards')
+    op.drop_table('package_recommendations')
+    op.drop_table('package_booking_stats')
+    op.drop_table('manager_booking_stats')
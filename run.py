@@ -1,6 +1,8 @@
 from app import create_app
+from app.services.booking_pipeline import booking_pipeline
 
 app = create_app()
 
 if __name__ == "__main__":
+    booking_pipeline.start()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from app import create_app
+from app.extensions.db import db
+from app.extensions.login import UserSnapshot
+from app.models import Role, User
+from app.services.assignments import guide_schedule
+from app.services.catalog import package_ids
+from app.services.facets import facet_index
+from app.services.geo import hotel_geo_index
+from app.services.locations import location_index
+from app.services.quotes import quote_index
+from app.services.recommendations import recommender
+from app.services.search import package_index
+
+
+INDEXES = (package_ids, package_index, facet_index, location_index, quote_index,
+           guide_schedule, hotel_geo_index, recommender)
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a throwaway SQLite file, or on TEST_DATABASE_URL when set.
+
+    TEST_DATABASE_URL must point at a scratch database: its tables are
+    created before and dropped after every test.
+    """
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'test.db'}"
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": url,
+        "SQLALCHEMY_ENGINE_OPTIONS": {},
+        "SQLALCHEMY_BINDS": {},
+        "DATABASE_REPLICAS": [],
+        "PASSWORD_HASH_WORKERS": 0,
+        "CACHE_BACKEND": "memory",
+        "BOOKING_PIPELINE": False,
+        "SERVER_WARMUP_USERS": 0,
+    })
+    with app.app_context():
+        db.create_all()
+    # The indexes are module-level; start each test as a fresh worker would.
+    for index in INDEXES:
+        index.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def create_user(username, role):
+    user = User(username=username, email=f"{username}@example.com", role=role)
+    user.set_password("password")
+    db.session.add(user)
+    db.session.commit()
+    return UserSnapshot(user)
+
+
+def login(client, user):
+    """Sign ``client`` in as ``user`` the way the login views do."""
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+        session["_fresh"] = True
+        session["user_id"] = user.id
+        session["username"] = user.username
+        session["role"] = user.role.value
+    return client
+
+
+@pytest.fixture
+def customer(app):
+    with app.app_context():
+        return create_user("customer", Role.customer)
@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+from app.commands import QUERY_BUDGETS, REPEAT_LIMIT
+from app.extensions.db import db, query_counter
+from app.models import Booking, Hotel, PackageGuide, Role, TourismPackage, TouristGuide
+from app.services import booking_stats
+
+from .conftest import create_user, login
+
+
+@pytest.fixture
+def clients(app):
+    """A small catalog with bookings, and a signed-in client per role."""
+    with app.app_context():
+        customer = create_user("customer", Role.customer)
+        manager = create_user("manager", Role.package_manager)
+        hotelier = create_user("hotelier", Role.hotel)
+        guides = [
+            TouristGuide(name=f"Guide {i}", contact_info=f"guide{i}@example.com",
+                         rate_per_day=50 + i, specialization="history")
+            for i in range(3)
+        ]
+        db.session.add_all(guides)
+        packages = [
+            TourismPackage(title=f"Package {i}", destination=f"Alpha {i % 3}", price=100 + i,
+                           duration_days=1 + i % 5, created_by=manager.id)
+            for i in range(12)
+        ]
+        db.session.add_all(packages)
+        db.session.add_all(
+            Hotel(user_id=hotelier.id, name=f"Hotel {i}", location=f"Alpha {i % 3}")
+            for i in range(4)
+        )
+        db.session.flush()
+        start = date(2026, 1, 1)
+        for i, package in enumerate(packages):
+            guide = guides[i % len(guides)]
+            begins = start + timedelta(days=10 * i)
+            db.session.add(PackageGuide(package_id=package.id, guide_id=guide.id,
+                                        start_date=begins, end_date=begins + timedelta(days=1)))
+            if i % 2:
+                db.session.add(Booking(user_id=customer.id, package_id=package.id,
+                                       status="confirmed", amount=package.price))
+        db.session.commit()
+        booking_stats.rebuild()
+    return {
+        Role.customer: login(app.test_client(), customer),
+        Role.package_manager: login(app.test_client(), manager),
+    }
+
+
+def test_pages_stay_within_query_budgets(clients):
+    def fetch(client, path):
+        with query_counter() as stats:
+            response = client.get(path)
+        return response, stats
+
+    # Requests run on another thread so each gets its own app context, as
+    # check-query-counts does.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        for role, path, cold_budget, warm_budget in QUERY_BUDGETS:
+            for label, budget in (("cold", cold_budget), ("warm", warm_budget)):
+                response, stats = pool.submit(fetch, clients[role], path).result()
+                assert response.status_code == 200, f"{path} [{label}]"
+                assert stats.count <= budget, f"{path} [{label}]: {stats.count} queries"
+                assert not stats.repeated(REPEAT_LIMIT), f"{path} [{label}]"
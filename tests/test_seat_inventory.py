@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+from app.extensions.db import db
+from app.models import Booking, Role, SeatShard, TourismPackage
+from app.services import inventory
+
+from .conftest import create_user, login
+
+
+CAPACITY = 20
+THREADS = 8
+ATTEMPTS = 6
+
+
+def _limited_package(capacity):
+    package = TourismPackage(title="Limited", destination="Nowhere", price=10)
+    db.session.add(package)
+    db.session.flush()
+    inventory.set_capacity(package, capacity)
+    db.session.commit()
+    return package.id
+
+
+def test_concurrent_bookings_never_oversell(app):
+    with app.app_context():
+        package_id = _limited_package(CAPACITY)
+        users = [create_user(f"booker{i}", Role.customer) for i in range(THREADS)]
+
+    start = threading.Barrier(THREADS, timeout=30)
+
+    def book(user):
+        client = login(app.test_client(), user)
+        start.wait()
+        return [
+            client.post("/customer/book", json={"package_id": package_id}).status_code
+            for _ in range(ATTEMPTS)
+        ]
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        statuses = [status for result in pool.map(book, users) for status in result]
+
+    with app.app_context():
+        stored = db.session.scalar(
+            db.select(func.count(Booking.id)).filter(Booking.package_id == package_id)
+        )
+        seats_left = db.session.scalar(
+            db.select(func.coalesce(func.sum(SeatShard.available), 0)).filter(
+                SeatShard.package_id == package_id
+            )
+        )
+    assert len(statuses) == THREADS * ATTEMPTS
+    assert stored <= CAPACITY
+    assert stored + seats_left == CAPACITY
+    assert statuses.count(200) == stored
+    assert stored == CAPACITY
+    assert set(statuses) <= {200, 409}